@@ -85,6 +85,7 @@ THIRD_PARTY_APPS = [
 ]
 
 SERVICE_APPS = [
+    "slu.framework",
     "slu.core",
     "slu.core.accounts",
     "slu.core.cms",
@@ -151,6 +152,18 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/3.2/topics/cache/
+# Invalidations must reach every web, consumer and worker process, so deployments
+# share a redis cache. The process-local cache is only a fallback for DEBUG.
+
+CACHES = {
+    "default": env.cache(
+        "CACHE_URL", default="locmemcache://" if DEBUG else environ.Env.NOTSET
+    ),
+}
+
+
 # Custom User model
 # https://docs.djangoproject.com/en/3.2/topics/auth/customizing/#substituting-a-custom-user-model
 
@@ -450,12 +463,27 @@ SLU_PAYMENT_TRANSACTION_TTL = timedelta(
     minutes=env.int("SLU_PAYMENT_TRANSACTION_TTL", default=2880)
 )
 
+SLU_UPLOAD_CHUNK_SIZE = env.int("SLU_UPLOAD_CHUNK_SIZE", default=500)
+
 EMAIL_WHITELIST = env.list("EMAIL_WHITELIST", default=[])
 
 EVENT_BROKER_URL = env("EVENT_BROKER_URL", default=None)
 
 EVENT_GLOBAL_EXCHANGE = env("EVENT_GLOBAL_EXCHANGE", default="slu.global")
 
+# Events are written to the outbox in the transaction of the change and
+# published by `run_event_relay`, disable to publish during the request
+EVENT_OUTBOX = env.bool("EVENT_OUTBOX", default=True)
+
+# Events carry model fields without following relations, see `EventObject`
+EVENT_COMPACT_OBJECTS = env.bool("EVENT_COMPACT_OBJECTS", default=True)
+
+# Fields carried by the compact event objects of a model, by model label
+EVENT_OBJECT_FIELDS = {
+    "core_accounts.user": ["username", "first_name", "last_name", "email"],
+    "auth.group": ["name", "permissions"],
+}
+
 EVENT_MAP = {
     "notification": {
         "exchange": "direct",
@@ -1,9 +1,11 @@
 import pytest
+from django.core.cache import cache
 from rest_framework.test import APIClient
 
 from slu.core.accounts.tests.factories import *
 from slu.core.cms.tests.factories import *
 from slu.core.students.tests.factories import *
+from slu.framework.cache import reference_caches_clear
 
 
 @pytest.fixture
@@ -21,3 +23,9 @@ def staff_api_client(api_client, staff_user):
 def student_api_client(api_client, student):
     api_client.force_authenticate(user=student.user)
     return api_client
+
+
+@pytest.fixture(autouse=True)
+def cache_clear():
+    cache.clear()
+    reference_caches_clear()
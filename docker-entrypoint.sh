@@ -22,6 +22,11 @@ if [ "$1" = "runbeat" ]; then
   exit 0
 fi
 
+if [ "$1" = "runrelay" ]; then
+  python manage.py run_event_relay
+  exit 0
+fi
+
 if [ "$1" = "migrate" ]; then
   python manage.py migrate
   exit 0
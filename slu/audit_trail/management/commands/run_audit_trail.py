@@ -4,17 +4,42 @@ from django.utils import timezone
 from kombu import Connection
 
 from slu.audit_trail import services
-from slu.framework.events import EventConsumer
+from slu.framework.events import BatchEventConsumer, EventConsumer
 
 
 class Command(BaseCommand):
     help = "Run audit_trail service consumer"
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=100,
+            help="Number of messages prefetched and logged per insert. "
+            "Use 1 to process messages one at a time.",
+        )
+        parser.add_argument(
+            "--batch-timeout",
+            type=float,
+            default=1,
+            help="Seconds to wait for a batch to fill before flushing it",
+        )
+
     def handle(self, *args, **options):
         self.stdout.write(f"[{timezone.now()}] - audit_trail service consumer starting")
 
         with Connection(settings.EVENT_BROKER_URL) as conn:
-            consumer = EventConsumer(
-                service_name="audit_trail", services=services, connection=conn
-            )
+            if options["batch_size"] > 1:
+                consumer = BatchEventConsumer(
+                    service_name="audit_trail",
+                    services=services,
+                    connection=conn,
+                    batch_size=options["batch_size"],
+                    batch_timeout=options["batch_timeout"],
+                )
+            else:
+                consumer = EventConsumer(
+                    service_name="audit_trail", services=services, connection=conn
+                )
+
             consumer.run()
@@ -1,3 +1,5 @@
+from django.contrib.contenttypes.models import ContentType
+
 from slu.framework.events import EventObject
 
 
@@ -19,17 +21,44 @@ def actor_name_get(actor: EventObject = None) -> str:
     return str(actor.data.get("id"))
 
 
+def actor_types_get(actors: list[EventObject]) -> dict:
+    """Resolve the type of many actors with one query per content type.
+    Returns the types keyed by `(ctype_id, actor_id)`.
+    """
+    actor_ids = {}
+
+    for actor in actors:
+        if actor:
+            actor_ids.setdefault(actor.ctype_data.get("id"), set()).add(
+                actor.data.get("id")
+            )
+
+    actor_types = {}
+
+    for ctype_id, ids in actor_ids.items():
+        ctype = ContentType.objects.get_for_id(ctype_id)
+        model_cls = ctype.model_class()
+        # NOTE: Profile relations such as `student` are used to resolve `type`
+        related = [
+            field.name for field in model_cls._meta.related_objects if field.one_to_one
+        ]
+        actor_objs = model_cls.objects.select_related(*related).in_bulk(ids)
+
+        for id in ids:
+            actor_obj = actor_objs.get(id)
+            actor_types[(ctype_id, id)] = (
+                actor_obj.type.label if actor_obj else str(ctype)
+            )
+
+    return actor_types
+
+
 def actor_type_get(actor: EventObject = None) -> str:
     if not actor:
         return "System"
 
-    actor_obj = actor.get_from_db()
-
-    if actor_obj:
-        return actor_obj.type.label
-
-    ctype = actor.get_ctype()
-    return str(ctype)
+    actor_types = actor_types_get([actor])
+    return actor_types[(actor.ctype_data.get("id"), actor.data.get("id"))]
 
 
 def target_difference_get(old_target: EventObject, new_target: EventObject) -> dict:
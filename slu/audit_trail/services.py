@@ -1,16 +1,40 @@
 from typing import Union
 
-from django.db import transaction
+from django.db import connection, transaction
 
-from slu.framework.events import CreateModelEvent, DeleteModelEvent, UpdateModelEvent
+from slu.framework.events import (
+    CreateModelEvent,
+    DeleteModelEvent,
+    Event,
+    UpdateModelEvent,
+)
 
 from . import selectors
 from .models import TrailLog
 
+EVENT_ACTIONS = {
+    "create": TrailLog.Actions.CREATED,
+    "update": TrailLog.Actions.UPDATED,
+    "delete": TrailLog.Actions.DELETED,
+}
 
-def trail_log_create(
+
+def _trail_log_ids_allocate(count: int) -> list[int]:
+    """Reserve `count` ids from the TrailLog sequence so the hashed log ids
+    can be set before the rows are inserted."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT nextval(pg_get_serial_sequence(%s, 'id')) "
+            "FROM generate_series(1, %s)",
+            [TrailLog._meta.db_table, count],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def _trail_log_build(
     event: Union[CreateModelEvent, UpdateModelEvent, DeleteModelEvent],
     action: TrailLog.Actions,
+    actor_types: dict,
 ) -> TrailLog:
     actor = event.actor
 
@@ -25,21 +49,63 @@ def trail_log_create(
     else:
         return
 
-    with transaction.atomic():
-        trail_log = TrailLog.objects.create(
-            actor_name=selectors.actor_name_get(actor),
-            actor_type=selectors.actor_type_get(actor),
-            actor_ctype_id=actor.ctype_data.get("id"),
-            actor_id=actor.data.get("id"),
-            target_ctype_id=target.ctype_data.get("id"),
-            target_id=target.data.get("id"),
-            action=action,
-            meta=meta,
-            datetime=event.data.get("timestamp"),
+    actor_type = "System"
+    actor_ctype_id = None
+    actor_id = None
+
+    if actor:
+        actor_ctype_id = actor.ctype_data.get("id")
+        actor_id = actor.data.get("id")
+        actor_type = actor_types[(actor_ctype_id, actor_id)]
+
+    return TrailLog(
+        actor_name=selectors.actor_name_get(actor),
+        actor_type=actor_type,
+        actor_ctype_id=actor_ctype_id,
+        actor_id=actor_id,
+        target_ctype_id=target.ctype_data.get("id"),
+        target_id=target.data.get("id"),
+        action=action,
+        meta=meta,
+        datetime=event.data.get("timestamp"),
+    )
+
+
+def trail_logs_create(
+    entries: list[tuple[Event, TrailLog.Actions]],
+) -> list[TrailLog]:
+    """Create the trail logs of many `(event, action)` pairs with one insert"""
+    actor_types = selectors.actor_types_get([event.actor for event, _ in entries])
+    trail_logs = [
+        trail_log
+        for trail_log in (
+            _trail_log_build(event=event, action=action, actor_types=actor_types)
+            for event, action in entries
         )
-        trail_log.generate_log_id()
+        if trail_log
+    ]
+
+    if not trail_logs:
+        return []
 
-    return trail_log
+    with transaction.atomic():
+        ids = _trail_log_ids_allocate(len(trail_logs))
+
+        for trail_log, id in zip(trail_logs, ids):
+            trail_log.id = id
+            trail_log.log_id = TrailLog.HASHIDS.encode(id)
+
+        return TrailLog.objects.bulk_create(trail_logs)
+
+
+def trail_log_create(
+    event: Union[CreateModelEvent, UpdateModelEvent, DeleteModelEvent],
+    action: TrailLog.Actions,
+) -> TrailLog:
+    trail_logs = trail_logs_create([(event, action)])
+
+    if trail_logs:
+        return trail_logs[0]
 
 
 def handle_create(event: CreateModelEvent) -> TrailLog:
@@ -52,3 +118,13 @@ def handle_update(event: UpdateModelEvent) -> TrailLog:
 
 def handle_delete(event: DeleteModelEvent) -> TrailLog:
     return trail_log_create(event=event, action=TrailLog.Actions.DELETED)
+
+
+def handle_batch(events: list[Event]) -> list[TrailLog]:
+    return trail_logs_create(
+        [
+            (event, EVENT_ACTIONS[event.type])
+            for event in events
+            if event.type in EVENT_ACTIONS
+        ]
+    )
@@ -31,8 +31,13 @@ class TestTrailLogCreate:
         role_ctype = ContentType.objects.get_for_model(role._meta.model)
         assert trail_log.target_ctype == role_ctype
 
-    def test_update_event_log(self, staff_user, role):
-        role_before = EventObject(role)
+    def test_update_event_log(self, staff_user, role, django_assert_num_queries):
+        old_name = role.name
+
+        with django_assert_num_queries(1):
+            # Only the whitelisted permissions are queried
+            role_before = EventObject(role)
+
         role.name = f"{fake.job()} - {get_random_string(length=6)}"
         role.save()
         role_after = EventObject(role)
@@ -45,9 +50,13 @@ class TestTrailLogCreate:
         )
         trail_log = services.handle_update(event=event)
 
+        assert event.changed_fields == ["name"]
         assert trail_log
         assert trail_log.log_id
         assert trail_log.action == TrailLog.Actions.UPDATED
+        assert trail_log.meta == {
+            "changes": {"name": {"old": old_name, "new": role.name}}
+        }
 
         user_ctype = ContentType.objects.get_for_model(User)
         assert trail_log.actor_ctype == user_ctype
@@ -68,3 +77,27 @@ class TestTrailLogCreate:
         assert trail_log.actor_ctype == user_ctype
         role_ctype = ContentType.objects.get_for_model(role._meta.model)
         assert trail_log.target_ctype == role_ctype
+
+
+@pytest.mark.django_db
+class TestTrailLogBatch:
+    def test_handle_batch(self, staff_user, role_factory):
+        roles = [role_factory() for _ in range(3)]
+        events = [
+            CreateModelEvent("core.role_created", actor=staff_user, target=role)
+            for role in roles
+        ]
+        events.append(
+            CreateModelEvent("core.role_created", actor=None, target=roles[0])
+        )
+
+        trail_logs = services.handle_batch(events=events)
+
+        assert len(trail_logs) == len(events)
+        assert TrailLog.objects.count() == len(events)
+
+        for trail_log in TrailLog.objects.all():
+            assert trail_log.log_id == TrailLog.HASHIDS.encode(trail_log.id)
+            assert trail_log.action == TrailLog.Actions.CREATED
+
+        assert TrailLog.objects.filter(actor_type="System").count() == 1
@@ -6,3 +6,6 @@ class AccountsConfig(AppConfig):
     label = "core_accounts"
     verbose_name = "Accounts"
     default_auto_field = "django.db.models.BigAutoField"
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -49,8 +49,10 @@ class User(SoftDeleteMixin, AbstractUser):
         return f"{self.first_name} {self.last_name}"
 
     @property
-    def permissions(self) -> list[str]:
-        return list(set([item for item in self.get_group_permissions()]))
+    def permissions(self) -> frozenset[str]:
+        from .selectors import user_permissions_get
+
+        return user_permissions_get(user=self)
 
     @property
     def type(self):
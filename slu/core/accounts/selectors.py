@@ -1,12 +1,20 @@
+import threading
+import time
+from bisect import bisect_right
 from datetime import date
 
 from django.contrib.auth.hashers import check_password
+from django.contrib.auth.models import Group
+from django.core.cache import cache
+
+from slu.framework.cache import reference_cached
 
 from .models import (
     AcademicYear,
     Module,
     PasswordHistory,
     Personnel,
+    Role,
     RoleModule,
     School,
     Semester,
@@ -14,6 +22,42 @@ from .models import (
     UserSchoolGroup,
 )
 
+PERMISSIONS_CACHE_KEY = "accounts:permissions:{version}:{user_id}:{flags}"
+PERMISSIONS_VERSION_CACHE_KEY = "accounts:permissions:version"
+# NOTE: Kept short so a revoked role expires even where an invalidation was missed
+PERMISSIONS_CACHE_TIMEOUT = 60 * 5
+
+
+def permissions_cache_clear():
+    """Invalidate the cached permissions of every user"""
+    cache.set(PERMISSIONS_VERSION_CACHE_KEY, time.time_ns(), None)
+
+
+def user_permissions_get(*, user: User) -> frozenset[str]:
+    """
+    Return the effective permissions of a user. They are cached per user and
+    role version, and kept on the user instance for the rest of the request.
+    """
+    permissions = getattr(user, "_permissions_cache", None)
+
+    if permissions is not None:
+        return permissions
+
+    version = cache.get_or_set(PERMISSIONS_VERSION_CACHE_KEY, 0, None)
+    cache_key = PERMISSIONS_CACHE_KEY.format(
+        version=version,
+        user_id=user.id,
+        flags=f"{user.is_active:d}{user.is_superuser:d}",
+    )
+    permissions = cache.get(cache_key)
+
+    if permissions is None:
+        permissions = frozenset(user.get_group_permissions())
+        cache.set(cache_key, permissions, PERMISSIONS_CACHE_TIMEOUT)
+
+    user._permissions_cache = permissions
+    return permissions
+
 
 def _role_module_flatten(*, role_module: RoleModule) -> dict:
     return {
@@ -112,6 +156,11 @@ def school_group_role_modules_data_get(*, school_group: UserSchoolGroup) -> list
     return _role_modules_normalize(role_modules=role_modules)
 
 
+@reference_cached(Role, Group)
+def role_get(*, name: str) -> Role:
+    return Role.objects.filter(name=name).first()
+
+
 def faculty_list_get() -> list[Personnel]:
     return Personnel.active_objects.filter(
         category__in=[
@@ -132,82 +181,158 @@ def faculty_current_schedule_list_get(faculty: Personnel):
         return None
 
 
-def current_academic_year_get() -> AcademicYear:
-    academic_years = AcademicYear.objects.filter(year_start__gte=date.today().year - 1)
+CALENDAR_CACHE_KEY = "accounts:calendar"
+# NOTE: Bulk updates and fixtures change academic years and semesters without
+# the save signals that clear the timeline, so it is also rebuilt hourly.
+CALENDAR_CACHE_TIMEOUT = 60 * 60
 
-    for year in academic_years:
-        if year.date_start and year.date_end:
-            if year.date_start <= date.today() <= year.date_end:
-                return year
+_calendar_local = threading.local()
 
-            next_school_year = AcademicYear.objects.filter(
-                year_start=year.year_start + 1
-            ).first()
 
-            if next_school_year and next_school_year.date_start > year.date_end:
-                return year
-    else:
+def _calendar_build() -> dict:
+    academic_years = [
+        academic_year
+        for academic_year in AcademicYear.objects.order_by("date_start", "id")
+        if academic_year.date_start and academic_year.date_end
+    ]
+    academic_years_by_year = {}
+    semesters_by_academic_year = {}
+
+    for academic_year in AcademicYear.objects.order_by("id"):
+        academic_years_by_year.setdefault(academic_year.year_start, academic_year)
+
+    for semester in Semester.objects.select_related("academic_year").order_by(
+        "order", "id"
+    ):
+        semesters_by_academic_year.setdefault(semester.academic_year_id, []).append(
+            semester
+        )
+
+    return {
+        "academic_years": academic_years,
+        "academic_year_starts": [
+            academic_year.date_start for academic_year in academic_years
+        ],
+        "academic_years_by_year": academic_years_by_year,
+        "semesters_by_academic_year": semesters_by_academic_year,
+    }
+
+
+def calendar_cache_clear():
+    cache.delete(CALENDAR_CACHE_KEY)
+    _calendar_local.calendar = None
+
+
+def calendar_request_started(**kwargs):
+    _calendar_local.calendar = None
+    _calendar_local.in_request = True
+
+
+def calendar_request_finished(**kwargs):
+    _calendar_local.calendar = None
+    _calendar_local.in_request = False
+
+
+def _calendar_get() -> dict:
+    """
+    Return the academic year and semester timeline. It is loaded once into
+    the cache for an hour or until either model changes, and reused for the
+    whole request.
+    """
+    in_request = getattr(_calendar_local, "in_request", False)
+    calendar = getattr(_calendar_local, "calendar", None)
+
+    if in_request and calendar:
+        return calendar
+
+    calendar = cache.get(CALENDAR_CACHE_KEY)
+
+    if calendar is None:
+        calendar = _calendar_build()
+        cache.set(CALENDAR_CACHE_KEY, calendar, CALENDAR_CACHE_TIMEOUT)
+
+    if in_request:
+        _calendar_local.calendar = calendar
+
+    return calendar
+
+
+def current_academic_year_get() -> AcademicYear:
+    calendar = _calendar_get()
+
+    # NOTE: Between school years, the last started one is still current
+    index = bisect_right(calendar["academic_year_starts"], date.today()) - 1
+
+    if index < 0:
         return None
 
+    return calendar["academic_years"][index]
+
 
 def current_semester_get() -> Semester:
     current_academic_year = current_academic_year_get()
 
-    if current_academic_year:
-        for semester in current_academic_year.semesters.all():
-            if semester.date_start and semester.date_end:
-                if semester.date_start <= date.today() <= semester.date_end:
-                    return semester
+    if not current_academic_year:
+        return None
+
+    semesters = sorted(
+        (
+            semester
+            for semester in _calendar_get()["semesters_by_academic_year"].get(
+                current_academic_year.id, []
+            )
+            if semester.date_start and semester.date_end
+        ),
+        key=lambda semester: semester.date_start,
+    )
+
+    if not semesters:
+        return None
 
-                next_semester = current_academic_year.semesters.filter(
-                    order=semester.order + 1
-                ).first()
+    # NOTE: Between terms, the last started term is still current
+    starts = [semester.date_start for semester in semesters]
+    index = bisect_right(starts, date.today()) - 1
 
-                if not next_semester:
-                    return semester
+    return semesters[max(index, 0)]
 
-                if next_semester and next_semester.date_start > date.today():
-                    return semester
 
-    return None
+def _semester_adjacent_get(*, semester: Semester, offset: int) -> Semester:
+    calendar = _calendar_get()
+    semesters = calendar["semesters_by_academic_year"].get(
+        semester.academic_year_id, []
+    )
+
+    for adjacent in semesters:
+        if adjacent.order == semester.order + offset:
+            return adjacent
+
+    academic_year = calendar["academic_years_by_year"].get(
+        semester.academic_year.year_start + offset
+    )
+
+    if not academic_year:
+        return None
+
+    semesters = calendar["semesters_by_academic_year"].get(academic_year.id, [])
+
+    if not semesters:
+        return None
+
+    return semesters[0] if offset > 0 else semesters[-1]
 
 
 def next_semester_get() -> Semester:
     current_sem = current_semester_get()
     if current_sem:
-        current_academic_year = current_sem.academic_year
-        next_semester = current_academic_year.semesters.filter(
-            order=current_sem.order + 1
-        ).first()
-
-        if not next_semester:
-            next_academic_year = AcademicYear.objects.filter(
-                year_start=current_academic_year.year_start + 1
-            ).first()
-            next_semester = next_academic_year.semesters.order_by("order").first()
-
-        return next_semester
+        return _semester_adjacent_get(semester=current_sem, offset=1)
     return None
 
 
 def previous_semester_get() -> Semester:
     current_sem = current_semester_get()
     if current_sem:
-        current_academic_year = current_sem.academic_year
-        previous_semester = current_academic_year.semesters.filter(
-            order=current_sem.order - 1
-        ).first()
-
-        if not previous_semester:
-            previous_academic_year = AcademicYear.objects.filter(
-                year_start=current_academic_year.year_start - 1
-            ).first()
-            previous_semester = previous_academic_year.semesters.order_by(
-                "-order"
-            ).first()
-
-        return previous_semester
-    return False
+        return _semester_adjacent_get(semester=current_sem, offset=-1)
+    return None
 
 
 def _user_module_flatten(*, module: Module) -> dict:
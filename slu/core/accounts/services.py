@@ -1,9 +1,10 @@
 from datetime import date
 from typing import Dict, List
 
+from django.conf import settings
 from django.contrib.auth.tokens import default_token_generator as token_generator
 from django.db import transaction
-from django.db.models import Q
+from django.db.models import Q, QuerySet
 from django.utils.encoding import force_str
 from django.utils.http import urlsafe_base64_decode as uid_decoder
 from rest_framework import exceptions
@@ -11,7 +12,7 @@ from rest_framework.exceptions import ValidationError
 
 from slu.core import events
 from slu.framework.events import event_publisher
-from slu.framework.utils import get_random_string
+from slu.framework.utils import chunked, get_random_string
 
 from . import selectors
 from .models import (
@@ -146,6 +147,33 @@ def user_role_remove(*, role_key: str, user: User):
         user.groups.remove(role)
 
 
+def role_users_add(*, role: Role, users: QuerySet[User]) -> None:
+    """Add every user of `users` to the role with batched inserts of the
+    `user_groups` rows instead of one `groups.add` per user"""
+    UserGroup = User.groups.through
+    user_ids = users.order_by().values_list("id", flat=True).iterator()
+
+    for chunk in chunked(user_ids, settings.SLU_UPLOAD_CHUNK_SIZE):
+        UserGroup.objects.bulk_create(
+            [UserGroup(user_id=user_id, group_id=role.id) for user_id in chunk],
+            ignore_conflicts=True,
+        )
+
+    # NOTE: Bulk inserts skip `m2m_changed`, clear the permissions explicitly
+    selectors.permissions_cache_clear()
+    transaction.on_commit(selectors.permissions_cache_clear)
+
+
+def role_users_remove(*, role: Role, users: QuerySet[User]) -> None:
+    """Remove every user of `users` from the role with one delete"""
+    User.groups.through.objects.filter(
+        group_id=role.id, user_id__in=users.order_by().values("id")
+    ).delete()
+
+    selectors.permissions_cache_clear()
+    transaction.on_commit(selectors.permissions_cache_clear)
+
+
 def user_password_history_create(
     *,
     user: User,
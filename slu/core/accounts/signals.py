@@ -0,0 +1,44 @@
+from django.contrib.auth.models import Group
+from django.core.signals import request_finished, request_started
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from .models import AcademicYear, Module, Role, RoleModule, Semester, User
+from .selectors import (
+    calendar_cache_clear,
+    calendar_request_finished,
+    calendar_request_started,
+    permissions_cache_clear,
+)
+
+request_started.connect(calendar_request_started)
+request_finished.connect(calendar_request_finished)
+
+
+@receiver(post_save, sender=AcademicYear)
+@receiver(post_delete, sender=AcademicYear)
+@receiver(post_save, sender=Semester)
+@receiver(post_delete, sender=Semester)
+def calendar_changed(**kwargs):
+    calendar_cache_clear()
+    # NOTE: Clear again on commit in case a concurrent read cached the old timeline
+    transaction.on_commit(calendar_cache_clear)
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+@receiver(m2m_changed, sender=Group.permissions.through)
+@receiver(m2m_changed, sender=Module.add_permissions.through)
+@receiver(m2m_changed, sender=Module.view_permissions.through)
+@receiver(m2m_changed, sender=Module.change_permissions.through)
+@receiver(m2m_changed, sender=Module.delete_permissions.through)
+@receiver(post_save, sender=RoleModule)
+@receiver(post_delete, sender=RoleModule)
+@receiver(post_delete, sender=Group)
+@receiver(post_delete, sender=Role)
+def permissions_changed(action=None, **kwargs):
+    if action and not action.startswith("post_"):
+        return
+
+    permissions_cache_clear()
+    transaction.on_commit(permissions_cache_clear)
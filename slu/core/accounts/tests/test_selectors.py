@@ -0,0 +1,91 @@
+from datetime import date, timedelta
+
+import pytest
+from django.contrib.auth.models import Group, Permission
+
+from slu.core.accounts import selectors
+from slu.core.accounts.models import User
+
+
+@pytest.mark.django_db
+class TestCalendar:
+    def test_semester_get(
+        self, academic_year_factory, semester_factory, django_assert_num_queries
+    ):
+        today = date.today()
+        previous_year = academic_year_factory(
+            year_start=today.year - 1,
+            date_start=today - timedelta(days=400),
+            date_end=today - timedelta(days=40),
+        )
+        academic_year = academic_year_factory(
+            year_start=today.year,
+            date_start=today - timedelta(days=30),
+            date_end=today + timedelta(days=300),
+        )
+        previous = semester_factory(
+            academic_year=previous_year,
+            order=3,
+            date_start=today - timedelta(days=100),
+            date_end=today - timedelta(days=40),
+        )
+        current = semester_factory(
+            academic_year=academic_year,
+            order=1,
+            date_start=today - timedelta(days=30),
+            date_end=today - timedelta(days=1),
+        )
+        upcoming = semester_factory(
+            academic_year=academic_year,
+            order=2,
+            date_start=today + timedelta(days=10),
+            date_end=today + timedelta(days=100),
+        )
+
+        assert selectors.current_academic_year_get() == academic_year
+
+        with django_assert_num_queries(0):
+            assert selectors.current_semester_get() == current
+            assert selectors.next_semester_get() == upcoming
+            assert selectors.previous_semester_get() == previous
+
+        upcoming.date_start = today
+        upcoming.save()
+
+        assert selectors.current_semester_get() == upcoming
+
+
+@pytest.mark.django_db
+class TestUserPermissions:
+    def test_permissions_get(self, staff_user, django_assert_num_queries):
+        role = Group.objects.create(name="Sample role")
+        role.permissions.add(Permission.objects.get(codename="view_user"))
+        staff_user.groups.add(role)
+
+        assert "core_accounts.view_user" in staff_user.permissions
+
+        user = User.objects.get(id=staff_user.id)
+
+        with django_assert_num_queries(0):
+            assert "core_accounts.view_user" in selectors.user_permissions_get(
+                user=user
+            )
+
+        role.permissions.add(Permission.objects.get(codename="change_user"))
+        user = User.objects.get(id=staff_user.id)
+
+        assert "core_accounts.change_user" in user.permissions
+
+
+@pytest.mark.django_db
+class TestRoleGet:
+    def test_role_get(self, role, django_assert_num_queries):
+        with django_assert_num_queries(1):
+            assert selectors.role_get(name=role.name) == role
+
+        with django_assert_num_queries(0):
+            assert selectors.role_get(name=role.name) == role
+            assert selectors.role_get(name=role.name) == role
+
+        role.delete()
+        assert selectors.role_get(name=role.name) is None
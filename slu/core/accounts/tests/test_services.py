@@ -1,6 +1,7 @@
 import pytest
 
 from slu.core.accounts import services
+from slu.core.accounts.models import User
 
 from .factories import fake
 
@@ -43,3 +44,17 @@ class TestUserServices:
 
         assert staff.departments.count() == len(data.get("departments"))
         assert staff.modules.count() == len(data.get("modules"))
+
+
+@pytest.mark.django_db
+class TestRoleUsers:
+    def test_role_users_add_remove(self, user_factory, role):
+        users = [user_factory() for _ in range(3)]
+        users[0].groups.add(role)
+        queryset = User.objects.filter(id__in=[user.id for user in users])
+
+        services.role_users_add(role=role, users=queryset)
+        assert role.user_set.count() == 3
+
+        services.role_users_remove(role=role, users=queryset.exclude(id=users[0].id))
+        assert list(role.user_set.all()) == [users[0]]
@@ -3,7 +3,9 @@ from django.contrib.auth import get_user_model
 from django.urls import reverse
 from rest_framework import status
 
+from slu.core import events
 from slu.core.accounts import models
+from slu.framework.models import OutboxEvent
 from slu.framework.tests import apply_perms, assert_paginated_response, fake
 
 User = get_user_model()
@@ -205,6 +207,10 @@ class TestRoleViewSet:
         assert role.name == data.get("name")
         assert role.rolemodule_set.count() == len(data.get("role_modules"))
 
+        outbox_event = OutboxEvent.objects.get()
+        assert outbox_event.body["event"] == events.ROLE_CREATED
+        assert outbox_event.body["data"]["target"]["data"]["id"] == role.id
+
     @apply_perms("auth.view_group", client="staff_api_client")
     def test_roles_retrieve(self, staff_api_client, role):
         url = reverse("slu.core.accounts:roles-detail", kwargs={"pk": role.id})
@@ -172,6 +172,7 @@ class ClassAdmin(admin.ModelAdmin):
         "semester",
     )
     raw_id_fields = ("subject", "instructor", "course", "tuition_fee_rate")
+    readonly_fields = models.Class.SEAT_FIELDS
     inlines = (ClassScheduleInline,)
     search_fields = ["class_code"]
     ordering = ("-semester",)
@@ -6,3 +6,6 @@ class CmsConfig(AppConfig):
     label = "core_cms"
     verbose_name = "CMS"
     default_auto_field = "django.db.models.BigAutoField"
+
+    def ready(self):
+        from . import signals  # noqa: F401
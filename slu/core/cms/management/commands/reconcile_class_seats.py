@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from slu.core.cms.services import class_seats_reconcile
+from slu.framework.utils import LoadScreen
+
+load_screen = LoadScreen()
+
+
+class Command(BaseCommand):
+    help = "Recompute the reserved and enrolled seat counters of all classes"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only report the classes whose counters drifted",
+        )
+
+    def handle(self, *args, **options):
+        drifted = class_seats_reconcile(dry_run=options["dry_run"])
+
+        for klass in drifted:
+            self.stdout.write(
+                f"Class {klass['class_code']} ({klass['id']}): "
+                f"{klass['enrolled_count']} -> {klass['actual']}"
+            )
+
+        action = "FOUND" if options["dry_run"] else "RECONCILED"
+        load_screen.print_statement(
+            f"\n{action} {len(drifted)} CLASSES WITH DRIFTED SEAT COUNTERS.\n", None
+        )
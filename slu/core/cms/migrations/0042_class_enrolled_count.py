@@ -0,0 +1,40 @@
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+SEAT_STATUSES = ["R", "E"]
+
+
+def class_enrolled_count_populate(apps, schema_editor):
+    Class = apps.get_model("core_cms", "Class")
+    EnrolledClass = apps.get_model("core_students", "EnrolledClass")
+
+    seats = (
+        EnrolledClass.objects.filter(klass=OuterRef("pk"), status__in=SEAT_STATUSES)
+        .order_by()
+        .values("klass")
+        .annotate(total=Count("id"))
+        .values("total")
+    )
+    Class.objects.update(
+        enrolled_count=Coalesce(Subquery(seats, output_field=IntegerField()), 0)
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core_cms", "0041_auto_20221019_1114"),
+        ("core_students", "0047_generalweightedaveragesheet_error_file"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="class",
+            name="enrolled_count",
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(
+            class_enrolled_count_populate, reverse_code=migrations.RunPython.noop
+        ),
+    ]
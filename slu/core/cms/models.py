@@ -283,6 +283,8 @@ class Class(SoftDeleteModel):
 
     class_code = models.CharField(max_length=50, db_index=True)
     class_size = models.IntegerField(default=0)
+    # NOTE: Reserved and enrolled seats, maintained by the EnrolledClass signals
+    enrolled_count = models.IntegerField(default=0)
 
     is_dissolved = models.BooleanField(default=False)
     is_crash_course = models.BooleanField(default=False)
@@ -295,16 +297,26 @@ class Class(SoftDeleteModel):
 
     remarks = models.TextField(blank=True, null=True)
 
+    SEAT_FIELDS = ["enrolled_count"]
+
     def __str__(self):
         if self.subject:
             return f"{self.class_code} - {self.subject.descriptive_code} - {self.subject.descriptive_title}"
         return self.class_code
 
-    def get_total_students_enrolled(self) -> Decimal:
-        from slu.core.students.models import EnrolledClass
+    def save(self, *args, **kwargs):
+        # NOTE: Never write back a seat count that may be stale on this instance
+        if not self._state.adding and kwargs.get("update_fields") is None:
+            kwargs["update_fields"] = [
+                field.name
+                for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.SEAT_FIELDS
+            ]
 
-        statuses = [EnrolledClass.Statuses.RESERVED, EnrolledClass.Statuses.ENROLLED]
-        return self.enrollments.filter(status__in=statuses).count()
+        return super().save(*args, **kwargs)
+
+    def get_total_students_enrolled(self) -> Decimal:
+        return self.enrolled_count
 
     def has_available_slot_for_reservation(self) -> bool:
         return self.get_total_students_enrolled() < self.class_size
@@ -1,15 +1,19 @@
+import time
 from decimal import Decimal
 
-from django.db.models import Q
+from django.core.cache import cache
+from django.db.models import Prefetch, Q
 
 from slu.core.accounts.models import AcademicYear, Semester
 from slu.core.students.models import Student
 
 from .models import (
     Class,
+    ClassSchedule,
     Course,
     CurriculumPeriod,
     CurriculumSubject,
+    CurriculumSubjectRequisite,
     Fee,
     LaboratoryFee,
     MiscellaneousFeeSpecification,
@@ -160,3 +164,75 @@ def subject_has_class(*, subject: Subject, semester: Semester) -> bool:
         ).count()
         > 0
     )
+
+
+CLASS_OFFERING_CACHE_KEY = "cms:class_offering:{version}:{semester_id}"
+CLASS_OFFERING_VERSION_CACHE_KEY = "cms:class_offering:version"
+
+
+def class_offering_cache_clear():
+    """Invalidate the cached class offering of every semester"""
+    cache.set(CLASS_OFFERING_VERSION_CACHE_KEY, time.time_ns(), None)
+
+
+def class_offering_get(*, semester: Semester) -> dict[int, list[Class]]:
+    """
+    Return the open classes of a semester keyed by subject id, with their
+    schedules, rooms and buildings prefetched. The offering is built with a
+    few bulk queries and cached until a class or schedule changes.
+    """
+    if not semester:
+        return {}
+
+    version = cache.get_or_set(CLASS_OFFERING_VERSION_CACHE_KEY, 0, None)
+    cache_key = CLASS_OFFERING_CACHE_KEY.format(
+        version=version, semester_id=semester.id
+    )
+    offering = cache.get(cache_key)
+
+    if offering is not None:
+        return offering
+
+    classes = (
+        Class.objects.filter(semester=semester, is_dissolved=False)
+        .prefetch_related(
+            Prefetch(
+                "class_schedules",
+                queryset=ClassSchedule.objects.select_related("room__building"),
+            )
+        )
+        .order_by("class_code", "id")
+    )
+    offering = {}
+
+    for klass in classes:
+        offering.setdefault(klass.subject_id, []).append(klass)
+
+    cache.set(cache_key, offering, None)
+    return offering
+
+
+def class_seats_get(*, semester: Semester) -> dict[int, int]:
+    """Return the reserved and enrolled seats of each open class of a semester"""
+    if not semester:
+        return {}
+
+    return dict(
+        Class.objects.filter(semester=semester, is_dissolved=False).values_list(
+            "id", "enrolled_count"
+        )
+    )
+
+
+def curriculum_prerequisites_get(*, curriculum) -> dict[int, set[int]]:
+    """Map each curriculum subject to the curriculum subjects required before it"""
+    prerequisites = {}
+    requisites = CurriculumSubjectRequisite.objects.filter(
+        curriculum_subject__curriculum=curriculum,
+        type=CurriculumSubjectRequisite.Types.PRE_REQUISITE,
+    ).values_list("curriculum_subject", "requisite_subject")
+
+    for curriculum_subject_id, requisite_subject_id in requisites:
+        prerequisites.setdefault(curriculum_subject_id, set()).add(requisite_subject_id)
+
+    return prerequisites
@@ -68,6 +68,7 @@ class ClassCreateUpdateSerializer(serializers.ModelSerializer):
     class Meta:
         model = models.Class
         fields = "__all__"
+        read_only_fields = models.Class.SEAT_FIELDS
 
 
 class CurriculumCreateUpdateSerializer(serializers.ModelSerializer):
@@ -1,5 +1,13 @@
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from rest_framework import exceptions
+
+from slu.core.students.models import EnrolledClass
+
 from .models import Room, Subject, Class, ClassGradeState
 
+CLASS_SEAT_STATUSES = [EnrolledClass.Statuses.RESERVED, EnrolledClass.Statuses.ENROLLED]
+
 
 def room_delete(*, room: Room) -> None:
     room.soft_delete()
@@ -25,3 +33,59 @@ def class_grade_state_update(
         setattr(grade_states, f"{field}_state", state)
 
     grade_states.save()
+
+
+def class_seats_update(*, class_id: int, delta: int) -> None:
+    """Reserve (+) or release (-) seats of a class with an atomic update"""
+    Class.objects.filter(id=class_id).update(enrolled_count=F("enrolled_count") + delta)
+
+
+def class_seats_lock(*, class_ids: list[int]) -> list[Class]:
+    """
+    Lock the classes until the end of the current transaction and check that
+    each has a free seat. Must be called in a transaction. Concurrent
+    reservations of the same classes wait for the lock, so the seats are taken
+    one at a time and never oversubscribed.
+    """
+    # NOTE: Lock in id order so concurrent reservations cannot deadlock
+    classes = list(
+        Class.objects.select_for_update().filter(id__in=class_ids).order_by("id")
+    )
+    full = [klass for klass in classes if klass.enrolled_count >= klass.class_size]
+
+    if full:
+        class_codes = ", ".join(klass.class_code for klass in full)
+        raise exceptions.ValidationError(f"Class {class_codes} has no available slot.")
+
+    return classes
+
+
+def class_seats_reconcile(*, dry_run: bool = False) -> list[dict]:
+    """
+    Recompute the seat counters from the enrolled classes and fix the classes
+    that drifted. Returns the drifted classes with their stored and actual
+    counts.
+    """
+    seats = (
+        EnrolledClass.objects.filter(
+            klass=OuterRef("pk"), status__in=CLASS_SEAT_STATUSES
+        )
+        .order_by()
+        .values("klass")
+        .annotate(total=Count("id"))
+        .values("total")
+    )
+    actual = Coalesce(Subquery(seats, output_field=IntegerField()), 0)
+    drifted = list(
+        Class.objects.annotate(actual=actual)
+        .exclude(enrolled_count=F("actual"))
+        .values("id", "class_code", "enrolled_count", "actual")
+        .order_by("id")
+    )
+
+    if drifted and not dry_run:
+        Class.objects.filter(id__in=[klass["id"] for klass in drifted]).update(
+            enrolled_count=actual
+        )
+
+    return drifted
@@ -0,0 +1,19 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Building, Class, ClassSchedule, Room
+from .selectors import class_offering_cache_clear
+
+
+@receiver(post_save, sender=Class)
+@receiver(post_delete, sender=Class)
+@receiver(post_save, sender=ClassSchedule)
+@receiver(post_delete, sender=ClassSchedule)
+@receiver(post_save, sender=Room)
+@receiver(post_delete, sender=Room)
+@receiver(post_save, sender=Building)
+@receiver(post_delete, sender=Building)
+def class_offering_changed(**kwargs):
+    class_offering_cache_clear()
+    transaction.on_commit(class_offering_cache_clear)
@@ -0,0 +1,21 @@
+import pytest
+
+from slu.core.cms import selectors
+
+
+@pytest.mark.django_db
+class TestClassOffering:
+    def test_class_offering_get(
+        self, semester, class_factory, django_assert_num_queries
+    ):
+        klass = class_factory(semester=semester)
+        class_factory(semester=semester, is_dissolved=True)
+
+        offering = selectors.class_offering_get(semester=semester)
+        assert list(offering) == [klass.subject_id]
+
+        with django_assert_num_queries(0):
+            selectors.class_offering_get(semester=semester)
+
+        class_factory(semester=semester)
+        assert len(selectors.class_offering_get(semester=semester)) == 2
@@ -0,0 +1,59 @@
+import pytest
+from rest_framework import exceptions
+
+from slu.core.cms import services
+from slu.core.cms.models import Class
+from slu.core.students.models import EnrolledClass
+
+
+@pytest.mark.django_db
+class TestClassSeats:
+    def test_class_seats_update(self, klass, enrollment_factory):
+        enrolled_classes = [
+            EnrolledClass.objects.create(enrollment=enrollment_factory(), klass=klass)
+            for _ in range(3)
+        ]
+        klass.refresh_from_db()
+        assert klass.enrolled_count == 3
+
+        enrolled_classes[0].status = EnrolledClass.Statuses.VOID
+        enrolled_classes[0].save()
+        enrolled_classes[1].delete()
+
+        klass.refresh_from_db()
+        assert klass.enrolled_count == 1
+
+    def test_class_seats_stale_save(self, klass, enrollment_factory):
+        stale_klass = Class.objects.get(id=klass.id)
+        EnrolledClass.objects.create(enrollment=enrollment_factory(), klass=klass)
+
+        stale_klass.remarks = "Moved to another room"
+        stale_klass.save()
+
+        klass.refresh_from_db()
+        assert klass.remarks == "Moved to another room"
+        assert klass.enrolled_count == 1
+
+    def test_class_seats_lock(self, class_factory, enrollment_factory):
+        klass = class_factory(class_size=1)
+        services.class_seats_lock(class_ids=[klass.id])
+
+        EnrolledClass.objects.create(enrollment=enrollment_factory(), klass=klass)
+
+        with pytest.raises(exceptions.ValidationError):
+            services.class_seats_lock(class_ids=[klass.id])
+
+    def test_class_seats_reconcile(self, class_factory, enrollment_factory):
+        klass = class_factory()
+        EnrolledClass.objects.create(enrollment=enrollment_factory(), klass=klass)
+        class_factory()
+
+        Class.objects.filter(id=klass.id).update(enrolled_count=5)
+
+        drifted = services.class_seats_reconcile(dry_run=True)
+        assert [(row["id"], row["actual"]) for row in drifted] == [(klass.id, 1)]
+
+        services.class_seats_reconcile()
+        klass.refresh_from_db()
+        assert klass.enrolled_count == 1
+        assert services.class_seats_reconcile() == []
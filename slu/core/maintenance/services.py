@@ -1,113 +1,142 @@
+from collections import defaultdict
 from datetime import timedelta
+from decimal import Decimal
 
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, QuerySet, Value, When
 from django.utils import timezone
 
 from slu.core import events
 from slu.core.accounts.constants import MobileModule, ReservedRole
-from slu.core.accounts.models import Role
+from slu.core.accounts.models import User
+from slu.core.accounts.selectors import role_get
+from slu.core.accounts.services import role_users_add, role_users_remove
 from slu.core.maintenance.models import EnrollmentSchedule
-from slu.core.students.selectors import (
-    student_has_remaining_balance_get,
-    student_has_failed_subject_get,
-)
-from slu.core.students.models import Student
+from slu.core.students.models import EnrollmentGrade, EnrollmentStatus, Student
+from slu.core.students.selectors import students_latest_enrolled_standing_get
+from slu.framework.utils import chunked
 
 from . import tasks
 
 
-def pre_enrollment_start(*, schedule: EnrollmentSchedule):
-    student_role = Role.objects.filter(name=ReservedRole.STUDENT).first()
-    pre_enrollment_role = Role.objects.filter(
-        name=ReservedRole.STUDENT_PRE_ENROLLMENT
-    ).first()
+def _schedule_students_get(*, schedule: EnrollmentSchedule) -> QuerySet[Student]:
+    student_role = role_get(name=ReservedRole.STUDENT)
 
     if not student_role:
-        return
+        return Student.objects.none()
 
-    student_users = student_role.user_set.filter(
-        status=schedule.student_type,
-        course=schedule.course,
-        course__school=schedule.school,
-        next_curriculum_period__year_level=schedule.year_level,
+    students = Student.active_objects.filter(
+        user__groups=student_role, year_level=schedule.year_level
     )
 
-    for user in student_users:
-        has_failed_subject = student_has_failed_subject_get(student=user.student)
-        has_remaining_balance = student_has_remaining_balance_get(user=user)
-        if has_failed_subject and has_remaining_balance:
-            user.enrollment_status = (
-                Student.EnrollmentStatuses.BLOCKED_WITH_OUTSTANDING_AND_FAILED_GRADE
-            )
-        elif has_failed_subject:
-            user.enrollment_status = (
-                Student.EnrollmentStatuses.BLOCKED_WITH_FAILED_SUBJECT
-            )
-        elif has_remaining_balance:
-            user.enrollment_status = (
-                Student.EnrollmentStatuses.BLOCKED_WITH_OUTSTANDING_BALANCE
+    if schedule.student_type:
+        students = students.filter(status=schedule.student_type)
+
+    if schedule.course_id:
+        students = students.filter(course_id=schedule.course_id)
+
+    if schedule.school_id:
+        students = students.filter(course__school_id=schedule.school_id)
+
+    return students
+
+
+def _schedule_users_get(*, schedule: EnrollmentSchedule) -> QuerySet[User]:
+    students = _schedule_students_get(schedule=schedule)
+    return User.objects.filter(id__in=students.values("user_id"))
+
+
+def _block_status_get(*, grading_status: str, balance: Decimal) -> str:
+    has_failed_subject = grading_status == EnrollmentGrade.GradingStatuses.FAILED
+    has_remaining_balance = bool(balance and balance > 0)
+
+    if has_failed_subject and has_remaining_balance:
+        return EnrollmentStatus.BlockStatuses.BLOCKED_WITH_OUTSTANDING_AND_FAILED_GRADE
+    elif has_failed_subject:
+        return EnrollmentStatus.BlockStatuses.BLOCKED_WITH_FAILED_SUBJECT
+    elif has_remaining_balance:
+        return EnrollmentStatus.BlockStatuses.BLOCKED_WITH_OUTSTANDING_BALANCE
+
+    return EnrollmentStatus.BlockStatuses.PASSED
+
+
+@transaction.atomic
+def enrollment_block_statuses_update(*, students: QuerySet[Student]):
+    """Set the block status of the latest enrolled enrollment of every student
+    with one `UPDATE ... CASE` per chunk of `SLU_UPLOAD_CHUNK_SIZE` students"""
+    standings = students_latest_enrolled_standing_get(students=students).iterator()
+
+    for chunk in chunked(standings, settings.SLU_UPLOAD_CHUNK_SIZE):
+        block_statuses = defaultdict(list)
+
+        for enrollment_id, grading_status, balance in chunk:
+            block_status = _block_status_get(
+                grading_status=grading_status, balance=balance
             )
-        else:
-            user.enrollment_status = Student.EnrollmentStatuses.ALLOWED
+            block_statuses[block_status].append(enrollment_id)
 
-        user.save()
-        user.groups.add(pre_enrollment_role)
+        enrollment_ids = [enrollment_id for enrollment_id, _, _ in chunk]
+        EnrollmentStatus.objects.bulk_create(
+            [EnrollmentStatus(enrollment_id=id) for id in enrollment_ids],
+            ignore_conflicts=True,
+        )
+        EnrollmentStatus.objects.filter(enrollment_id__in=enrollment_ids).update(
+            block_status=Case(
+                *[
+                    When(enrollment_id__in=ids, then=Value(block_status))
+                    for block_status, ids in block_statuses.items()
+                ]
+            ),
+            updated_at=timezone.now(),
+        )
 
 
-def pre_enrollment_end(*, schedule: EnrollmentSchedule):
-    student_role = Role.objects.filter(name=ReservedRole.STUDENT).first()
-    pre_enrollment_role = Role.objects.filter(
-        name=ReservedRole.STUDENT_PRE_ENROLLMENT
-    ).first()
+def pre_enrollment_start(*, schedule: EnrollmentSchedule):
+    pre_enrollment_role = role_get(name=ReservedRole.STUDENT_PRE_ENROLLMENT)
 
-    if not student_role:
+    if not pre_enrollment_role:
         return
 
-    student_users = student_role.user_set.filter(
-        status=schedule.student_type,
-        course=schedule.course,
-        course__school=schedule.school,
-        next_curriculum_period__year_level=schedule.year_level,
-    )
+    students = _schedule_students_get(schedule=schedule)
 
-    for user in student_users:
-        user.groups.remove(pre_enrollment_role)
+    with transaction.atomic():
+        enrollment_block_statuses_update(students=students)
+        role_users_add(
+            role=pre_enrollment_role, users=_schedule_users_get(schedule=schedule)
+        )
 
 
-def enrollment_start(*, schedule: EnrollmentSchedule):
-    student_role = Role.objects.filter(name=ReservedRole.STUDENT).first()
-    enrollment_role = Role.objects.filter(name=ReservedRole.STUDENT_ENROLLMENT).first()
+def pre_enrollment_end(*, schedule: EnrollmentSchedule):
+    pre_enrollment_role = role_get(name=ReservedRole.STUDENT_PRE_ENROLLMENT)
 
-    if not student_role:
+    if not pre_enrollment_role:
         return
 
-    student_users = student_role.user_set.filter(
-        status=schedule.student_type,
-        course=schedule.course,
-        course__school=schedule.school,
-        current_curriculum_period=schedule.year_level,
+    role_users_remove(
+        role=pre_enrollment_role, users=_schedule_users_get(schedule=schedule)
     )
 
-    for user in student_users:
-        user.groups.add(enrollment_role)
+
+def enrollment_start(*, schedule: EnrollmentSchedule):
+    enrollment_role = role_get(name=ReservedRole.STUDENT_ENROLLMENT)
+
+    if not enrollment_role:
+        return
+
+    role_users_add(role=enrollment_role, users=_schedule_users_get(schedule=schedule))
 
 
 def enrollment_end(*, schedule: EnrollmentSchedule):
-    student_role = Role.objects.filter(name=ReservedRole.STUDENT).first()
-    enrollment_role = Role.objects.filter(name=ReservedRole.STUDENT_ENROLLMENT).first()
+    enrollment_role = role_get(name=ReservedRole.STUDENT_ENROLLMENT)
 
-    if not student_role:
+    if not enrollment_role:
         return
 
-    student_users = student_role.user_set.filter(
-        status=schedule.student_type,
-        course=schedule.course,
-        course__school=schedule.school,
-        current_curriculum_period=schedule.year_level,
+    role_users_remove(
+        role=enrollment_role, users=_schedule_users_get(schedule=schedule)
     )
 
-    for user in student_users:
-        user.groups.remove(enrollment_role)
-
 
 def enrollment_upcoming_schedule_watch():
     now = timezone.now()
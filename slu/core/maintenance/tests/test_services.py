@@ -0,0 +1,170 @@
+from datetime import timedelta
+
+import pytest
+from django.utils import timezone
+
+from slu.core.accounts.constants import ReservedRole
+from slu.core.maintenance import services
+from slu.core.maintenance.models import EnrollmentSchedule
+from slu.core.students.models import (
+    Enrollment,
+    EnrollmentGrade,
+    EnrollmentStatus,
+    Student,
+)
+from slu.core.students.selectors import students_latest_enrolled_standing_get
+from slu.payment.models import StatementOfAccount
+
+
+def _schedule_create(**kwargs):
+    now = timezone.now()
+    return EnrollmentSchedule.objects.create(
+        start_datetime=now,
+        end_datetime=now + timedelta(days=7),
+        year_level=1,
+        **kwargs,
+    )
+
+
+def _enrolled_create(enrollment_factory, *, student, grading_status, balance):
+    enrollment = enrollment_factory(
+        student=student, status=Enrollment.Statuses.ENROLLED
+    )
+    EnrollmentGrade.objects.create(enrollment=enrollment, grading_status=grading_status)
+    soa = StatementOfAccount.objects.create(
+        user=student.user,
+        enrollment=enrollment,
+        total_amount=balance,
+        min_amount=0,
+        min_amount_due_date=timezone.now(),
+    )
+
+    if balance:
+        soa.transactions.create(student=student, amount=balance, description="Fee")
+
+    return enrollment
+
+
+@pytest.mark.django_db
+class TestEnrollmentBlockStatuses:
+    def test_update(self, student_factory, enrollment_factory, settings):
+        settings.SLU_UPLOAD_CHUNK_SIZE = 2
+        grading_statuses = EnrollmentGrade.GradingStatuses
+        block_statuses = EnrollmentStatus.BlockStatuses
+        cases = [
+            (grading_statuses.PASSED, 0, block_statuses.PASSED),
+            (grading_statuses.FAILED, 0, block_statuses.BLOCKED_WITH_FAILED_SUBJECT),
+            (
+                grading_statuses.PASSED,
+                500,
+                block_statuses.BLOCKED_WITH_OUTSTANDING_BALANCE,
+            ),
+            (
+                grading_statuses.FAILED,
+                500,
+                block_statuses.BLOCKED_WITH_OUTSTANDING_AND_FAILED_GRADE,
+            ),
+        ]
+        expected = {}
+
+        for grading_status, balance, block_status in cases:
+            student = student_factory()
+            # NOTE: Only the latest enrolled enrollment is considered
+            _enrolled_create(
+                enrollment_factory,
+                student=student,
+                grading_status=grading_statuses.FAILED,
+                balance=1000,
+            )
+            enrollment = _enrolled_create(
+                enrollment_factory,
+                student=student,
+                grading_status=grading_status,
+                balance=balance,
+            )
+            expected[enrollment.id] = block_status
+
+        not_enrolled = enrollment_factory(status=Enrollment.Statuses.PRE_ENROLLED)
+
+        standings = students_latest_enrolled_standing_get(
+            students=Student.objects.all()
+        )
+        assert {enrollment_id for enrollment_id, _, _ in standings} == set(expected)
+
+        services.enrollment_block_statuses_update(students=Student.objects.all())
+
+        assert (
+            dict(
+                EnrollmentStatus.objects.filter(block_status__isnull=False).values_list(
+                    "enrollment_id", "block_status"
+                )
+            )
+            == expected
+        )
+        assert not EnrollmentStatus.objects.filter(enrollment=not_enrolled).exists()
+
+
+@pytest.mark.django_db
+class TestEnrollmentSchedule:
+    def test_schedule_students_get(self, student_factory, role_factory):
+        schedule = _schedule_create()
+        assert not services._schedule_students_get(schedule=schedule).exists()
+
+        student_role = role_factory(name=ReservedRole.STUDENT)
+        students = [
+            student_factory(year_level="1", status=Student.Statuses.REGULAR),
+            student_factory(year_level="1", status=Student.Statuses.SCHOLAR),
+            student_factory(year_level="2", status=Student.Statuses.REGULAR),
+        ]
+        student_factory(year_level="1")
+
+        for student in students:
+            student.user.groups.add(student_role)
+
+        def students_get(**kwargs):
+            schedule = _schedule_create(**kwargs)
+            return set(services._schedule_students_get(schedule=schedule))
+
+        assert students_get() == set(students[:2])
+        assert students_get(student_type=Student.Statuses.SCHOLAR) == {students[1]}
+        assert students_get(course=students[0].course) == {students[0]}
+        assert students_get(school=students[1].course.school) == {students[1]}
+
+    def test_transitions(
+        self, student_factory, enrollment_factory, role_factory, settings
+    ):
+        settings.SLU_UPLOAD_CHUNK_SIZE = 2
+        student_role = role_factory(name=ReservedRole.STUDENT)
+        pre_enrollment_role = role_factory(name=ReservedRole.STUDENT_PRE_ENROLLMENT)
+        enrollment_role = role_factory(name=ReservedRole.STUDENT_ENROLLMENT)
+        students = [student_factory(year_level="1") for _ in range(3)]
+        other_student = student_factory(year_level="2")
+
+        for student in [*students, other_student]:
+            student.user.groups.add(student_role)
+
+        enrollment = _enrolled_create(
+            enrollment_factory,
+            student=students[0],
+            grading_status=EnrollmentGrade.GradingStatuses.PASSED,
+            balance=500,
+        )
+        users = {student.user for student in students}
+        schedule = _schedule_create()
+
+        services.pre_enrollment_start(schedule=schedule)
+        assert set(pre_enrollment_role.user_set.all()) == users
+        assert (
+            EnrollmentStatus.objects.get(enrollment=enrollment).block_status
+            == EnrollmentStatus.BlockStatuses.BLOCKED_WITH_OUTSTANDING_BALANCE
+        )
+
+        services.pre_enrollment_end(schedule=schedule)
+        assert not pre_enrollment_role.user_set.exists()
+
+        services.enrollment_start(schedule=schedule)
+        assert set(enrollment_role.user_set.all()) == users
+
+        services.enrollment_end(schedule=schedule)
+        assert not enrollment_role.user_set.exists()
+        assert set(student_role.user_set.all()) == {*users, other_student.user}
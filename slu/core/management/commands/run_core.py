@@ -1,20 +1,55 @@
+import signal
+
 from django.conf import settings
 from django.core.management.base import BaseCommand
 from django.utils import timezone
 from kombu import Connection
 
 from slu.core import services
-from slu.framework.events import EventConsumer
+from slu.framework.events import EventConsumer, PoolEventConsumer
 
 
 class Command(BaseCommand):
     help = "Run core service consumer"
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=4,
+            help="Number of handler threads. Use 1 to process messages one at a time.",
+        )
+        parser.add_argument(
+            "--prefetch-count",
+            type=int,
+            default=None,
+            help="Number of unacked messages prefetched (default: twice the workers)",
+        )
+        parser.add_argument(
+            "--drain-timeout",
+            type=float,
+            default=30,
+            help="Seconds to wait for prefetched messages on shutdown",
+        )
+
     def handle(self, *args, **options):
         self.stdout.write(f"[{timezone.now()}] - core service consumer starting")
 
         with Connection(settings.EVENT_BROKER_URL) as conn:
-            consumer = EventConsumer(
-                service_name="core", services=services, connection=conn
-            )
+            if options["workers"] > 1:
+                consumer = PoolEventConsumer(
+                    service_name="core",
+                    services=services,
+                    connection=conn,
+                    workers=options["workers"],
+                    prefetch_count=options["prefetch_count"],
+                    drain_timeout=options["drain_timeout"],
+                )
+            else:
+                consumer = EventConsumer(
+                    service_name="core", services=services, connection=conn
+                )
+
+            signal.signal(signal.SIGTERM, consumer.stop)
+            signal.signal(signal.SIGINT, consumer.stop)
             consumer.run()
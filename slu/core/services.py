@@ -1,7 +1,6 @@
-from decimal import Decimal
-
 from slu.core.students.models import Enrollment, GradeFields, GradeStates
 from slu.framework.events import GenericModelEvent
+from slu.payment.selectors import soa_get_payment_totals
 
 from .students.services import (
     enrollment_enrolled,
@@ -9,6 +8,17 @@ from .students.services import (
     grade_sheet_publish,
 )
 
+# NOTE: Lanes and concurrency limits of the pooled consumer, see
+# `PoolEventConsumer`. Payments mark students enrolled so they run first.
+EVENT_PRIORITIES = {
+    "payment_success": 0,
+}
+EVENT_CONCURRENCY = {
+    "grade_sheet_created": 1,
+    "grade_sheet_drafted": 1,
+    "grade_sheet_submitted": 1,
+}
+
 
 def handle_payment_success(event: GenericModelEvent):
     transaction = event.object.get_from_db()
@@ -18,11 +28,7 @@ def handle_payment_success(event: GenericModelEvent):
 
     soa = transaction.soa
     enrollment = soa.enrollment
-    total_paid = Decimal(0)
-
-    for payment in soa.payments.all():
-        if payment.is_successful() or payment.is_settled():
-            total_paid += payment.amount
+    total_paid = soa_get_payment_totals(soa=soa)["received"]
 
     if (
         total_paid >= soa.min_amount
@@ -6,3 +6,6 @@ class StudentsConfig(AppConfig):
     label = "core_students"
     verbose_name = "Students"
     default_auto_field = "django.db.models.BigAutoField"
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -1,43 +1,199 @@
-import sys
+import json
+import multiprocessing
+import os
+import time
+from collections import deque
+from functools import reduce
+from operator import or_
 
 from django.core.management.base import BaseCommand
+from django.db import connections
+from django.db.models import Q
 
-from slu.core.accounts.models import AcademicYear, Semester
 from slu.core.students.models import Enrollment
-from slu.framework.utils import LoadScreen
-from slu.payment.services import soa_create
+from slu.framework.utils import LoadScreen, chunked
+from slu.payment.services import soa_range_generate
+from slu.payment.tasks import async_soa_range_generate
 
 load_screen = LoadScreen()
-sem_mapping = {
-    "1": Semester.Terms.FIRST_SEMESTER,
-    "2": Semester.Terms.SECOND_SEMESTER,
-    "3": Semester.Terms.SUMMER,
-}
+
+
+def _shard_process(shard):
+    start_id, end_id, override = shard
+    counter = soa_range_generate(start_id=start_id, end_id=end_id, override=override)
+    return start_id, end_id, counter
 
 
 class Command(BaseCommand):
     help = (
-        "Generate SOA for all enrollments excluding the inputted specific AY and term"
+        "Generate SOA for all enrollments. Enrollments are sharded by id range and "
+        "processed by a local process pool or dispatched as Celery tasks."
     )
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=1,
+            help="Number of local worker processes",
+        )
+        parser.add_argument(
+            "--shard-size",
+            type=int,
+            default=500,
+            help="Number of enrollments per shard",
+        )
+        parser.add_argument(
+            "--celery",
+            action="store_true",
+            help=(
+                "Dispatch each shard as a Celery task instead of processing "
+                "locally. Checkpoints and throughput are only kept locally"
+            ),
+        )
+        parser.add_argument(
+            "--override",
+            action="store_true",
+            help=(
+                "Rebuild the fees of enrollments that already have an SOA, "
+                "payments and adjustments are kept"
+            ),
+        )
+        parser.add_argument(
+            "--checkpoint",
+            default="generate_soa.checkpoint",
+            help="File recording the progress of an interrupted local run",
+        )
+        parser.add_argument(
+            "--restart",
+            action="store_true",
+            help="Ignore the checkpoint of a previous run",
+        )
+
+    def _checkpoint_load(self, path):
+        if not os.path.exists(path):
+            return {"high_water_mark": 0, "completed": []}
+
+        with open(path) as checkpoint:
+            return json.load(checkpoint)
+
+    def _checkpoint_save(self, path, checkpoint):
+        with open(f"{path}.tmp", "w") as checkpoint_file:
+            json.dump(checkpoint, checkpoint_file)
+
+        os.replace(f"{path}.tmp", path)
+
+    def _shards_get(self, *, shard_size, override, checkpoint, dispatched):
+        enrollments = Enrollment.objects.filter(
+            id__gt=checkpoint["high_water_mark"]
+        ).order_by("id")
+
+        # NOTE: Anti-join so enrollments with an SOA are never streamed
+        if not override:
+            enrollments = enrollments.filter(statement_of_account__isnull=True)
+
+        # NOTE: Only the shards that finished out of order are kept past the
+        # high-water mark, so there are at most a few per worker
+        if checkpoint["completed"]:
+            enrollments = enrollments.exclude(
+                reduce(or_, (Q(id__range=shard) for shard in checkpoint["completed"]))
+            )
+
+        ids = enrollments.values_list("id", flat=True).iterator()
+
+        for chunk in chunked(ids, shard_size):
+            dispatched.append((chunk[0], chunk[-1]))
+            yield chunk[0], chunk[-1], override
+
+    def _checkpoint_advance(self, *, checkpoint, dispatched, completed, shard):
+        """Move the high-water mark past every shard dispatched before the
+        first unfinished one and keep the out of order ones in `completed`"""
+        completed.add(shard)
+
+        while dispatched and dispatched[0] in completed:
+            completed.remove(dispatched[0])
+            checkpoint["high_water_mark"] = dispatched.popleft()[1]
+
+        checkpoint["completed"] = sorted(
+            [start_id, end_id]
+            for start_id, end_id in completed
+            if end_id > checkpoint["high_water_mark"]
+        )
+
     def handle(self, *args, **options):
-        spinner = load_screen.spinning_cursor()
-        sys.stdout.write("Statement of account generation... ")
-        counter = 0
+        override = options["override"]
+        checkpoint_path = options["checkpoint"]
+        checkpoint = (
+            {"high_water_mark": 0, "completed": []}
+            if options["restart"]
+            else self._checkpoint_load(checkpoint_path)
+        )
+        completed = {tuple(shard) for shard in checkpoint["completed"]}
+        dispatched = deque()
+
+        if checkpoint["high_water_mark"] or completed:
+            self.stdout.write(
+                f"Resuming after enrollment {checkpoint['high_water_mark']} "
+                f"and {len(completed)} completed shards."
+            )
 
-        for enrollment in Enrollment.objects.all():
-            # load_screen.spinner(spinner)
-            if hasattr(enrollment, "statement_of_account"):
-                continue
+        shards = self._shards_get(
+            shard_size=options["shard_size"],
+            override=override,
+            checkpoint=checkpoint,
+            dispatched=dispatched,
+        )
 
-            soa = soa_create(enrollment=enrollment, discount_auto_apply=True)
-            soa.transactions.create(
-                student=enrollment.student,
-                description=f"System Uploaded Payment Transaction",
-                amount=-abs(soa.total_amount),
+        # NOTE: No result backend is configured, so Celery shards are neither
+        # checkpointed nor timed here. Re-runs skip enrollments with an SOA.
+        if options["celery"]:
+            for start_id, end_id, override in shards:
+                async_soa_range_generate.delay(start_id, end_id, override)
+
+            load_screen.print_statement(
+                f"\nDISPATCHED {len(dispatched)} SOA GENERATION SHARDS.\n", None
             )
+            return
+
+        started_at = time.monotonic()
+        counter = 0
+
+        if options["workers"] > 1:
+            # NOTE: Forked workers must not share the parent's connection
+            connections.close_all()
+            pool = multiprocessing.Pool(options["workers"])
+            results = pool.imap_unordered(_shard_process, shards)
+        else:
+            pool = None
+            results = map(_shard_process, shards)
+
+        try:
+            for start_id, end_id, shard_counter in results:
+                counter += shard_counter
+                self._checkpoint_advance(
+                    checkpoint=checkpoint,
+                    dispatched=dispatched,
+                    completed=completed,
+                    shard=(start_id, end_id),
+                )
+                self._checkpoint_save(checkpoint_path, checkpoint)
+
+                elapsed = max(time.monotonic() - started_at, 0.001)
+                self.stdout.write(
+                    f"Shard {start_id}-{end_id}: {shard_counter} enrollments "
+                    f"({counter} total, {counter / elapsed:.1f}/s)"
+                )
+        finally:
+            if pool:
+                pool.terminate()
+                pool.join()
 
-            counter += 1
+        if os.path.exists(checkpoint_path):
+            os.remove(checkpoint_path)
 
-        message = f"\nSUCCESSFULLY PROCESSED {counter} ENROLLMENT DATA.\n"
+        elapsed = max(time.monotonic() - started_at, 0.001)
+        message = (
+            f"\nSUCCESSFULLY PROCESSED {counter} ENROLLMENT DATA "
+            f"in {elapsed:.1f}s ({counter / elapsed:.1f}/s).\n"
+        )
         load_screen.print_statement(message, None)
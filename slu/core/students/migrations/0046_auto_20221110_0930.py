@@ -0,0 +1,23 @@
+# Generated by Django 3.2.14 on 2022-11-10 01:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core_students', '0045_auto_20221106_1224'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='gradesheet',
+            name='processed_rows',
+            field=models.IntegerField(default=0, help_text='Worksheet rows processed so far'),
+        ),
+        migrations.AddField(
+            model_name='gradesheet',
+            name='total_rows',
+            field=models.IntegerField(default=0, help_text='Total worksheet rows'),
+        ),
+    ]
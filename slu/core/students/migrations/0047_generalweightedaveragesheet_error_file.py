@@ -0,0 +1,19 @@
+# Generated by Django 3.2.14 on 2022-11-10 02:15
+
+from django.db import migrations, models
+import slu.core.students.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core_students', '0046_auto_20221110_0930'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='generalweightedaveragesheet',
+            name='error_file',
+            field=models.FileField(blank=True, help_text='Per-row report of the invalid entries', upload_to=slu.core.students.models.gwa_sheet_error_file_path),
+        ),
+    ]
@@ -512,6 +512,10 @@ class GradeSheet(BaseModel):
         max_length=2, choices_cls=Statuses, default=Statuses.PENDING
     )
     error_message = models.TextField(blank=True)
+    total_rows = models.IntegerField(default=0, help_text="Total worksheet rows")
+    processed_rows = models.IntegerField(
+        default=0, help_text="Worksheet rows processed so far"
+    )
 
     def __str__(self):
         return f"Grade Sheet {self.file_id}"
@@ -565,6 +569,11 @@ def gwa_sheet_file_path(instance, filename):
     return f"gwa_sheets/{file_name}.{file_ext}"
 
 
+def gwa_sheet_error_file_path(instance, filename):
+    file_name = str(uuid.uuid4()).replace("-", "")
+    return f"gwa_sheets/errors/{file_name}.csv"
+
+
 class GeneralWeightedAverageSheet(BaseModel):
     class Statuses(models.TextChoices):
         PENDING = "P", "Pending"
@@ -591,6 +600,11 @@ class GeneralWeightedAverageSheet(BaseModel):
         default=0, help_text="Entries with student IDs not found"
     )
     total = models.IntegerField(default=0, help_text="Total processed data")
+    error_file = models.FileField(
+        upload_to=gwa_sheet_error_file_path,
+        blank=True,
+        help_text="Per-row report of the invalid entries",
+    )
 
     def __str__(self):
         return f"GWA Sheet {self.file_id}"
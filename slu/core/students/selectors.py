@@ -1,14 +1,25 @@
 from decimal import Decimal
+from typing import Iterable
 
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db.models import Count, OuterRef, Q, QuerySet, Subquery
+from django.db.models.functions import TruncDate
 from rest_framework import exceptions
 
+from slu.core.accounts.models import School, Semester
 from slu.core.accounts.selectors import current_semester_get, next_semester_get
 from slu.core.cms.models import Class, Course, CurriculumPeriod, CurriculumSubject
-from slu.core.cms.selectors import class_tuition_fee_get, subject_has_class
+from slu.core.cms.selectors import class_offering_get, class_tuition_fee_get
 from slu.payment.models import BukasTransaction, StatementOfAccount
 
-from .models import EnrolledClass, EnrolledClassGrade, Enrollment, Student
+from .models import (
+    EnrolledClass,
+    EnrolledClassGrade,
+    Enrollment,
+    EnrollmentGrade,
+    Student,
+)
 
 User = get_user_model()
 
@@ -225,6 +236,36 @@ def student_has_remaining_balance_get(*, user: User) -> bool:
     return latest_enrollment.statement_of_account.get_remaining_balance() > 0
 
 
+def students_latest_enrolled_standing_get(*, students: QuerySet[Student]) -> QuerySet:
+    """
+    Return `(enrollment_id, grading_status, balance)` of the latest enrolled
+    enrollment of every student that has one. The grading status and the
+    maintained SOA balance are read with subqueries for the whole cohort, see
+    `student_has_failed_subject_get` and `student_has_remaining_balance_get`
+    for a single student.
+    """
+    latest_enrolled = Enrollment.objects.filter(
+        student=OuterRef("pk"), status=Enrollment.Statuses.ENROLLED
+    ).order_by("-created_at")
+    balances = StatementOfAccount.objects.filter(
+        enrollment=OuterRef("enrollment_id")
+    ).values("balance")
+    grading_statuses = EnrollmentGrade.objects.filter(
+        enrollment=OuterRef("enrollment_id")
+    ).values("grading_status")
+
+    return (
+        students.annotate(enrollment_id=Subquery(latest_enrolled.values("id")[:1]))
+        .filter(enrollment_id__isnull=False)
+        .annotate(
+            grading_status=Subquery(grading_statuses[:1]),
+            balance=Subquery(balances[:1]),
+        )
+        .order_by()
+        .values_list("enrollment_id", "grading_status", "balance")
+    )
+
+
 def next_semester_enrollment_list() -> list[Enrollment]:
     next_semester = next_semester_get()
     enrollments = Enrollment.objects.none
@@ -266,23 +307,130 @@ def enrollment_latest_enrolled_total_units_get(*, user: User):
     return units
 
 
+ACADEMIC_PROGRESS_CACHE_KEY = "students:academic_progress:{student_id}"
+# NOTE: Grades are published by the event consumer, which clears the progress
+# through the shared cache. The short timeout bounds how stale a progress read
+# can be should a clear be missed.
+ACADEMIC_PROGRESS_CACHE_TIMEOUT = 60 * 10
+
+
+def academic_progress_cache_clear(*, student_ids: Iterable[int]):
+    cache.delete_many(
+        [
+            ACADEMIC_PROGRESS_CACHE_KEY.format(student_id=student_id)
+            for student_id in student_ids
+        ]
+    )
+
+
+def student_academic_progress_get(*, student: Student) -> dict:
+    """
+    Return the ids of the curriculum subjects the student has taken and passed,
+    and the final grade of the latest class taken for each curriculum subject.
+    The progress is read in one query and cached for a few minutes, or until
+    the student's classes or grades change.
+    """
+    cache_key = ACADEMIC_PROGRESS_CACHE_KEY.format(student_id=student.id)
+    progress = cache.get(cache_key)
+
+    if progress is not None:
+        return progress
+
+    progress = {"taken": set(), "passed": set(), "final_grades": {}}
+    rows = (
+        EnrolledClass.objects.filter(student=student, curriculum_subject__isnull=False)
+        .order_by("curriculum_subject", "-created_at", "-id")
+        .values_list(
+            "curriculum_subject", "status", "grades__status", "grades__final_grade"
+        )
+    )
+
+    for curr_subj_id, status, grade_status, final_grade in rows:
+        # NOTE: The first row of each curriculum subject is its latest class
+        progress["final_grades"].setdefault(curr_subj_id, final_grade)
+
+        if status != EnrolledClass.Statuses.ENROLLED:
+            continue
+
+        progress["taken"].add(curr_subj_id)
+
+        if grade_status == EnrolledClassGrade.Statuses.PASSED:
+            progress["passed"].add(curr_subj_id)
+
+    cache.set(cache_key, progress, ACADEMIC_PROGRESS_CACHE_TIMEOUT)
+    return progress
+
+
 def enrollment_subjects_list(
-    *, student: Student, passed_curr_subj_ids=list[int]
+    *, student: Student, passed_curr_subj_ids=list[int], offering: dict = None
 ) -> list[CurriculumSubject]:
     """
     List all curriculum subjects that the authenticated can
     select for current enrollment
     """
-    curriculum_subjects = student.curriculum.subjects.all()
-    next_semester = next_semester_get()
+    if offering is None:
+        offering = class_offering_get(semester=next_semester_get())
 
-    curr_subj_ids = []
-    for curr_subj in curriculum_subjects.exclude(id__in=passed_curr_subj_ids):
-        has_class = subject_has_class(subject=curr_subj.subject, semester=next_semester)
+    return student.curriculum.subjects.exclude(id__in=passed_curr_subj_ids).filter(
+        subject__in=[subject_id for subject_id in offering if subject_id]
+    )
 
-        if not has_class:
-            continue
 
-        curr_subj_ids.append(curr_subj.id)
+def _enrollment_per_school_get(
+    *, schools: list[School], semester: Semester, year_level: str = None
+):
+    enrollments = Enrollment.objects.filter(
+        semester=semester, student__course__school__in=schools
+    )
+
+    # TODO: Custom filterclass for year_level
+    if year_level and year_level.isnumeric():
+        enrollments = enrollments.filter(year_level=year_level)
+
+    return enrollments
+
+
+def enrollment_per_school_counts_get(
+    *, schools: list[School], semester: Semester, year_level: str = None, **metrics: Q
+) -> dict[int, dict[str, int]]:
+    """
+    Count the enrollments of each school in one grouped query. Each keyword
+    argument names a metric and the filter its enrollments should match.
+    """
+    rows = (
+        _enrollment_per_school_get(
+            schools=schools, semester=semester, year_level=year_level
+        )
+        .values("student__course__school")
+        .annotate(
+            **{
+                name: Count("id", filter=condition, distinct=True)
+                for name, condition in metrics.items()
+            }
+        )
+        .order_by()
+    )
+
+    return {row.pop("student__course__school"): row for row in rows}
+
+
+def enrollment_per_day_per_school_get(
+    *, schools: list[School], semester: Semester, year_level: str = None
+) -> dict[int, list[dict]]:
+    """Group the enrolled enrollments of each school by enrollment date"""
+    rows = (
+        _enrollment_per_school_get(
+            schools=schools, semester=semester, year_level=year_level
+        )
+        .filter(status=Enrollment.Statuses.ENROLLED)
+        .annotate(created_at__date=TruncDate("created_at"))
+        .values("student__course__school", "created_at__date")
+        .annotate(total=Count("id"))
+        .order_by("created_at__date")
+    )
+
+    enrollees = {}
+    for row in rows:
+        enrollees.setdefault(row.pop("student__course__school"), []).append(row)
 
-    return CurriculumSubject.objects.filter(id__in=curr_subj_ids)
+    return enrollees
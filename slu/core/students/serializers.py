@@ -2,12 +2,11 @@ from decimal import Decimal
 from typing import Union
 
 from django.contrib.auth import get_user_model
-from django.db.models import Count
-from django.db.models.functions import TruncDate
+from django.db.models import Q
 from rest_framework import serializers
 
 from slu.core.accounts.models import AcademicYear, Personnel, School, Semester
-from slu.core.accounts.selectors import current_semester_get, next_semester_get
+from slu.core.accounts.selectors import next_semester_get
 from slu.core.cms.models import (
     Building,
     Class,
@@ -752,25 +751,14 @@ class StudentCurriculumSubjectSerializer(serializers.ModelSerializer):
         model = CurriculumSubject
         fields = ("subject", "requisites", "is_passed", "is_taken", "final_grade")
 
-    def get_is_passed(self, obj):
-        curr_subj_ids = self.context["passed_curr_subj_ids"]
-        return obj.id in curr_subj_ids
+    def get_is_passed(self, obj) -> bool:
+        return obj.id in self.context["academic_progress"]["passed"]
 
-    def get_is_taken(self, obj):
-        curr_subj_ids = self.context["curr_subj_ids"]
-        return obj.id in curr_subj_ids
+    def get_is_taken(self, obj) -> bool:
+        return obj.id in self.context["academic_progress"]["taken"]
 
     def get_final_grade(self, obj):
-        student = self.context["student"]
-        enrolled_class = (
-            student.enrolled_classes.filter(curriculum_subject=obj)
-            .order_by("-created_at")
-            .first()
-        )
-        if enrolled_class:
-            return enrolled_class.grades.final_grade
-
-        return None
+        return self.context["academic_progress"]["final_grades"].get(obj.id)
 
 
 class StudentCurriculumRetrieveSerializer(serializers.ModelSerializer):
@@ -1128,7 +1116,28 @@ class StudentClassListSerializer(serializers.ModelSerializer):
         fields = ("class_code", "subject", "class_schedules")
 
 
-class FailedStudentPerSchoolSerializer(serializers.ModelSerializer):
+class SchoolMetricSerializer(serializers.ModelSerializer):
+    """
+    Base serializer for the per-school dashboards. The view computes every
+    school's metrics up front and passes them as `school_metrics` in the
+    context, keyed by school id.
+    """
+
+    metrics = {}
+
+    def get_metric(self, obj, name, default=0):
+        return self.context["school_metrics"].get(obj.id, {}).get(name, default)
+
+
+class FailedStudentPerSchoolSerializer(SchoolMetricSerializer):
+    metrics = {
+        "no_of_failed_students": Q(
+            grade__grading_status=models.EnrollmentGrade.GradingStatuses.FAILED,
+            enrollmentstatus__is_for_manual_tagging=False,
+            enrollmentstatus__block_status=models.EnrollmentStatus.BlockStatuses.BLOCKED_WITH_FAILED_SUBJECT,
+        ),
+    }
+
     no_of_failed_students = serializers.SerializerMethodField()
 
     class Meta:
@@ -1136,25 +1145,18 @@ class FailedStudentPerSchoolSerializer(serializers.ModelSerializer):
         fields = ("code", "name", "no_of_failed_students")
 
     def get_no_of_failed_students(self, obj) -> int:
-        year_level = self.context["year_level"]
-        semester = current_semester_get()
+        return self.get_metric(obj, "no_of_failed_students")
 
-        enrollments = models.Enrollment.objects.filter(
-            semester=semester,
-            student__course__school=obj,
+
+class InterviewedFailedStudentPerSchoolSerializer(SchoolMetricSerializer):
+    metrics = {
+        "no_of_interviewed_students": Q(
             grade__grading_status=models.EnrollmentGrade.GradingStatuses.FAILED,
-            enrollmentstatus__is_for_manual_tagging=False,
+            enrollmentstatus__is_for_manual_tagging=True,
             enrollmentstatus__block_status=models.EnrollmentStatus.BlockStatuses.BLOCKED_WITH_FAILED_SUBJECT,
-        )
-
-        # TODO: Custom filterclass for year_level
-        if year_level and year_level.isnumeric():
-            enrollments = enrollments.filter(year_level=year_level)
-
-        return enrollments.count()
-
+        ),
+    }
 
-class InterviewedFailedStudentPerSchoolSerializer(serializers.ModelSerializer):
     no_of_interviewed_students = serializers.SerializerMethodField()
 
     class Meta:
@@ -1162,25 +1164,12 @@ class InterviewedFailedStudentPerSchoolSerializer(serializers.ModelSerializer):
         fields = ("code", "name", "no_of_interviewed_students")
 
     def get_no_of_interviewed_students(self, obj) -> int:
-        year_level = self.context["year_level"]
-        semester = current_semester_get()
-
-        enrollments = models.Enrollment.objects.filter(
-            semester=semester,
-            student__course__school=obj,
-            grade__grading_status=models.EnrollmentGrade.GradingStatuses.FAILED,
-            enrollmentstatus__is_for_manual_tagging=True,
-            enrollmentstatus__block_status=models.EnrollmentStatus.BlockStatuses.BLOCKED_WITH_FAILED_SUBJECT,
-        )
-
-        # TODO: Custom filterclass for year_level
-        if year_level and year_level.isnumeric():
-            enrollments = enrollments.filter(year_level=year_level)
+        return self.get_metric(obj, "no_of_interviewed_students")
 
-        return enrollments.count()
 
+class EnrolleesPerSchoolSerializer(SchoolMetricSerializer):
+    metrics = {"no_of_enrollees": Q()}
 
-class EnrolleesPerSchoolSerializer(serializers.ModelSerializer):
     no_of_enrollees = serializers.SerializerMethodField()
 
     class Meta:
@@ -1188,18 +1177,7 @@ class EnrolleesPerSchoolSerializer(serializers.ModelSerializer):
         fields = ("code", "name", "no_of_enrollees")
 
     def get_no_of_enrollees(self, obj) -> int:
-        year_level = self.context["year_level"]
-        semester = current_semester_get()
-
-        enrollments = models.Enrollment.objects.filter(
-            semester=semester, student__course__school=obj
-        )
-
-        # TODO: Custom filterclass for year_level
-        if year_level and year_level.isnumeric():
-            enrollments = enrollments.filter(year_level=year_level)
-
-        return enrollments.count()
+        return self.get_metric(obj, "no_of_enrollees")
 
 
 class GradeSheetDetailApiSerializer(serializers.ModelSerializer):
@@ -1230,10 +1208,23 @@ class GradeSheetDetailApiSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = models.GradeSheet
-        fields = ("file_id", "klass", "status", "error_message", "rows")
+        fields = (
+            "file_id",
+            "klass",
+            "status",
+            "error_message",
+            "total_rows",
+            "processed_rows",
+            "rows",
+        )
+
 
+class EnrolleeScholarPerSchoolSerializer(SchoolMetricSerializer):
+    metrics = {
+        "no_of_scholar": Q(discounts__validated_discount__isnull=False),
+        "no_of_regular": Q(),
+    }
 
-class EnrolleeScholarPerSchoolSerializer(serializers.ModelSerializer):
     no_of_regular = serializers.SerializerMethodField()
     no_of_scholar = serializers.SerializerMethodField()
 
@@ -1242,41 +1233,37 @@ class EnrolleeScholarPerSchoolSerializer(serializers.ModelSerializer):
         fields = ("code", "name", "no_of_scholar", "no_of_regular")
 
     def get_no_of_scholar(self, obj) -> int:
-        year_level = self.context["year_level"]
-        semester = current_semester_get()
-
-        enrollments = models.Enrollment.objects.filter(
-            semester=semester, student__course__school=obj, discount__isnull=False
-        )
-
-        # TODO: Custom filterclass for year_level
-        if year_level and year_level.isnumeric():
-            enrollments = enrollments.filter(year_level=year_level)
-
-        return enrollments.count()
+        return self.get_metric(obj, "no_of_scholar")
 
     def get_no_of_regular(self, obj) -> int:
-        year_level = self.context["year_level"]
-        semester = current_semester_get()
-
-        enrollments = models.Enrollment.objects.filter(
-            semester=semester, student__course__school=obj
-        )
-
-        # TODO: Custom filterclass for year_level
-        if year_level and year_level.isnumeric():
-            enrollments = enrollments.filter(year_level=year_level)
-
-        return enrollments.count()
+        return self.get_metric(obj, "no_of_regular")
 
 
 class EnrollmentGWAUploadSerializer(serializers.ModelSerializer):
     class Meta:
         model = models.GeneralWeightedAverageSheet
-        fields = ("file",)
+        fields = (
+            "file_id",
+            "file",
+            "status",
+            "error_message",
+            "success",
+            "invalid",
+            "total",
+            "error_file",
+        )
+        read_only_fields = (
+            "file_id",
+            "status",
+            "error_message",
+            "success",
+            "invalid",
+            "total",
+            "error_file",
+        )
 
 
-class EnrolleesPerDayPerSchoolSerializer(serializers.ModelSerializer):
+class EnrolleesPerDayPerSchoolSerializer(SchoolMetricSerializer):
     enrollees_count = serializers.SerializerMethodField()
 
     class Meta:
@@ -1287,29 +1274,8 @@ class EnrolleesPerDayPerSchoolSerializer(serializers.ModelSerializer):
             "enrollees_count",
         )
 
-    def get_enrollees_count(self, obj) -> int:
-        year_level = self.context["year_level"]
-        semester = current_semester_get()
-
-        enrollees = (
-            models.Enrollment.objects.filter(
-                semester=semester,
-                student__course__school=obj,
-                status=models.Enrollment.Statuses.ENROLLED,
-            )
-            .annotate(created_at__date=TruncDate("created_at__date"))
-            .order_by("created_at__date")
-            .values("created_at__date")
-            .annotate(**{"total": Count("created_at__date")})
-        )
-
-        # TODO: Custom filterclass for year_level
-        if year_level and year_level.isnumeric():
-            enrollees = enrollees.filter(
-                year_level=year_level,
-            )
-
-        return enrollees
+    def get_enrollees_count(self, obj) -> list:
+        return self.context["school_metrics"].get(obj.id, [])
 
 
 class StudentRequestCreateSerializer(serializers.ModelSerializer):
@@ -1638,10 +1604,11 @@ class StudentEnrollmentSubjectListSerializer(serializers.ModelSerializer):
         fields=("id", "class_code", "has_available_slot", "class_schedules"),
         declared_fields={
             "class_schedules": ClassScheduleSerializer(many=True),
-            "has_available_slot": serializers.BooleanField(
-                source="has_available_slot_for_reservation"
-            ),
+            "has_available_slot": serializers.SerializerMethodField(),
         },
+        get_has_available_slot=lambda self, obj: (
+            self.context["class_seats"].get(obj.id, obj.enrolled_count) < obj.class_size
+        ),
     )
 
     SubjectSerializer = inline_serializer_class(
@@ -1673,11 +1640,10 @@ class StudentEnrollmentSubjectListSerializer(serializers.ModelSerializer):
             "classes",
         )
 
-    def get_has_pending_prereq(self, obj):
-        return obj.has_pending_prerequisite(self.context.get("passed_curr_subj_ids"))
+    def get_has_pending_prereq(self, obj) -> bool:
+        prerequisites = self.context["prerequisites"].get(obj.id, set())
+        return bool(prerequisites - self.context["passed_curr_subj_ids"])
 
     def get_classes(self, obj) -> ClassSerializer(many=True):
-        semester = next_semester_get()
-        classes = Class.objects.filter(subject=obj.subject, semester=semester)
-
-        return self.ClassSerializer(classes, many=True).data
+        classes = self.context["offering"].get(obj.subject_id, [])
+        return self.ClassSerializer(classes, many=True, context=self.context).data
@@ -1,12 +1,16 @@
 import csv
-from decimal import Decimal
+import io
+from decimal import Decimal, InvalidOperation
 from random import choice
-from typing import Dict
+from typing import Dict, Iterable
 
 import botocore.exceptions
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.files import File
+from django.core.files.base import ContentFile
 from django.db import transaction
+from django.utils import timezone
 from openpyxl import load_workbook
 from rest_framework import exceptions
 from sentry_sdk import capture_exception
@@ -28,10 +32,10 @@ from slu.core.cms.models import (
     Semesters,
 )
 from slu.core.cms.selectors import subject_has_class
-from slu.core.cms.services import class_grade_state_update
+from slu.core.cms.services import class_grade_state_update, class_seats_lock
 from slu.framework.events import event_publisher
 from slu.framework.exceptions import ServiceException
-from slu.framework.utils import get_random_string
+from slu.framework.utils import chunked, csv_file_reader, get_random_string
 from slu.payment.models import (
     BukasTransaction,
     CashierTransaction,
@@ -42,6 +46,7 @@ from slu.payment.selectors import soa_get_paid_amount
 
 from . import models, tasks
 from .selectors import (
+    academic_progress_cache_clear,
     enrollment_get_latest_enrolled,
     student_has_failed_subject_get,
     student_has_remaining_balance_get,
@@ -185,6 +190,10 @@ def enrollment_step_3_subjects(*, enrollment: models.Enrollment, data: dict):
     # NOTE: Adjustments of enrollment subjects are allowed up to step 4
     enrollment.enrolled_classes.all().delete()
 
+    class_seats_lock(
+        class_ids=[klass.get("klass").id for klass in data.get("enrolled_classes")]
+    )
+
     for klass in data.get("enrolled_classes"):
         enrolled_class_data = {
             "student": enrollment.student,
@@ -624,148 +633,210 @@ def enrollment_status_evaluate(*, enrollment: models.Enrollment):
     return enrollment
 
 
-def grade_sheet_process(*, grade_sheet: models.GradeSheet):
-    columns = [
-        "STUDENT NO",  # 0
-        "CLASS CODE",  # 1
-        "SUBJECT CODE",  # 2
-        "SUBJECT NAME",  # 3
-        "UNITS",  # 4
-        "SCHOOL_YR",  # 5
-        "TERM",  # 6
-        "PRELIM GRADE",  # 7
-        "MIDTERM GRADE",  # 8
-        "TENTATIVE FINAL GRADE",  # 9
-        "MED_GRD_CD",  # 10
-        "MED_STATUS",  # 11
-        "GRD_CD",  # 12
-        "STATUS",  # 13
-    ]
-
-    grade_sheet.status = models.GradeSheet.Statuses.PROCESSING
+GRADE_SHEET_COLUMNS = [
+    "STUDENT NO",  # 0
+    "CLASS CODE",  # 1
+    "SUBJECT CODE",  # 2
+    "SUBJECT NAME",  # 3
+    "UNITS",  # 4
+    "SCHOOL_YR",  # 5
+    "TERM",  # 6
+    "PRELIM GRADE",  # 7
+    "MIDTERM GRADE",  # 8
+    "TENTATIVE FINAL GRADE",  # 9
+    "MED_GRD_CD",  # 10
+    "MED_STATUS",  # 11
+    "GRD_CD",  # 12
+    "STATUS",  # 13
+]
+
+# Grade field -> worksheet column index
+GRADE_SHEET_GRADE_COLUMNS = {
+    "prelim_grade": 7,
+    "midterm_grade": 8,
+    "tentative_final_grade": 9,
+    "final_grade": 12,
+}
+
+
+def _grade_sheet_failed(*, grade_sheet: models.GradeSheet, error: str):
+    grade_sheet.status = models.GradeSheet.Statuses.FAILED
+    grade_sheet.error_message = error
     grade_sheet.save()
 
-    workbook = load_workbook(grade_sheet.file)
-    worksheets = list(workbook)
 
-    if len(worksheets) == 0:
-        grade_sheet.status = models.GradeSheet.Statuses.FAILED
-        grade_sheet.error_message = "Empty file."
-        grade_sheet.save()
-        return
+def _grade_sheet_row_build(
+    *,
+    grade_sheet: models.GradeSheet,
+    student: models.Student,
+    cells: list,
+    enrolled_class_grade: models.EnrolledClassGrade = None,
+    statuses: dict,
+) -> models.GradeSheetRow:
+    data = {}
+
+    for field, column in GRADE_SHEET_GRADE_COLUMNS.items():
+        state_field = f"{field}_state"
+
+        if (
+            enrolled_class_grade
+            and getattr(enrolled_class_grade, state_field)
+            not in models.EnrolledClassGrade.EDITABLE_GRADE_STATES
+        ):
+            # NOTE: Keep published grades as is
+            data[field] = getattr(enrolled_class_grade, field)
+            data[state_field] = getattr(enrolled_class_grade, state_field)
+        else:
+            data[field] = cells[column] or None
+
+    status = statuses.get(cells[13], models.GradeStatuses.PENDING)
+
+    return models.GradeSheetRow(
+        grade_sheet=grade_sheet, student=student, status=status, **data
+    )
+
 
-    worksheet = worksheets[0]
+def _grade_sheet_chunk_process(
+    *, grade_sheet: models.GradeSheet, chunk: list, statuses: dict
+) -> None:
+    # NOTE: Numeric ID cells are read back as ints
+    id_numbers = {str(cells[0]).strip() for cells in chunk if cells[0] is not None}
 
-    for index, row in enumerate(worksheet):
-        if index == 0:
-            for cell in row:
-                if cell.value not in columns:
-                    grade_sheet.status = models.GradeSheet.Statuses.FAILED
-                    grade_sheet.error_message = f"Invalid column {cell.value}"
-                    grade_sheet.save()
-                    return
+    students = {}
+    for student in models.Student.objects.filter(id_number__in=id_numbers):
+        students.setdefault(student.id_number, student)
 
-        cells = list(row)
-        student = models.Student.objects.filter(id_number=cells[0].value).first()
+    enrolled_class_grades = {}
+    for enrolled_class_grade in models.EnrolledClassGrade.objects.filter(
+        enrolled_class__student__in=students.values(),
+        enrolled_class__klass=grade_sheet.klass,
+    ).select_related("enrolled_class"):
+        enrolled_class_grades.setdefault(
+            enrolled_class_grade.enrolled_class.student_id, enrolled_class_grade
+        )
+
+    rows = []
+
+    for cells in chunk:
+        if cells[0] is None:
+            continue
+
+        student = students.get(str(cells[0]).strip())
 
         if not student:
             continue
 
-        status = models.GradeStatuses.PENDING
-        status_label = cells[13].value
+        rows.append(
+            _grade_sheet_row_build(
+                grade_sheet=grade_sheet,
+                student=student,
+                cells=cells,
+                enrolled_class_grade=enrolled_class_grades.get(student.id),
+                statuses=statuses,
+            )
+        )
 
-        for grade_status in models.GradeStatuses:
-            if grade_status.label == status_label:
-                status = grade_status
-                break
+    models.GradeSheetRow.objects.bulk_create(rows)
 
-        data = {}
 
-        enrolled_class_grade = models.EnrolledClassGrade.objects.filter(
-            enrolled_class__student=student, enrolled_class__klass=grade_sheet.klass
-        ).first()
+def grade_sheet_process(*, grade_sheet: models.GradeSheet):
+    """Process an uploaded grade sheet in chunks of `SLU_UPLOAD_CHUNK_SIZE` rows.
 
-        if enrolled_class_grade:
-            if (
-                enrolled_class_grade.prelim_grade_state
-                in models.EnrolledClassGrade.EDITABLE_GRADE_STATES
-            ):
-                data["prelim_grade"] = cells[7].value or None
-            else:
-                data["prelim_grade"] = enrolled_class_grade.prelim_grade
-                data["prelim_grade_state"] = enrolled_class_grade.prelim_grade_state
-
-            if (
-                enrolled_class_grade.midterm_grade_state
-                in models.EnrolledClassGrade.EDITABLE_GRADE_STATES
-            ):
-                data["midterm_grade"] = cells[8].value or None
-            else:
-                data["midterm_grade"] = enrolled_class_grade.midterm_grade
-                data["midterm_grade_state"] = enrolled_class_grade.midterm_grade_state
-
-            if (
-                enrolled_class_grade.tentative_final_grade_state
-                in models.EnrolledClassGrade.EDITABLE_GRADE_STATES
-            ):
-                data["tentative_final_grade"] = cells[9].value or None
-            else:
-                data[
-                    "tentative_final_grade"
-                ] = enrolled_class_grade.tentative_final_grade
-                data[
-                    "tentative_final_grade_state"
-                ] = enrolled_class_grade.tentative_final_grade_state
-
-            if (
-                enrolled_class_grade.final_grade_state
-                in models.EnrolledClassGrade.EDITABLE_GRADE_STATES
-            ):
-                data["final_grade"] = cells[12].value or None
-            else:
-                data["final_grade"] = enrolled_class_grade.final_grade
-                data["final_grade_state"] = enrolled_class_grade.final_grade_state
-        else:
-            data = {
-                "prelim_grade": cells[7].value or None,
-                "midterm_grade": cells[8].value or None,
-                "tentative_final_grade": cells[9].value or None,
-                "final_grade": cells[12].value or None,
-            }
+    Each chunk resolves its students and existing grades in bulk and
+    inserts its rows in a single query. Progress is tracked through
+    `GradeSheet.processed_rows`.
+    """
+    grade_sheet.status = models.GradeSheet.Statuses.PROCESSING
+    grade_sheet.processed_rows = 0
+    grade_sheet.save()
 
-        if not enrolled_class_grade or (
-            enrolled_class_grade
-            and enrolled_class_grade.prelim_grade_state
-            in models.EnrolledClassGrade.EDITABLE_GRADE_STATES
-        ):
-            pass
+    workbook = load_workbook(grade_sheet.file, read_only=True, data_only=True)
+
+    try:
+        if len(workbook.worksheets) == 0:
+            _grade_sheet_failed(grade_sheet=grade_sheet, error="Empty file.")
+            return
+
+        worksheet = workbook.worksheets[0]
+        rows = worksheet.iter_rows(values_only=True)
+        header = next(rows, None)
+
+        if header is None:
+            _grade_sheet_failed(grade_sheet=grade_sheet, error="Empty file.")
+            return
+
+        for value in header:
+            if value not in GRADE_SHEET_COLUMNS:
+                _grade_sheet_failed(
+                    grade_sheet=grade_sheet, error=f"Invalid column {value}"
+                )
+                return
+
+        grade_sheet.total_rows = max((worksheet.max_row or 1) - 1, 0)
+        grade_sheet.save(update_fields=["total_rows", "updated_at"])
+
+        statuses = {status.label: status for status in models.GradeStatuses}
+        padding = [None] * len(GRADE_SHEET_COLUMNS)
 
-        grade_sheet.rows.create(student=student, status=status, **data)
+        for chunk in chunked(rows, settings.SLU_UPLOAD_CHUNK_SIZE):
+            chunk = [(list(cells) + padding)[: len(padding)] for cells in chunk]
+
+            with transaction.atomic():
+                _grade_sheet_chunk_process(
+                    grade_sheet=grade_sheet, chunk=chunk, statuses=statuses
+                )
 
+                grade_sheet.processed_rows += len(chunk)
+                grade_sheet.save(update_fields=["processed_rows", "updated_at"])
+    finally:
+        # Read-only workbooks keep the file handle open until closed
+        workbook.close()
+
+    grade_sheet.total_rows = grade_sheet.processed_rows
     grade_sheet.status = models.GradeSheet.Statuses.COMPLETED
     grade_sheet.save()
 
 
-def grade_sheet_publish(
+def _grade_sheet_publish(
     *,
     grade_sheet: models.GradeSheet,
     state: models.GradeStates,
-    fields: list[str] = None,
+    fields: list[str],
 ):
-    if not fields:
-        fields = []
+    rows = list(grade_sheet.rows.all())
+    student_ids = {row.student_id for row in rows if row.student_id}
 
-    for row in grade_sheet.rows.all():
-        enrolled_class = models.EnrolledClass.objects.filter(
-            student=row.student, klass=grade_sheet.klass
-        ).first()
+    enrolled_classes = {}
+    for enrolled_class in (
+        models.EnrolledClass.objects.filter(
+            student_id__in=student_ids, klass=grade_sheet.klass
+        )
+        .select_related("grades")
+        .order_by("id")
+    ):
+        enrolled_classes.setdefault(enrolled_class.student_id, enrolled_class)
+
+    missing_grades = [
+        models.EnrolledClassGrade(enrolled_class=enrolled_class)
+        for enrolled_class in enrolled_classes.values()
+        if not hasattr(enrolled_class, "grades")
+    ]
+
+    for enrolled_class_grade in models.EnrolledClassGrade.objects.bulk_create(
+        missing_grades
+    ):
+        enrolled_class_grade.enrolled_class.grades = enrolled_class_grade
+
+    now = timezone.now()
+    enrolled_class_grades = {}
+
+    for row in rows:
+        enrolled_class = enrolled_classes.get(row.student_id)
 
         if not enrolled_class:
             continue
 
-        enrolled_class_grade, _ = models.EnrolledClassGrade.objects.get_or_create(
-            enrolled_class=enrolled_class
-        )
+        enrolled_class_grade = enrolled_class.grades
 
         for field in fields:
             grade = getattr(row, field)
@@ -776,10 +847,52 @@ def grade_sheet_publish(
                 setattr(enrolled_class_grade, f"{field}_state", state)
 
         enrolled_class_grade.status = row.status
-        enrolled_class_grade.save()
+        enrolled_class_grade.updated_at = now
+        enrolled_class_grades[enrolled_class_grade.id] = enrolled_class_grade
+
+    update_fields = [*fields, *[f"{field}_state" for field in fields]]
+    models.EnrolledClassGrade.objects.bulk_update(
+        enrolled_class_grades.values(),
+        fields=[*update_fields, "status", "updated_at"],
+        batch_size=settings.SLU_UPLOAD_CHUNK_SIZE,
+    )
 
     class_grade_state_update(klass=grade_sheet.klass, state=state, fields=fields)
 
+    # NOTE: Bulk updates skip the signals that invalidate the academic progress
+    academic_progress_cache_clear(student_ids=student_ids)
+    transaction.on_commit(
+        lambda: academic_progress_cache_clear(student_ids=student_ids)
+    )
+
+
+@transaction.atomic
+def grade_sheets_publish(
+    *,
+    grade_sheets: Iterable[models.GradeSheet],
+    state: models.GradeStates,
+    fields: list[str] = None,
+):
+    """Publish the rows of every grade sheet to the enrolled class grades.
+
+    Sheets are applied in the given order within a single transaction, each
+    with a fixed number of queries regardless of its row count.
+    """
+    if not fields:
+        fields = []
+
+    for grade_sheet in grade_sheets:
+        _grade_sheet_publish(grade_sheet=grade_sheet, state=state, fields=fields)
+
+
+def grade_sheet_publish(
+    *,
+    grade_sheet: models.GradeSheet,
+    state: models.GradeStates,
+    fields: list[str] = None,
+):
+    grade_sheets_publish(grade_sheets=[grade_sheet], state=state, fields=fields)
+
 
 def gwa_sheet_create(*, file: File) -> models.GeneralWeightedAverageSheet:
     gwa_sheet = models.GeneralWeightedAverageSheet.objects.create(file=file)
@@ -788,13 +901,183 @@ def gwa_sheet_create(*, file: File) -> models.GeneralWeightedAverageSheet:
     return gwa_sheet
 
 
+GWA_SHEET_TERMS = {
+    "1": Semesters.FIRST_SEMESTER,
+    "2": Semesters.SECOND_SEMESTER,
+    "3": Semesters.SUMMER,
+}
+
+GWA_SHEET_GRADING_STATUSES = {
+    "PASSED": models.EnrollmentGrade.GradingStatuses.PASSED,
+    "FAILED": models.EnrollmentGrade.GradingStatuses.FAILED,
+}
+
+GWA_SHEET_ERROR_COLUMNS = ["ROW", "STUDENT NO", "SCHOOL YEAR", "TERM", "ERROR"]
+
+
 def _gwa_sheet_failed(*, gwa_sheet: models.GeneralWeightedAverageSheet, error: str):
     gwa_sheet.status = models.GeneralWeightedAverageSheet.Statuses.FAILED
     gwa_sheet.error_message = error
     gwa_sheet.save()
 
 
+def _gwa_sheet_decimal(value: str):
+    try:
+        return Decimal(value)
+    except (InvalidOperation, TypeError):
+        return None
+
+
+def _gwa_sheet_error(*, line_no: int, row: list, error: str) -> list:
+    row = row + [""] * 4
+    return [line_no, row[0], row[2], row[3], error]
+
+
+def _gwa_sheet_row_parse(*, row: list, academic_years: dict) -> Dict:
+    if len(row) < 8:
+        raise ValueError("Incomplete row")
+
+    school_year = row[2]
+    year = school_year[0:4]
+
+    if not year.isnumeric():
+        raise ValueError(f"Invalid SY: {school_year}")
+
+    gwa = Decimal(0)
+    if row[4] != "NO GWA":
+        gwa = _gwa_sheet_decimal(row[4])
+
+        if gwa is None:
+            raise ValueError(f"Invalid GWA: {row[4]}")
+
+    return {
+        "id_no": row[0],
+        "academic_year_id": academic_years.get((int(year) - 1, int(year))),
+        "term": GWA_SHEET_TERMS.get(row[3]),
+        "general_weighted_average": gwa,
+        "pass_percentage": _gwa_sheet_decimal(row[5]),
+        "grading_status": GWA_SHEET_GRADING_STATUSES.get(
+            row[6], models.EnrollmentGrade.GradingStatuses.PENDING
+        ),
+        "remark_code": row[7],
+    }
+
+
+def _gwa_sheet_chunk_process(
+    *, chunk: list, academic_years: dict, remark_codes: dict, errors: list
+) -> int:
+    """Process a chunk of `(line_no, row)` GWA sheet entries and return the
+    number of successful entries. Invalid entries are appended to `errors`."""
+    entries = []
+
+    for line_no, row in chunk:
+        try:
+            data = _gwa_sheet_row_parse(row=row, academic_years=academic_years)
+        except ValueError as error:
+            errors.append(_gwa_sheet_error(line_no=line_no, row=row, error=str(error)))
+            continue
+
+        entries.append((line_no, row, data))
+
+    students = dict(
+        models.Student.objects.filter(
+            id_number__in={data["id_no"] for *_, data in entries}
+        )
+        .order_by("-id")
+        .values_list("id_number", "id")
+    )
+
+    enrollments = {}
+    for student_id, academic_year_id, term, enrollment_id in (
+        models.Enrollment.objects.filter(
+            student_id__in=students.values(),
+            academic_year_id__in={data["academic_year_id"] for *_, data in entries},
+            semester__term__in={data["term"] for *_, data in entries},
+        )
+        .order_by("-id")
+        .values_list("student_id", "academic_year_id", "semester__term", "id")
+    ):
+        enrollments[(student_id, academic_year_id, term)] = enrollment_id
+
+    grades = {
+        grade.enrollment_id: grade
+        for grade in models.EnrollmentGrade.objects.filter(
+            enrollment_id__in=enrollments.values()
+        )
+    }
+    created_grades = {}
+    updated_grades = {}
+    success = 0
+    now = timezone.now()
+
+    for line_no, row, data in entries:
+        student_id = students.get(data["id_no"])
+
+        if not student_id:
+            error = f"Invalid Student No: {row[0]}"
+            errors.append(_gwa_sheet_error(line_no=line_no, row=row, error=error))
+            continue
+
+        enrollment_id = enrollments.get(
+            (student_id, data["academic_year_id"], data["term"])
+        )
+
+        if not enrollment_id:
+            error = f"Invalid Enrollment: {row[0]} SY: {row[2]}"
+            errors.append(_gwa_sheet_error(line_no=line_no, row=row, error=error))
+            continue
+
+        success += 1
+        grade = grades.get(enrollment_id)
+
+        if grade:
+            updated_grades[enrollment_id] = grade
+        else:
+            grade = models.EnrollmentGrade(enrollment_id=enrollment_id)
+            grades[enrollment_id] = created_grades[enrollment_id] = grade
+
+        grade.general_weighted_average = data["general_weighted_average"]
+        grade.pass_percentage = data["pass_percentage"]
+        grade.grading_status = data["grading_status"]
+        grade.remark_code_id = remark_codes.get(data["remark_code"])
+        grade.updated_at = now
+
+    with transaction.atomic():
+        models.EnrollmentGrade.objects.bulk_create(created_grades.values())
+        models.EnrollmentGrade.objects.bulk_update(
+            updated_grades.values(),
+            fields=[
+                "general_weighted_average",
+                "pass_percentage",
+                "grading_status",
+                "remark_code",
+                "updated_at",
+            ],
+        )
+
+    return success
+
+
+def _gwa_sheet_error_file_save(
+    *, gwa_sheet: models.GeneralWeightedAverageSheet, errors: list
+):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(GWA_SHEET_ERROR_COLUMNS)
+    writer.writerows(errors)
+
+    gwa_sheet.error_file.save(
+        f"{gwa_sheet.file_id}.csv", ContentFile(buffer.getvalue().encode()), save=False
+    )
+
+
 def gwa_sheet_process(*, gwa_sheet: models.GeneralWeightedAverageSheet) -> None:
+    """Process an uploaded GWA sheet in chunks of `SLU_UPLOAD_CHUNK_SIZE` rows.
+
+    The file is streamed line by line. Academic years and remark codes are
+    loaded once, while students, enrollments and existing grades are
+    resolved per chunk. Invalid entries are written to `error_file`.
+    """
     gwa_sheet.status = gwa_sheet.Statuses.PROCESSING
     gwa_sheet.save()
 
@@ -803,49 +1086,45 @@ def gwa_sheet_process(*, gwa_sheet: models.GeneralWeightedAverageSheet) -> None:
         "invalid": 0,
         "total": 0,
     }
+    errors = []
 
-    first_row = True
+    academic_years = {
+        (year_start, year_end): academic_year_id
+        for academic_year_id, year_start, year_end in AcademicYear.objects.values_list(
+            "id", "year_start", "year_end"
+        )
+    }
+    remark_codes = dict(RemarkCode.objects.order_by("-id").values_list("ref_id", "id"))
 
     try:
-        file_contents = gwa_sheet.file.read()
-        csv_data = file_contents.decode().split("\r\n")
-        reader = csv.reader(csv_data)
-
-        for row in reader:
-            if not row:
-                continue
-
-            if first_row:
-                first_row = False
-                continue
-
-            stats["total"] += 1
-
-            data = {
-                "id_no": row[0],
-                "school_year": row[2],
-                "term": row[3],
-                "gwa": row[4],
-                "pass_percentage": row[5],
-                "remark_code": row[7],
-                "status": row[6],
-            }
-
-            result, err = enrollment_grade_process(data=data)
-            if result:
-                stats["success"] += 1
-            else:
-                print(err)
-                stats["invalid"] += 1
+        reader = csv_file_reader(gwa_sheet.file)
+        entries = ((reader.line_num, row) for row in reader if row)
+
+        # Skip header
+        next(entries, None)
+
+        for chunk in chunked(entries, settings.SLU_UPLOAD_CHUNK_SIZE):
+            stats["total"] += len(chunk)
+            stats["success"] += _gwa_sheet_chunk_process(
+                chunk=chunk,
+                academic_years=academic_years,
+                remark_codes=remark_codes,
+                errors=errors,
+            )
 
     except (UnicodeDecodeError, botocore.exceptions.ClientError) as error:
         _gwa_sheet_failed(
-            journal_voucher=gwa_sheet,
+            gwa_sheet=gwa_sheet,
             error="Error reading gwa sheet file",
         )
         capture_exception(error)
         return
 
+    stats["invalid"] = len(errors)
+
+    if errors:
+        _gwa_sheet_error_file_save(gwa_sheet=gwa_sheet, errors=errors)
+
     gwa_sheet.status = models.GeneralWeightedAverageSheet.Statuses.COMPLETED
     gwa_sheet.success = stats["success"]
     gwa_sheet.invalid = stats["invalid"]
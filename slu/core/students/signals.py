@@ -0,0 +1,71 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from slu.core.cms.services import CLASS_SEAT_STATUSES, class_seats_update
+
+from .models import EnrolledClass, EnrolledClassGrade
+from .selectors import academic_progress_cache_clear
+
+
+@receiver(pre_save, sender=EnrolledClass)
+def enrolled_class_seat_track(instance, **kwargs):
+    previous = None
+
+    if instance.pk:
+        previous = (
+            EnrolledClass.objects.filter(pk=instance.pk)
+            .values_list("klass_id", "status")
+            .first()
+        )
+
+    instance._seat_previous = previous
+
+
+@receiver(post_save, sender=EnrolledClass)
+def enrolled_class_seat_update(instance, **kwargs):
+    previous = getattr(instance, "_seat_previous", None)
+    seats = {}
+
+    if previous and previous[0] and previous[1] in CLASS_SEAT_STATUSES:
+        seats[previous[0]] = seats.get(previous[0], 0) - 1
+
+    if instance.klass_id and instance.status in CLASS_SEAT_STATUSES:
+        seats[instance.klass_id] = seats.get(instance.klass_id, 0) + 1
+
+    for class_id, delta in seats.items():
+        if delta:
+            class_seats_update(class_id=class_id, delta=delta)
+
+
+@receiver(post_delete, sender=EnrolledClass)
+def enrolled_class_seat_release(instance, **kwargs):
+    if instance.klass_id and instance.status in CLASS_SEAT_STATUSES:
+        class_seats_update(class_id=instance.klass_id, delta=-1)
+
+
+def _academic_progress_clear(student_id):
+    if not student_id:
+        return
+
+    academic_progress_cache_clear(student_ids=[student_id])
+    transaction.on_commit(
+        lambda: academic_progress_cache_clear(student_ids=[student_id])
+    )
+
+
+@receiver(post_save, sender=EnrolledClass)
+@receiver(post_delete, sender=EnrolledClass)
+def enrolled_class_progress_changed(instance, **kwargs):
+    _academic_progress_clear(instance.student_id)
+
+
+@receiver(post_save, sender=EnrolledClassGrade)
+@receiver(post_delete, sender=EnrolledClassGrade)
+def enrolled_class_grade_progress_changed(instance, **kwargs):
+    student_id = (
+        EnrolledClass.objects.filter(id=instance.enrolled_class_id)
+        .values_list("student_id", flat=True)
+        .first()
+    )
+    _academic_progress_clear(student_id)
@@ -0,0 +1,65 @@
+import json
+from collections import deque
+
+import pytest
+from django.core.management import call_command
+
+from slu.core.students.management.commands.generate_soa import Command
+from slu.payment.models import StatementOfAccount
+
+
+@pytest.mark.django_db
+class TestGenerateSoa:
+    def test_generate(self, enrollment_factory, tmp_path):
+        enrollments = [enrollment_factory() for _ in range(3)]
+        checkpoint = tmp_path / "generate_soa.checkpoint"
+
+        call_command("generate_soa", shard_size=2, checkpoint=str(checkpoint))
+
+        assert (
+            StatementOfAccount.objects.filter(enrollment__in=enrollments).count() == 3
+        )
+        assert not checkpoint.exists()
+
+    def test_generate_resume(self, enrollment_factory, tmp_path):
+        enrollments = [enrollment_factory() for _ in range(5)]
+        checkpoint = tmp_path / "generate_soa.checkpoint"
+        checkpoint.write_text(
+            json.dumps(
+                {
+                    "high_water_mark": enrollments[1].id,
+                    "completed": [[enrollments[3].id, enrollments[3].id]],
+                }
+            )
+        )
+
+        call_command(
+            "generate_soa", shard_size=1, override=True, checkpoint=str(checkpoint)
+        )
+
+        generated = StatementOfAccount.objects.values_list("enrollment", flat=True)
+        assert set(generated) == {enrollments[2].id, enrollments[4].id}
+        assert not checkpoint.exists()
+
+    def test_checkpoint_advance(self):
+        command = Command()
+        checkpoint = {"high_water_mark": 0, "completed": []}
+        dispatched = deque([(1, 2), (3, 4), (5, 6)])
+        completed = set()
+
+        command._checkpoint_advance(
+            checkpoint=checkpoint,
+            dispatched=dispatched,
+            completed=completed,
+            shard=(3, 4),
+        )
+        assert checkpoint == {"high_water_mark": 0, "completed": [[3, 4]]}
+
+        command._checkpoint_advance(
+            checkpoint=checkpoint,
+            dispatched=dispatched,
+            completed=completed,
+            shard=(1, 2),
+        )
+        assert checkpoint == {"high_water_mark": 4, "completed": []}
+        assert list(dispatched) == [(5, 6)]
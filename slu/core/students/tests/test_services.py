@@ -0,0 +1,255 @@
+from decimal import Decimal
+from io import BytesIO
+
+import pytest
+from django.core.cache import CacheHandler
+from django.core.files.base import ContentFile
+from openpyxl import Workbook
+
+from slu.core.accounts.models import Semester
+from slu.core.students import models, selectors, services
+
+
+def _grade_sheet_file(rows):
+    workbook = Workbook()
+    worksheet = workbook.active
+    worksheet.append(services.GRADE_SHEET_COLUMNS)
+
+    for row in rows:
+        worksheet.append(row)
+
+    buffer = BytesIO()
+    workbook.save(buffer)
+    return ContentFile(buffer.getvalue(), name="grade_sheet.xlsx")
+
+
+def _grade_sheet_row(student, prelim_grade=None, status="Passed"):
+    return [
+        student.id_number if student else "INVALID",
+        "CLASS",
+        "SUBJ",
+        "Subject",
+        3,
+        "2022",
+        "1",
+        prelim_grade,
+        None,
+        None,
+        None,
+        None,
+        None,
+        status,
+    ]
+
+
+@pytest.fixture(autouse=True)
+def media_root(settings, tmp_path):
+    settings.MEDIA_ROOT = tmp_path
+
+
+@pytest.mark.django_db
+class TestGradeSheetProcess:
+    def test_process(self, klass, student_factory, settings):
+        settings.SLU_UPLOAD_CHUNK_SIZE = 2
+        students = [student_factory() for _ in range(3)]
+        rows = [_grade_sheet_row(student, prelim_grade=90) for student in students]
+        rows.append(_grade_sheet_row(None))
+
+        grade_sheet = models.GradeSheet.objects.create(
+            klass=klass, file=_grade_sheet_file(rows)
+        )
+        services.grade_sheet_process(grade_sheet=grade_sheet)
+
+        grade_sheet.refresh_from_db()
+        assert grade_sheet.status == models.GradeSheet.Statuses.COMPLETED
+        assert grade_sheet.processed_rows == len(rows)
+        assert grade_sheet.rows.count() == len(students)
+
+        for row in grade_sheet.rows.all():
+            assert row.prelim_grade == 90
+            assert row.status == models.GradeStatuses.PASSED
+
+    def test_process_numeric_id_number(self, klass, student_factory):
+        student = student_factory(id_number="2200123")
+        row = _grade_sheet_row(student, prelim_grade=88)
+        row[0] = 2200123
+
+        grade_sheet = models.GradeSheet.objects.create(
+            klass=klass, file=_grade_sheet_file([row])
+        )
+        services.grade_sheet_process(grade_sheet=grade_sheet)
+
+        grade_sheet.refresh_from_db()
+        assert grade_sheet.status == models.GradeSheet.Statuses.COMPLETED
+        assert grade_sheet.rows.get().student == student
+
+    def test_process_invalid_column(self, klass):
+        workbook = Workbook()
+        workbook.active.append(["INVALID"])
+        buffer = BytesIO()
+        workbook.save(buffer)
+
+        grade_sheet = models.GradeSheet.objects.create(
+            klass=klass, file=ContentFile(buffer.getvalue(), name="grade_sheet.xlsx")
+        )
+        services.grade_sheet_process(grade_sheet=grade_sheet)
+
+        grade_sheet.refresh_from_db()
+        assert grade_sheet.status == models.GradeSheet.Statuses.FAILED
+        assert grade_sheet.rows.count() == 0
+
+
+@pytest.mark.django_db
+class TestGradeSheetPublish:
+    def test_publish(self, klass, enrollment_factory):
+        grade_sheet = models.GradeSheet.objects.create(klass=klass)
+        enrolled_classes = []
+
+        for _ in range(3):
+            enrollment = enrollment_factory()
+            enrolled_classes.append(
+                models.EnrolledClass.objects.create(
+                    student=enrollment.student, enrollment=enrollment, klass=klass
+                )
+            )
+            grade_sheet.rows.create(
+                student=enrollment.student,
+                prelim_grade=85,
+                midterm_grade=90,
+                status=models.GradeStatuses.PASSED,
+            )
+
+        # Submitted grades should not be overwritten
+        submitted_grade = models.EnrolledClassGrade.objects.create(
+            enrolled_class=enrolled_classes[0],
+            prelim_grade=75,
+            prelim_grade_state=models.GradeStates.SUBMITTED,
+        )
+
+        services.grade_sheets_publish(
+            grade_sheets=[grade_sheet],
+            state=models.GradeStates.SUBMITTED,
+            fields=[models.GradeFields.PRELIM],
+        )
+
+        submitted_grade.refresh_from_db()
+        assert submitted_grade.prelim_grade == 75
+        assert submitted_grade.status == models.GradeStatuses.PASSED
+
+        for enrolled_class in enrolled_classes[1:]:
+            grade = models.EnrolledClassGrade.objects.get(enrolled_class=enrolled_class)
+            assert grade.prelim_grade == 85
+            assert grade.prelim_grade_state == models.GradeStates.SUBMITTED
+            assert grade.midterm_grade is None
+            assert grade.status == models.GradeStatuses.PASSED
+
+        klass.refresh_from_db()
+        assert klass.grade_states.prelim_grade_state == models.GradeStates.SUBMITTED
+
+    def test_publish_academic_progress(
+        self, klass, enrollment, curriculum_subject, django_assert_num_queries
+    ):
+        student = enrollment.student
+        grade_sheet = models.GradeSheet.objects.create(klass=klass)
+        grade_sheet.rows.create(
+            student=student, final_grade=95, status=models.GradeStatuses.PASSED
+        )
+        models.EnrolledClass.objects.create(
+            student=student,
+            enrollment=enrollment,
+            klass=klass,
+            curriculum_subject=curriculum_subject,
+            status=models.EnrolledClass.Statuses.ENROLLED,
+        )
+
+        progress = selectors.student_academic_progress_get(student=student)
+        assert progress["taken"] == {curriculum_subject.id}
+        assert progress["passed"] == set()
+        assert progress["final_grades"] == {curriculum_subject.id: None}
+
+        with django_assert_num_queries(0):
+            selectors.student_academic_progress_get(student=student)
+
+        services.grade_sheets_publish(
+            grade_sheets=[grade_sheet],
+            state=models.GradeStates.SUBMITTED,
+            fields=[models.GradeFields.FINAL],
+        )
+
+        progress = selectors.student_academic_progress_get(student=student)
+        assert progress["passed"] == {curriculum_subject.id}
+        assert progress["final_grades"] == {curriculum_subject.id: 95}
+
+    def test_publish_academic_progress_shared_cache(
+        self, klass, enrollment, curriculum_subject, monkeypatch
+    ):
+        student = enrollment.student
+        grade_sheet = models.GradeSheet.objects.create(klass=klass)
+        grade_sheet.rows.create(
+            student=student, final_grade=90, status=models.GradeStatuses.PASSED
+        )
+        models.EnrolledClass.objects.create(
+            student=student,
+            enrollment=enrollment,
+            klass=klass,
+            curriculum_subject=curriculum_subject,
+            status=models.EnrolledClass.Statuses.ENROLLED,
+        )
+
+        progress = selectors.student_academic_progress_get(student=student)
+        assert progress["passed"] == set()
+
+        # NOTE: Grades are published by the consumer process, which clears the
+        # progress through its own connection to the shared cache.
+        services.grade_sheet_publish(
+            grade_sheet=grade_sheet,
+            state=models.GradeStates.SUBMITTED,
+            fields=[models.GradeFields.FINAL],
+        )
+
+        monkeypatch.setattr(selectors, "cache", CacheHandler()["default"])
+        progress = selectors.student_academic_progress_get(student=student)
+        assert progress["passed"] == {curriculum_subject.id}
+        assert progress["final_grades"] == {curriculum_subject.id: 90}
+
+
+@pytest.mark.django_db
+class TestGWASheetProcess:
+    def test_process(self, enrollment_factory, semester_factory, settings):
+        settings.SLU_UPLOAD_CHUNK_SIZE = 2
+        semester = semester_factory(term=Semester.Terms.FIRST_SEMESTER)
+        academic_year = semester.academic_year
+        school_year = f"{academic_year.year_end}1"
+        enrollments = [
+            enrollment_factory(semester=semester, academic_year=academic_year)
+            for _ in range(3)
+        ]
+
+        lines = ["IDNO,NAME,SYEAR,TERMSEM,GWA,PERCENTPASSED,STATUS,COMM_CD"]
+        for enrollment in enrollments:
+            lines.append(
+                f"{enrollment.student.id_number},,{school_year},1,1.75,100,PASSED,"
+            )
+        lines.append(f"INVALID,,{school_year},1,1.75,100,PASSED,")
+        lines.append(f"{enrollments[0].student.id_number},,{school_year},1,ABC,,,")
+
+        file = ContentFile("\r\n".join(lines).encode(), name="gwa.csv")
+        gwa_sheet = models.GeneralWeightedAverageSheet.objects.create(file=file)
+        gwa_sheet.generate_id()
+        services.gwa_sheet_process(gwa_sheet=gwa_sheet)
+
+        gwa_sheet.refresh_from_db()
+        assert gwa_sheet.status == models.GeneralWeightedAverageSheet.Statuses.COMPLETED
+        assert gwa_sheet.total == 5
+        assert gwa_sheet.success == 3
+        assert gwa_sheet.invalid == 2
+        assert gwa_sheet.error_file
+
+        for enrollment in enrollments:
+            enrollment.refresh_from_db()
+            assert enrollment.grade.general_weighted_average == Decimal("1.75")
+            assert enrollment.grade.pass_percentage == 100
+            assert (
+                enrollment.grade.grading_status
+                == models.EnrollmentGrade.GradingStatuses.PASSED
+            )
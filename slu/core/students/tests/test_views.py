@@ -1,3 +1,4 @@
+from datetime import date, timedelta
 from random import choice
 
 import pytest
@@ -402,3 +403,41 @@ class TestStudentWithdrawalRequestListRetrieveUpdate:
         )
         response = staff_api_client.patch(url, data)
         assert response.status_code == status.HTTP_200_OK
+
+
+@pytest.mark.django_db
+class TestEnrolleeScholarPerSchool:
+    def test_list(
+        self,
+        staff_api_client,
+        staff_user,
+        semester_factory,
+        enrollment_factory,
+        django_assert_max_num_queries,
+    ):
+        today = date.today()
+        semester = semester_factory(
+            academic_year__year_start=today.year,
+            academic_year__date_start=today - timedelta(days=30),
+            academic_year__date_end=today + timedelta(days=30),
+            date_start=today - timedelta(days=30),
+            date_end=today + timedelta(days=30),
+        )
+        enrollments = [
+            enrollment_factory(semester=semester, academic_year=semester.academic_year)
+            for _ in range(3)
+        ]
+        staff_user.is_superuser = True
+        staff_user.save()
+
+        url = reverse("slu.core.students:enrollees-scholars-per-school")
+
+        with django_assert_max_num_queries(10):
+            response = staff_api_client.get(url)
+
+        assert response.status_code == status.HTTP_200_OK
+
+        schools = {enrollment.student.course.school.code for enrollment in enrollments}
+        results = [school for school in response.data if school["code"] in schools]
+        assert sum(school["no_of_regular"] for school in results) == len(enrollments)
+        assert sum(school["no_of_scholar"] for school in results) == 0
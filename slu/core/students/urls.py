@@ -81,6 +81,11 @@ admin_urls = [
         views.EnrollmentGWAUploadAPI.as_view(),
         name="enrollment-gwa-upload",
     ),
+    path(
+        "enrollment-gwa/<str:file_id>/",
+        views.EnrollmentGWARetrieveAPI.as_view(),
+        name="enrollment-gwa-detail",
+    ),
 ]
 
 
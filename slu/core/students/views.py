@@ -21,8 +21,17 @@ from rest_framework.serializers import Serializer as EmptySerializer
 from config.settings.openapi import Tags
 from slu.core import events
 from slu.core.accounts.filters import SchoolFilter, SchoolFilterSet
-from slu.core.accounts.selectors import user_schools_get
+from slu.core.accounts.selectors import (
+    current_semester_get,
+    next_semester_get,
+    user_schools_get,
+)
 from slu.core.cms.models import Class, Curriculum
+from slu.core.cms.selectors import (
+    class_offering_get,
+    class_seats_get,
+    curriculum_prerequisites_get,
+)
 from slu.framework.events import event_publisher
 from slu.framework.pagination import PageNumberPagination
 from slu.framework.permissions import IsAdminUser, IsStudentUser
@@ -40,7 +49,6 @@ from .models import (
     AddSubjectRequest,
     ChangeScheduleRequest,
     EnrolledClass,
-    EnrolledClassGrade,
     Enrollment,
     GeneralWeightedAverageSheet,
     GradeFields,
@@ -423,23 +431,13 @@ class StudentCurriculumRetrieveAPIView(InlineSerializerMixin, RetrieveAPIView):
 
     def get_serializer_context(self):
         context = super().get_serializer_context()
-        student = self.request.user.student
-        enrolled_classes = student.enrolled_classes.filter(
-            status=EnrolledClass.Statuses.ENROLLED, curriculum_subject__isnull=False
+
+        if getattr(self, "swagger_fake_view", False):
+            return context
+
+        context["academic_progress"] = selectors.student_academic_progress_get(
+            student=self.request.user.student
         )
-        curr_subj_ids = [
-            enrolled_class.curriculum_subject.id for enrolled_class in enrolled_classes
-        ]
-
-        passed_curr_subj_ids = [
-            enrolled_class.curriculum_subject.id
-            for enrolled_class in enrolled_classes.filter(
-                grades__status=EnrolledClassGrade.Statuses.PASSED
-            )
-        ]
-        context["curr_subj_ids"] = curr_subj_ids
-        context["passed_curr_subj_ids"] = passed_curr_subj_ids
-        context["student"] = self.request.user.student
         return context
 
 
@@ -467,8 +465,36 @@ class StudentEnrollmentGradeListAPIView(InlineSerializerMixin, ListAPIView):
         )
 
 
+class SchoolMetricListMixin:
+    """
+    Resolve the current semester once per request and compute the metrics of
+    every listed school in a single grouped query for the serializer.
+    """
+
+    def get_school_metrics(self, *, semester, year_level):
+        return selectors.enrollment_per_school_counts_get(
+            schools=self.get_queryset(),
+            semester=semester,
+            year_level=year_level,
+            **self.get_serializer_class().metrics,
+        )
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+
+        if getattr(self, "swagger_fake_view", False):
+            return context
+
+        year_level = self.request.GET.get("year_level", None)
+        context["year_level"] = year_level
+        context["school_metrics"] = self.get_school_metrics(
+            semester=current_semester_get(), year_level=year_level
+        )
+        return context
+
+
 @extend_schema(tags=[Tags.DASHBOARDS])
-class FailedStudentPerSchoolListAPIView(ListAPIView):
+class FailedStudentPerSchoolListAPIView(SchoolMetricListMixin, ListAPIView):
     """List all schools with its corresponding number of failed students from previous term"""
 
     serializer_class = serializers.FailedStudentPerSchoolSerializer
@@ -477,14 +503,9 @@ class FailedStudentPerSchoolListAPIView(ListAPIView):
     def get_queryset(self):
         return user_schools_get(user=self.request.user)
 
-    def get_serializer_context(self):
-        context = super().get_serializer_context()
-        context["year_level"] = self.request.GET.get("year_level", None)
-        return context
-
 
 @extend_schema(tags=[Tags.DASHBOARDS])
-class InterviewedFailedStudentPerSchoolListAPIView(ListAPIView):
+class InterviewedFailedStudentPerSchoolListAPIView(SchoolMetricListMixin, ListAPIView):
     """List all schools with its corresponding number of interviewed failed students from previous term"""
 
     serializer_class = serializers.InterviewedFailedStudentPerSchoolSerializer
@@ -493,14 +514,9 @@ class InterviewedFailedStudentPerSchoolListAPIView(ListAPIView):
     def get_queryset(self):
         return user_schools_get(user=self.request.user)
 
-    def get_serializer_context(self):
-        context = super().get_serializer_context()
-        context["year_level"] = self.request.GET.get("year_level", None)
-        return context
-
 
 @extend_schema(tags=[Tags.DASHBOARDS])
-class EnrolleePerSchoolListAPIView(ListAPIView):
+class EnrolleePerSchoolListAPIView(SchoolMetricListMixin, ListAPIView):
     """List all schools with its corresponding number of enrollees"""
 
     serializer_class = serializers.EnrolleesPerSchoolSerializer
@@ -509,14 +525,9 @@ class EnrolleePerSchoolListAPIView(ListAPIView):
     def get_queryset(self):
         return user_schools_get(user=self.request.user)
 
-    def get_serializer_context(self):
-        context = super().get_serializer_context()
-        context["year_level"] = self.request.GET.get("year_level", None)
-        return context
-
 
 @extend_schema(tags=[Tags.DASHBOARDS])
-class EnrolleeScholarPerSchoolListAPIView(ListAPIView):
+class EnrolleeScholarPerSchoolListAPIView(SchoolMetricListMixin, ListAPIView):
     """List all schools with its corresponding number of regular and scholar enrollees"""
 
     serializer_class = serializers.EnrolleeScholarPerSchoolSerializer
@@ -525,11 +536,6 @@ class EnrolleeScholarPerSchoolListAPIView(ListAPIView):
     def get_queryset(self):
         return user_schools_get(user=self.request.user)
 
-    def get_serializer_context(self):
-        context = super().get_serializer_context()
-        context["year_level"] = self.request.GET.get("year_level", None)
-        return context
-
 
 @extend_schema(tags=[Tags.STUDENT_GRADES])
 class EnrollmentGWAUploadAPI(CreateAPIView):
@@ -547,8 +553,18 @@ class EnrollmentGWAUploadAPI(CreateAPIView):
         serializer.instance = gwa_sheet
 
 
+@extend_schema(tags=[Tags.STUDENT_GRADES])
+class EnrollmentGWARetrieveAPI(RetrieveAPIView):
+    """Retrieve student enrollment GWA upload status and error report"""
+
+    queryset = GeneralWeightedAverageSheet.objects.all()
+    serializer_class = serializers.EnrollmentGWAUploadSerializer
+    permission_classes = [IsAuthenticated, IsAdminUser]
+    lookup_field = "file_id"
+
+
 @extend_schema(tags=[Tags.DASHBOARDS])
-class EnrolleesPerDayPerSchoolListAPIView(ListAPIView):
+class EnrolleesPerDayPerSchoolListAPIView(SchoolMetricListMixin, ListAPIView):
     """List all schools with its corresponding Enrollees per Day"""
 
     serializer_class = serializers.EnrolleesPerDayPerSchoolSerializer
@@ -557,10 +573,10 @@ class EnrolleesPerDayPerSchoolListAPIView(ListAPIView):
     def get_queryset(self):
         return user_schools_get(user=self.request.user)
 
-    def get_serializer_context(self):
-        context = super().get_serializer_context()
-        context["year_level"] = self.request.GET.get("year_level", None)
-        return context
+    def get_school_metrics(self, *, semester, year_level):
+        return selectors.enrollment_per_day_per_school_get(
+            schools=self.get_queryset(), semester=semester, year_level=year_level
+        )
 
 
 @extend_schema(tags=[Tags.STUDENT_REQUESTS])
@@ -846,25 +862,46 @@ class StudentEnrollmentSubjectListAPIView(InlineSerializerMixin, ListAPIView):
     ordering_fields = ["subject__course_code"]
     ordering = ["subject__course_code"]
 
+    def get_semester(self):
+        if not hasattr(self, "_semester"):
+            self._semester = next_semester_get()
+
+        return self._semester
+
+    def get_passed_curr_subj_ids(self) -> set[int]:
+        progress = selectors.student_academic_progress_get(
+            student=self.request.user.student
+        )
+        return progress["passed"]
+
+    def get_offering(self) -> dict:
+        if not hasattr(self, "_offering"):
+            self._offering = class_offering_get(semester=self.get_semester())
+
+        return self._offering
+
     def get_queryset(self):
-        passed_curr_subj_ids = self.get_serializer_context().get("passed_curr_subj_ids")
         return selectors.enrollment_subjects_list(
-            student=self.request.user.student, passed_curr_subj_ids=passed_curr_subj_ids
-        )
+            student=self.request.user.student,
+            passed_curr_subj_ids=self.get_passed_curr_subj_ids(),
+            offering=self.get_offering(),
+        ).select_related("subject", "curriculum_period")
 
     def get_serializer_context(self):
         context = super().get_serializer_context()
-        enrolled_classes = self.request.user.student.enrolled_classes.filter(
-            status=EnrolledClass.Statuses.ENROLLED, curriculum_subject__isnull=False
-        )
 
-        passed_curr_subj_ids = [
-            enrolled_class.curriculum_subject.id
-            for enrolled_class in enrolled_classes.filter(
-                grades__status=EnrolledClassGrade.Statuses.PASSED
-            )
-        ]
-        context["passed_curr_subj_ids"] = passed_curr_subj_ids
+        if getattr(self, "swagger_fake_view", False):
+            return context
+
+        student = self.request.user.student
+        context["passed_curr_subj_ids"] = self.get_passed_curr_subj_ids()
+        context["offering"] = self.get_offering()
+        # NOTE: Seat counters change on every reservation so they are read
+        # fresh instead of from the cached offering
+        context["class_seats"] = class_seats_get(semester=self.get_semester())
+        context["prerequisites"] = curriculum_prerequisites_get(
+            curriculum=student.curriculum
+        )
         return context
 
 @extend_schema(tags=[Tags.DASHBOARDS])
@@ -0,0 +1,8 @@
+from django.apps import AppConfig
+
+
+class FrameworkConfig(AppConfig):
+    name = "slu.framework"
+    label = "framework"
+    verbose_name = "Framework"
+    default_auto_field = "django.db.models.BigAutoField"
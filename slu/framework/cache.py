@@ -0,0 +1,102 @@
+import functools
+import threading
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+
+_MISSING = object()
+
+_reference_caches = []
+
+
+class ReferenceCache:
+    """Read-through cache of rarely changing reference rows.
+
+    Values are kept in a process-local dict for `local_timeout` seconds, backed
+    by Django's cache for `timeout` seconds. Saving or deleting a row of one of
+    the `models` bumps the version of the shared cache and clears the local
+    values of the current process, other processes see the change once their
+    local values expire.
+    """
+
+    def __init__(self, name: str, models: list, timeout=60 * 60, local_timeout=60):
+        self.name = name
+        self.timeout = timeout
+        self.local_timeout = local_timeout
+        self.version_key = f"reference:{name}:version"
+        self.local = {}
+        self.lock = threading.Lock()
+
+        for model in models:
+            dispatch_uid = f"reference:{name}:{model._meta.label}"
+            post_save.connect(
+                self.changed, sender=model, weak=False, dispatch_uid=dispatch_uid
+            )
+            post_delete.connect(
+                self.changed, sender=model, weak=False, dispatch_uid=dispatch_uid
+            )
+
+        _reference_caches.append(self)
+
+    def get(self, key: str, default_func):
+        now = time.monotonic()
+        entry = self.local.get(key)
+
+        if entry and entry[0] > now:
+            return entry[1]
+
+        version = cache.get_or_set(self.version_key, 0, None)
+        cache_key = f"reference:{self.name}:{version}:{key}"
+        value = cache.get(cache_key, _MISSING)
+
+        if value is _MISSING:
+            value = default_func()
+            cache.set(cache_key, value, self.timeout)
+
+        with self.lock:
+            self.local[key] = (now + self.local_timeout, value)
+
+        return value
+
+    def clear(self):
+        with self.lock:
+            self.local = {}
+
+        cache.set(self.version_key, time.time_ns(), None)
+
+    def changed(self, **kwargs):
+        self.clear()
+        # NOTE: Clear again on commit in case a concurrent read cached the old row
+        transaction.on_commit(self.clear)
+
+
+def reference_cached(*models, timeout=60 * 60, local_timeout=60):
+    """Cache the results of a keyword-only selector of reference data until a
+    row of one of the `models` is saved or deleted. See `ReferenceCache`."""
+
+    def decorator(func):
+        reference_cache = ReferenceCache(
+            f"{func.__module__}.{func.__qualname__}",
+            models,
+            timeout=timeout,
+            local_timeout=local_timeout,
+        )
+
+        @functools.wraps(func)
+        def wrapper(**kwargs):
+            key = ":".join(f"{name}={value}" for name, value in sorted(kwargs.items()))
+            return reference_cache.get(key, lambda: func(**kwargs))
+
+        wrapper.cache = reference_cache
+        return wrapper
+
+    return decorator
+
+
+def reference_caches_clear():
+    """Clear the local values of every reference cache of the process"""
+    for reference_cache in _reference_caches:
+        with reference_cache.lock:
+            reference_cache.local = {}
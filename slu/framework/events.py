@@ -1,18 +1,31 @@
+import functools
 import importlib
+import json
+import queue
+import threading
+import time
+from collections import Counter
+from itertools import count
 from typing import Union
 
 import structlog
 from django.conf import settings
 from django.contrib.contenttypes.models import ContentType
 from django.core import serializers
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import close_old_connections
+from django.db import connection as db_connection
+from django.db import transaction
 from django.db.models import Model
 from django.utils import timezone
-from kombu import Connection, Exchange, Queue
+from kombu import Connection, Exchange, Producer, Queue
 from kombu.mixins import ConsumerMixin
 from kombu.pools import producers
 from rest_framework.serializers import ModelSerializer
 from sentry_sdk import capture_exception
 
+from .models import OutboxEvent
+
 log = structlog.get_logger(__name__)
 
 
@@ -31,14 +44,52 @@ def _filter_serialized_data(data):
     return filtered_data
 
 
-def _serialize_model(model_obj):
+@functools.lru_cache(maxsize=None)
+def _serializer_class_get(model_cls):
     class ProxySerializer(ModelSerializer):
         class Meta:
-            model = model_obj._meta.model
+            model = model_cls
             fields = "__all__"
             depth = 1
 
-    data = ProxySerializer(model_obj).data
+    return ProxySerializer
+
+
+def _serialize_model(model_obj):
+    serializer_class = _serializer_class_get(model_obj._meta.model)
+    data = serializer_class(model_obj).data
+    return _filter_serialized_data(data)
+
+
+def _object_fields_get(model) -> list:
+    """Fields carried by compact event objects of a model. Concrete fields by
+    default, or the whitelist of the model in `EVENT_OBJECT_FIELDS`."""
+    opts = model._meta
+    whitelist = settings.EVENT_OBJECT_FIELDS.get(
+        opts.label_lower,
+        settings.EVENT_OBJECT_FIELDS.get(opts.concrete_model._meta.label_lower),
+    )
+
+    if whitelist is None:
+        return opts.concrete_fields
+
+    return [opts.get_field(name) for name in whitelist]
+
+
+def _compact_model(model_obj):
+    """Serialize the fields of a model without following relations. Foreign
+    keys are carried as ids, many to many fields only when whitelisted."""
+    data = {"id": model_obj.pk}
+
+    for field in _object_fields_get(model_obj._meta.model):
+        if field.many_to_many:
+            value = list(getattr(model_obj, field.name).values_list("pk", flat=True))
+        else:
+            value = field.value_from_object(model_obj)
+
+        data[field.name] = value
+
+    data = json.loads(json.dumps(data, cls=DjangoJSONEncoder))
     return _filter_serialized_data(data)
 
 
@@ -111,17 +162,46 @@ class Event:
 
 
 class EventObject:
+    """Model snapshot carried by events.
+
+    Compact objects, the default with `EVENT_COMPACT_OBJECTS`, carry the
+    fields of the model without following relations and only the id of its
+    content type. Consumers needing more load the model with `get_from_db`.
+    """
+
     def __init__(
-        self, model_obj: Model = None, data: dict = None, ctype_data: dict = None
+        self,
+        model_obj: Model = None,
+        data: dict = None,
+        ctype_data: dict = None,
+        compact: bool = None,
     ):
+        if compact is None:
+            compact = settings.EVENT_COMPACT_OBJECTS
+
+        self.compact = bool(model_obj and compact)
+
         if model_obj:
-            self.data = _serialize_model(model_obj)
             ctype = ContentType.objects.get_for_model(model_obj._meta.model)
-            self.ctype_data = _serialize_model(ctype)
+
+            if compact:
+                self.data = _compact_model(model_obj)
+                self.ctype_data = {"id": ctype.id}
+            else:
+                self.data = _serialize_model(model_obj)
+                self.ctype_data = _serialize_model(ctype)
         else:
             self.data = data
             self.ctype_data = ctype_data
 
+    @property
+    def pk(self):
+        return self.data.get("id")
+
+    @property
+    def ctype_id(self):
+        return self.ctype_data.get("id")
+
     @classmethod
     def from_dict(cls, data: dict):
         return cls(
@@ -141,7 +221,7 @@ class EventObject:
 
         ctype = self.get_ctype()
         model_cls = ctype.model_class()
-        obj = model_cls.objects.filter(pk=self.data.get("id")).first()
+        obj = model_cls.objects.filter(pk=self.pk).first()
         # Object cache
         self.object = obj
         return obj
@@ -149,7 +229,7 @@ class EventObject:
     def get_ctype(self):
         if hasattr(self, "ctype"):
             return self.ctype
-        self.ctype = ContentType.objects.get(pk=self.ctype_data.get("id"))
+        self.ctype = ContentType.objects.get_for_id(self.ctype_id)
         return self.ctype
 
 
@@ -270,9 +350,33 @@ class UpdateModelEvent(Event):
         if isinstance(new_target, Model):
             new_target = EventObject(new_target)
 
+        if "changed_fields" not in kwargs and old_target and new_target:
+            kwargs["changed_fields"] = [
+                field
+                for field, value in new_target.data.items()
+                if old_target.data.get(field) != value
+            ]
+
+            if old_target.compact and new_target.compact:
+                # NOTE: Unchanged fields are left out, consumers needing the
+                # whole object load it with `get_from_db`
+                fields = {"id", *kwargs["changed_fields"]}
+                old_target, new_target = [
+                    EventObject(
+                        data={
+                            field: value
+                            for field, value in target.data.items()
+                            if field in fields
+                        },
+                        ctype_data=target.ctype_data,
+                    )
+                    for target in (old_target, new_target)
+                ]
+
         self.actor = actor
         self.old_target = old_target
         self.new_target = new_target
+        self.changed_fields = kwargs.get("changed_fields")
 
         actor_data = None
         old_target_data = None
@@ -348,8 +452,7 @@ class EventConsumer(ConsumerMixin):
             capture_exception(e)
             log.exception(e)
 
-    def process(self, body, message):
-        event = Event.from_dict(body)
+    def dispatch(self, event):
         handler_name = f"handle_{event.name}"
         handler = getattr(self.services, handler_name, None)
 
@@ -361,8 +464,264 @@ class EventConsumer(ConsumerMixin):
         if handler:
             self.execute_handler(handler, event)
 
+    def process(self, body, message):
+        event = Event.from_dict(body)
+        self.dispatch(event)
         message.ack()
 
+    def stop(self, *args):
+        """Stop consuming after the current message. Usable as a signal handler."""
+        self.should_stop = True
+
+
+class PoolEventConsumer(EventConsumer):
+    """Consumer that runs handlers on a pool of `workers` threads.
+
+    Prefetched events wait in priority lanes and the lowest lane is dispatched
+    first. Lanes and concurrency limits are read from the service's
+    `EVENT_PRIORITIES` and `EVENT_CONCURRENCY` mappings of event names, e.g.
+    `{"payment_success": 0}` and `{"grade_sheet_created": 1}`. Events not
+    listed run in `default_priority` without a limit.
+
+    Messages are acked by the consumer thread after their handler completes.
+    On shutdown the consumer stops receiving and waits up to `drain_timeout`
+    seconds for prefetched events to complete, unacked messages are
+    redelivered by the broker.
+    """
+
+    default_priority = 10
+    ack_interval = 0.1
+
+    def __init__(
+        self,
+        service_name,
+        services,
+        connection,
+        workers=4,
+        prefetch_count=None,
+        drain_timeout=30,
+    ):
+        super().__init__(service_name, services, connection)
+        self.workers = workers
+        self.prefetch_count = prefetch_count or workers * 2
+        self.drain_timeout = drain_timeout
+        self.priorities = getattr(services, "EVENT_PRIORITIES", {})
+        self.limits = getattr(services, "EVENT_CONCURRENCY", {})
+
+        self.pending = []
+        self.running = Counter()
+        self.sequence = count()
+        self.condition = threading.Condition()
+        self.completed = queue.SimpleQueue()
+        self.consumer = None
+        self.consumer_prefetch_count = None
+        self.draining = False
+        self.threads = []
+
+    def get_consumers(self, Consumer, channel):
+        self.consumer = Consumer(
+            queues=[self.queue],
+            accept=["json"],
+            callbacks=[self.process],
+            tag_prefix=self.service_name,
+            prefetch_count=self.prefetch_count,
+        )
+        self.consumer_prefetch_count = self.prefetch_count
+        return [self.consumer]
+
+    def consume(self, *args, **kwargs):
+        # NOTE: Wake up often to ack the completed messages on this thread
+        kwargs.setdefault("safety_interval", self.ack_interval)
+        return super().consume(*args, **kwargs)
+
+    def on_consume_ready(self, connection, channel, consumers, **kwargs):
+        with self.condition:
+            # Messages of a lost channel are redelivered by the broker
+            self.pending = []
+            self.draining = False
+
+        self.threads = [thread for thread in self.threads if thread.is_alive()]
+
+        while len(self.threads) < self.workers:
+            thread = threading.Thread(
+                target=self.work,
+                name=f"{self.service_name}-worker-{len(self.threads)}",
+                daemon=True,
+            )
+            thread.start()
+            self.threads.append(thread)
+
+    def process(self, body, message):
+        event = Event.from_dict(body)
+        priority = self.priorities.get(event.name, self.default_priority)
+
+        with self.condition:
+            self.pending.append((priority, next(self.sequence), event, message))
+            self.condition.notify()
+
+    def _is_limited(self, event):
+        limit = self.limits.get(event.name)
+        return limit is not None and self.running[event.name] >= limit
+
+    def _pending_pop(self):
+        runnable = [item for item in self.pending if not self._is_limited(item[2])]
+
+        if not runnable:
+            return None
+
+        item = min(runnable, key=lambda item: item[:2])
+        self.pending.remove(item)
+        return item
+
+    def work(self):
+        while True:
+            with self.condition:
+                item = self._pending_pop()
+
+                while not item:
+                    if self.draining and not self.pending:
+                        break
+
+                    self.condition.wait()
+                    item = self._pending_pop()
+
+                if not item:
+                    break
+
+                _, _, event, message = item
+                self.running[event.name] += 1
+
+            close_old_connections()
+
+            try:
+                self.dispatch(event)
+            finally:
+                with self.condition:
+                    self.running[event.name] -= 1
+                    self.condition.notify_all()
+
+                self.completed.put(message)
+
+        db_connection.close()
+
+    def ack_completed(self):
+        while True:
+            try:
+                message = self.completed.get_nowait()
+            except queue.Empty:
+                return
+
+            try:
+                message.ack()
+            except Exception as e:
+                # The channel of the message was lost, it is redelivered
+                log.warning("event_ack_failed", error=str(e))
+
+    def on_iteration(self):
+        self.ack_completed()
+
+        with self.condition:
+            blocked = sum(1 for item in self.pending if self._is_limited(item[2]))
+
+        # NOTE: Events waiting on a concurrency limit do not count towards the
+        # prefetch, so a backlog of limited events cannot starve other lanes
+        prefetch_count = min(self.prefetch_count + blocked, self.prefetch_count * 4)
+
+        if self.consumer and prefetch_count != self.consumer_prefetch_count:
+            self.consumer.qos(prefetch_count=prefetch_count)
+            self.consumer_prefetch_count = prefetch_count
+
+    def on_consume_end(self, connection, channel):
+        with self.condition:
+            self.draining = True
+            self.condition.notify_all()
+
+        deadline = time.monotonic() + self.drain_timeout
+
+        for thread in self.threads:
+            thread.join(max(deadline - time.monotonic(), 0))
+
+        self.ack_completed()
+
+        if any(thread.is_alive() for thread in self.threads):
+            with self.condition:
+                # Left unacked, the broker redelivers them
+                self.pending = []
+
+            log.warning("event_consumer_drain_timeout", service=self.service_name)
+
+
+class BatchEventConsumer(EventConsumer):
+    """Consumer that prefetches up to `batch_size` messages and hands them to
+    the service's `handle_batch` handler at once. The batch is flushed when it
+    is full or `batch_timeout` seconds after its first message, then acked.
+
+    Events are dispatched one by one when the service has no `handle_batch`
+    handler or when it fails.
+    """
+
+    def __init__(
+        self, service_name, services, connection, batch_size=100, batch_timeout=1
+    ):
+        super().__init__(service_name, services, connection)
+        self.batch_size = batch_size
+        self.batch_timeout = batch_timeout
+        self.batch = []
+        self.batch_started_at = None
+
+    def get_consumers(self, Consumer, channel):
+        consumer = Consumer(
+            queues=[self.queue],
+            accept=["json"],
+            callbacks=[self.process],
+            tag_prefix=self.service_name,
+            prefetch_count=self.batch_size,
+        )
+        return [consumer]
+
+    def process(self, body, message):
+        if not self.batch:
+            self.batch_started_at = time.monotonic()
+
+        self.batch.append((Event.from_dict(body), message))
+
+        if len(self.batch) >= self.batch_size:
+            self.flush()
+
+    def on_iteration(self):
+        if (
+            self.batch
+            and time.monotonic() - self.batch_started_at >= self.batch_timeout
+        ):
+            self.flush()
+
+    def on_consume_end(self, connection, channel):
+        self.flush()
+
+    def flush(self):
+        batch, self.batch = self.batch, []
+
+        if not batch:
+            return
+
+        events = [event for event, _ in batch]
+        handler = getattr(self.services, "handle_batch", None)
+
+        try:
+            if handler:
+                handler(events=events)
+        except Exception as e:
+            capture_exception(e)
+            log.exception(e)
+            handler = None
+
+        if not handler:
+            for event in events:
+                self.dispatch(event)
+
+        for _, message in batch:
+            message.ack()
+
 
 class EventBus:
     def __init__(self, service_name):
@@ -371,6 +730,13 @@ class EventBus:
         self.exchange = Exchange(settings.EVENT_GLOBAL_EXCHANGE, "fanout", durable=True)
 
     def publish(self, event):
+        if settings.EVENT_OUTBOX:
+            # Committed or rolled back with the change, published by the relay
+            OutboxEvent.objects.create(
+                service_name=self.service_name, body=event.to_dict()
+            )
+            return
+
         with producers[self.connection].acquire(block=True) as producer:
             producer.publish(
                 event.to_dict(),
@@ -380,6 +746,131 @@ class EventBus:
                 retry=True,
             )
 
+    def publish_many(self, events):
+        """Publish `events` as one batch: a single outbox insert, or one
+        producer once the current transaction commits"""
+        if not events:
+            return
+
+        if settings.EVENT_OUTBOX:
+            OutboxEvent.objects.bulk_create(
+                [
+                    OutboxEvent(service_name=self.service_name, body=event.to_dict())
+                    for event in events
+                ]
+            )
+            return
+
+        bodies = [event.to_dict() for event in events]
+
+        def _publish():
+            with producers[self.connection].acquire(block=True) as producer:
+                for body in bodies:
+                    producer.publish(
+                        body,
+                        serializer="json",
+                        exchange=self.exchange,
+                        declare=[self.exchange],
+                        retry=True,
+                    )
+
+        transaction.on_commit(_publish)
+
+
+class EventRelay:
+    """Publishes the outbox events in batches, oldest first.
+
+    Batches are locked with `SKIP LOCKED` so several relays can run side by
+    side, and marked sent in the transaction that locked them. An event is
+    published again if the relay stops before the batch is marked, so
+    consumers must tolerate duplicates.
+    """
+
+    purge_interval = 60 * 60
+
+    def __init__(self, connection, batch_size=100, interval=1, retention=None):
+        self.connection = connection
+        self.batch_size = batch_size
+        self.interval = interval
+        self.retention = retention
+        self.purged_at = None
+        self.exchange = Exchange(settings.EVENT_GLOBAL_EXCHANGE, "fanout", durable=True)
+        self.producer = None
+        self.should_stop = False
+
+    def stop(self, *args):
+        """Stop after the current batch. Usable as a signal handler."""
+        self.should_stop = True
+
+    def producer_get(self):
+        if not self.producer:
+            self.connection.ensure_connection(max_retries=3)
+            channel = self.connection.channel()
+            # NOTE: Declared once per connection instead of on every message
+            self.exchange(channel).declare()
+            self.producer = Producer(channel, exchange=self.exchange)
+
+        return self.producer
+
+    def producer_reset(self):
+        self.producer = None
+        self.connection.close()
+
+    def relay(self) -> int:
+        with transaction.atomic():
+            outbox_events = list(
+                OutboxEvent.objects.select_for_update(skip_locked=True)
+                .filter(sent_at__isnull=True)
+                .order_by("id")[: self.batch_size]
+            )
+
+            if not outbox_events:
+                return 0
+
+            producer = self.producer_get()
+
+            for outbox_event in outbox_events:
+                producer.publish(outbox_event.body, serializer="json")
+
+            OutboxEvent.objects.filter(
+                id__in=[outbox_event.id for outbox_event in outbox_events]
+            ).update(sent_at=timezone.now())
+
+        return len(outbox_events)
+
+    def purge(self, *, before) -> int:
+        """Delete the events sent before `before`"""
+        deleted, _ = OutboxEvent.objects.filter(sent_at__lt=before).delete()
+        return deleted
+
+    def maybe_purge(self):
+        if not self.retention:
+            return
+
+        if self.purged_at and time.monotonic() - self.purged_at < self.purge_interval:
+            return
+
+        self.purge(before=timezone.now() - self.retention)
+        self.purged_at = time.monotonic()
+
+    def run(self):
+        errors = self.connection.connection_errors + self.connection.channel_errors
+
+        while not self.should_stop:
+            try:
+                relayed = self.relay()
+            except errors as e:
+                log.warning("event_relay_connection_lost", error=str(e))
+                self.producer_reset()
+                relayed = 0
+
+            if relayed < self.batch_size:
+                self.maybe_purge()
+                time.sleep(self.interval)
+
+        if self.producer:
+            self.producer_reset()
+
 
 class EventPublisher:
     def generic(self, name, object, **data):
@@ -387,6 +878,16 @@ class EventPublisher:
         event = GenericModelEvent(name, object=object, **data)
         event.publish()
 
+    def generic_many(self, name, objects, **data):
+        """Shortcut to publish a `GenericModelEvent` per object as one batch"""
+        events = [GenericModelEvent(name, object=obj, **data) for obj in objects]
+
+        if events:
+            service_events = importlib.import_module(
+                f"slu.{events[0].service_name}.events"
+            )
+            service_events.bus.publish_many(events)
+
     def create(self, name, actor, target, **data):
         """Shortcut to publish `CreateModelEvent`s"""
         event = CreateModelEvent(name, actor=actor, target=target, **data)
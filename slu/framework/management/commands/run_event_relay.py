@@ -0,0 +1,55 @@
+import signal
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from kombu import Connection
+
+from slu.framework.events import EventRelay
+
+
+class Command(BaseCommand):
+    help = "Publish the events of the outbox to the event broker"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=100,
+            help="Number of events published per transaction",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=1,
+            help="Seconds to wait when the outbox is empty",
+        )
+        parser.add_argument(
+            "--retention-days",
+            type=int,
+            default=7,
+            help="Days to keep sent events. Use 0 to keep them.",
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"[{timezone.now()}] - event relay starting")
+        retention = None
+
+        if options["retention_days"]:
+            retention = timedelta(days=options["retention_days"])
+
+        # NOTE: Confirmed publishes so events are only marked sent once the
+        # broker has them
+        with Connection(
+            settings.EVENT_BROKER_URL, transport_options={"confirm_publish": True}
+        ) as conn:
+            relay = EventRelay(
+                connection=conn,
+                batch_size=options["batch_size"],
+                interval=options["interval"],
+                retention=retention,
+            )
+            signal.signal(signal.SIGTERM, relay.stop)
+            signal.signal(signal.SIGINT, relay.stop)
+            relay.run()
@@ -1,3 +1,4 @@
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
 from django.forms.models import model_to_dict
 from django.utils import timezone
@@ -101,3 +102,25 @@ class PolymorphicSoftDeleteModel(SoftDeleteMixin, PolymorphicBaseModel):
 
     class Meta:
         abstract = True
+
+
+class OutboxEvent(models.Model):
+    """Event waiting to be published by the relay, written in the transaction
+    of the change that raised it."""
+
+    service_name = models.CharField(max_length=50)
+    body = models.JSONField(encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True, db_index=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["id"],
+                condition=models.Q(sent_at__isnull=True),
+                name="framework_outbox_pending_idx",
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.body.get('event')} ({self.id})"
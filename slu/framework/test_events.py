@@ -0,0 +1,208 @@
+import threading
+import time
+from collections import Counter
+from functools import partial
+from types import SimpleNamespace
+
+import pytest
+from kombu import Connection, Consumer, Exchange, Producer, Queue
+
+from slu.framework.events import Event, EventRelay, PoolEventConsumer
+from slu.framework.models import OutboxEvent
+
+
+@pytest.mark.django_db
+class TestEventRelay:
+    def test_relay(self, settings):
+        settings.EVENT_OUTBOX = True
+        exchange = Exchange(settings.EVENT_GLOBAL_EXCHANGE, "fanout", durable=True)
+
+        with Connection("memory://") as connection:
+            queue = Queue("slu.test", exchange=exchange)(connection.channel())
+            queue.declare()
+
+            Event("payment.payment_success", data={"id": 1}).publish()
+            assert queue.get() is None
+
+            relay = EventRelay(connection=connection)
+            assert relay.relay() == 1
+            assert relay.relay() == 0
+
+            message = queue.get()
+            assert message.payload["event"] == "payment.payment_success"
+            assert message.payload["data"]["id"] == 1
+
+        assert not OutboxEvent.objects.filter(sent_at__isnull=True).exists()
+
+
+def _wait_until(predicate, timeout=5):
+    deadline = time.monotonic() + timeout
+
+    while not predicate():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+class TestPoolEventConsumer:
+    @pytest.fixture
+    def consume(self):
+        """Start a `PoolEventConsumer` and its workers over the memory transport.
+        The returned `publish` blocks until the consumer received the events."""
+        connection = Connection("memory://")
+        consumers = []
+
+        def _consume(services, **kwargs):
+            channel = connection.channel()
+            consumer = PoolEventConsumer(
+                f"test_{len(consumers)}_{time.monotonic_ns()}",
+                services,
+                connection,
+                **kwargs,
+            )
+            consumers.append(consumer)
+            received = []
+            process = consumer.process
+
+            def _process(body, message):
+                received.append(message)
+                process(body, message)
+
+            consumer.process = _process
+            (kombu_consumer,) = consumer.get_consumers(
+                partial(Consumer, channel), channel
+            )
+            kombu_consumer.consume()
+            consumer.on_consume_ready(connection, channel, [kombu_consumer])
+            producer = Producer(channel, exchange=consumer.queue.exchange)
+
+            def _publish(*names):
+                count = len(received)
+
+                for name in names:
+                    producer.publish(Event(f"test.{name}").to_dict(), serializer="json")
+
+                while len(received) < count + len(names):
+                    connection.drain_events(timeout=1)
+
+                return received[count:]
+
+            return consumer, _publish
+
+        yield _consume
+
+        for consumer in consumers:
+            consumer.drain_timeout = 5
+            consumer.on_consume_end(connection, None)
+
+        connection.release()
+
+    def test_lanes(self, consume):
+        gate = threading.Event()
+        handled = []
+        services = SimpleNamespace(
+            EVENT_PRIORITIES={"urgent": 0},
+            handle_gate=lambda event: gate.wait(5),
+            handle_urgent=lambda event: handled.append(event.name),
+            handle_normal=lambda event: handled.append(event.name),
+        )
+        consumer, publish = consume(services, workers=1, prefetch_count=8)
+
+        # NOTE: Hold the only worker so the events queue up in their lanes
+        publish("gate")
+        _wait_until(lambda: consumer.running["gate"] == 1)
+        messages = publish("normal", "urgent", "normal", "urgent")
+        gate.set()
+        _wait_until(lambda: len(handled) == 4)
+
+        # NOTE: Lower lanes first, then in the order received
+        assert handled == ["urgent", "urgent", "normal", "normal"]
+        _wait_until(lambda: not consumer.running["normal"])
+        consumer.on_iteration()
+        assert all(message.acknowledged for message in messages)
+
+    def test_concurrency_limit(self, consume):
+        gate = threading.Event()
+        lock = threading.Lock()
+        running = Counter()
+        peak = Counter()
+        handled = []
+
+        def handle_slow(event):
+            with lock:
+                running["slow"] += 1
+                peak["slow"] = max(peak["slow"], running["slow"])
+
+            gate.wait(5)
+
+            with lock:
+                running["slow"] -= 1
+                handled.append(event.name)
+
+        services = SimpleNamespace(
+            EVENT_CONCURRENCY={"slow": 1},
+            handle_slow=handle_slow,
+            handle_fast=lambda event: handled.append(event.name),
+        )
+        consumer, publish = consume(services, workers=3, prefetch_count=2)
+        publish("slow", "slow")
+        _wait_until(lambda: consumer.running["slow"] == 1)
+
+        # NOTE: Limited events waiting in the lanes raise the prefetch, so
+        # other events are still received while they wait for a slot
+        consumer.on_iteration()
+        assert consumer.consumer_prefetch_count == 3
+        publish("slow")
+        consumer.on_iteration()
+        assert consumer.consumer_prefetch_count == 4
+        publish("fast")
+        _wait_until(lambda: handled == ["fast"])
+        assert running["slow"] == 1
+
+        gate.set()
+        _wait_until(lambda: len(handled) == 4)
+        assert peak["slow"] == 1
+
+        consumer.on_iteration()
+        assert consumer.consumer_prefetch_count == 2
+
+    def test_ack_after_handler(self, consume):
+        gate = threading.Event()
+        consumer, publish = consume(
+            SimpleNamespace(handle_slow=lambda event: gate.wait(5))
+        )
+        (message,) = publish("slow")
+
+        _wait_until(lambda: consumer.running["slow"] == 1)
+        consumer.on_iteration()
+        assert not message.acknowledged
+
+        gate.set()
+        _wait_until(lambda: not consumer.completed.empty())
+
+        # NOTE: Workers never ack, the consumer thread does on its next iteration
+        assert not message.acknowledged
+        consumer.on_iteration()
+        assert message.acknowledged
+
+    def test_drain(self, consume):
+        gate = threading.Event()
+        services = SimpleNamespace(
+            EVENT_CONCURRENCY={"slow": 1},
+            handle_slow=lambda event: gate.wait(5),
+            handle_fast=lambda event: None,
+        )
+        consumer, publish = consume(services, workers=2, drain_timeout=0.2)
+        (fast,) = publish("fast")
+        _wait_until(lambda: not consumer.completed.empty())
+        running, waiting = publish("slow", "slow")
+        _wait_until(lambda: consumer.running["slow"] == 1)
+
+        consumer.on_consume_end(consumer.connection, None)
+
+        # NOTE: Completed messages are acked, the others are left to the broker
+        assert fast.acknowledged
+        assert not running.acknowledged
+        assert not waiting.acknowledged
+        assert consumer.pending == []
+
+        gate.set()
@@ -1,3 +1,4 @@
+import csv
 import json
 import os
 import random
@@ -5,6 +6,7 @@ import string
 import sys
 import time
 from decimal import Decimal
+from itertools import islice
 
 from django.conf import settings
 
@@ -33,6 +35,27 @@ def format_currency(amount):
     return f"\u20B1{Decimal(amount):,.2f}"
 
 
+def chunked(iterable, size):
+    """Yield lists of at most `size` items from `iterable` without
+    materializing the whole iterable."""
+    iterator = iter(iterable)
+
+    while True:
+        chunk = list(islice(iterator, size))
+
+        if not chunk:
+            return
+
+        yield chunk
+
+
+def csv_file_reader(file, reader_cls=csv.reader, **kwargs):
+    """Stream the rows of an uploaded CSV `File` line by line instead of
+    reading and decoding the whole file at once."""
+    lines = (line.decode() for line in file)
+    return reader_cls(lines, **kwargs)
+
+
 class LoadScreen:
     colors = {
         "HEADER": "\033[95m",
@@ -37,3 +37,10 @@ class NotificationChannelChildAdmin(PolymorphicChildModelAdmin):
 @admin.register(models.EmailChannel)
 class EmailChannelAdmin(NotificationChannelChildAdmin):
     pass
+
+
+@admin.register(models.EmailDelivery)
+class EmailDeliveryAdmin(admin.ModelAdmin):
+    list_display = ["notification", "recipient", "status", "attempts", "sent_at"]
+    list_filter = ["status"]
+    raw_id_fields = ("notification", "recipient")
@@ -12,3 +12,9 @@ MESSAGE_FINANCE_PHONE = get_config("NOTIFICATION_MESSAGE_FINANCE_PHONE")
 FORMAT_DATE = "%B %d, %Y"
 FORMAT_TIME = "%I:%M%p"
 FORMAT_DATETIME = "%B %d, %Y %I:%M%p"
+
+# Recipients per `email_chunk_send` task and per recorded batch of deliveries
+EMAIL_CHUNK_SIZE = int(get_config("NOTIFICATION_EMAIL_CHUNK_SIZE", 1000))
+EMAIL_BATCH_SIZE = int(get_config("NOTIFICATION_EMAIL_BATCH_SIZE", 50))
+EMAIL_MAX_RETRIES = int(get_config("NOTIFICATION_EMAIL_MAX_RETRIES", 5))
+EMAIL_RETRY_DELAY = int(get_config("NOTIFICATION_EMAIL_RETRY_DELAY", 60))
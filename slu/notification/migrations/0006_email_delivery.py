@@ -0,0 +1,43 @@
+# Generated by Django 3.2.14 on 2026-10-18 07:27
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import slu.framework.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('notification', '0005_emailchannel_enable_whitelist'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notification',
+            name='email_body',
+            field=models.TextField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='EmailDelivery',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('is_active', models.BooleanField(default=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('updated_at', models.DateTimeField(auto_now=True, db_index=True)),
+                ('status', slu.framework.models.TextChoiceField(choices=[('P', 'Pending'), ('S', 'Sent'), ('F', 'Failed')], default='P', help_text='```json\n{\n    "P": "Pending",\n    "S": "Sent",\n    "F": "Failed"\n}\n```', max_length=1)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('error', models.TextField(blank=True, null=True)),
+                ('sent_at', models.DateTimeField(blank=True, null=True)),
+                ('channel', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='notification.emailchannel')),
+                ('notification', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='email_deliveries', to='notification.notification')),
+                ('recipient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            bases=(slu.framework.models.BaseModelMixin, models.Model),
+        ),
+        migrations.AddConstraint(
+            model_name='emaildelivery',
+            constraint=models.UniqueConstraint(fields=('notification', 'channel', 'recipient'), name='notification_email_delivery_unique'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.14 on 2026-10-18 07:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notification', '0006_email_delivery'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notification',
+            name='audience',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 3.2.14 on 2026-10-18 08:13
+
+from django.db import migrations
+import slu.framework.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notification', '0007_notification_audience'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='emaildelivery',
+            name='status',
+            field=slu.framework.models.TextChoiceField(choices=[('P', 'Pending'), ('S', 'Sent'), ('F', 'Failed'), ('R', 'Refused')], default='P', help_text='```json\n{\n    "P": "Pending",\n    "S": "Sent",\n    "F": "Failed",\n    "R": "Refused"\n}\n```', max_length=1),
+        ),
+    ]
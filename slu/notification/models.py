@@ -1,7 +1,7 @@
 from django.contrib.auth import get_user_model
 from django.db import models
 
-from slu.framework.models import BaseModel, PolymorphicBaseModel
+from slu.framework.models import BaseModel, PolymorphicBaseModel, TextChoiceField
 
 User = get_user_model()
 
@@ -10,6 +10,11 @@ class Notification(BaseModel):
     recipients = models.ManyToManyField(User)
     message_key = models.CharField(max_length=255)
     context = models.JSONField(blank=True, default=dict)
+    # Mass notifications store the filters of their recipients instead of
+    # adding every user, see `selectors.notification_recipients_get`
+    audience = models.JSONField(blank=True, default=dict)
+    # Rendered once by `email_send` and shared by every recipient chunk
+    email_body = models.TextField(blank=True, null=True)
 
     def __str__(self):
         return f"{self.message_key}"
@@ -38,3 +43,34 @@ class EmailChannel(NotificationChannel):
         from .services import email_handler
 
         return email_handler
+
+
+class EmailDelivery(BaseModel):
+    class Statuses(models.TextChoices):
+        PENDING = "P", "Pending"
+        SENT = "S", "Sent"
+        FAILED = "F", "Failed"
+        REFUSED = "R", "Refused"
+
+    notification = models.ForeignKey(
+        Notification, on_delete=models.CASCADE, related_name="email_deliveries"
+    )
+    channel = models.ForeignKey(EmailChannel, on_delete=models.CASCADE)
+    recipient = models.ForeignKey(User, on_delete=models.CASCADE)
+    status = TextChoiceField(
+        max_length=1, choices_cls=Statuses, default=Statuses.PENDING
+    )
+    attempts = models.PositiveSmallIntegerField(default=0)
+    error = models.TextField(blank=True, null=True)
+    sent_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["notification", "channel", "recipient"],
+                name="notification_email_delivery_unique",
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.notification} - {self.recipient}"
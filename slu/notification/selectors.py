@@ -0,0 +1,36 @@
+from django.contrib.auth import get_user_model
+from django.db.models import QuerySet
+
+from slu.framework.cache import reference_cached
+
+from .models import EmailChannel, Notification, NotificationChannel
+
+User = get_user_model()
+
+AUDIENCE_FILTERS = {
+    "role": "groups__id",
+    "school": "student__course__school_id",
+    "course": "student__course_id",
+    "year_level": "student__year_level",
+}
+
+
+@reference_cached(NotificationChannel, EmailChannel)
+def notification_channels_get() -> list[NotificationChannel]:
+    return list(NotificationChannel.objects.filter(is_active=True))
+
+
+def notification_recipients_get(*, notification: Notification) -> QuerySet[User]:
+    """Return the users of the audience of a mass notification, see
+    `AUDIENCE_FILTERS`, or the recipients added to the notification."""
+    if not notification.audience:
+        return notification.recipients.all()
+
+    filters = {
+        AUDIENCE_FILTERS[key]: value for key, value in notification.audience.items()
+    }
+
+    if set(notification.audience) - {"role"}:
+        filters["student__deleted_at__isnull"] = True
+
+    return User.objects.filter(**filters)
@@ -5,23 +5,22 @@ from django.utils.encoding import force_bytes
 from django.utils.http import urlsafe_base64_encode
 
 from slu.core.accounts.constants import ReservedRole
-from slu.core.accounts.models import Role
+from slu.core.accounts.selectors import role_get
 from slu.framework.events import GenericEvent, GenericModelEvent
 from slu.framework.utils import format_currency
 from slu.notification.messages import MessageKeys
 from slu.payment.models import PaymentMethods
 
 from . import app_settings
-from .models import EmailChannel, Notification, NotificationChannel
+from .models import EmailChannel, Notification
+from .selectors import notification_channels_get
 from .tasks import email_send
 
 User = get_user_model()
 
 
 def notification_send(*, notification: Notification):
-    channels = NotificationChannel.objects.filter(is_active=True)
-
-    for channel in channels:
+    for channel in notification_channels_get():
         channel_handler = channel.get_handler()
         channel_handler(channel=channel, notification=notification)
 
@@ -36,13 +35,11 @@ def handle_enrollment_reminder_sent(event: GenericEvent):
     except Exception:
         return
 
-    student_role = Role.objects.filter(name=ReservedRole.STUDENT).first()
+    student_role = role_get(name=ReservedRole.STUDENT)
 
     if not student_role:
         return
 
-    student_users = student_role.user_set.all()
-
     notification = Notification.objects.create(
         message_key="enrollment_reminders",
         context={
@@ -50,8 +47,8 @@ def handle_enrollment_reminder_sent(event: GenericEvent):
                 app_settings.FORMAT_DATETIME
             )
         },
+        audience={"role": student_role.id},
     )
-    notification.recipients.add(*list(student_users))
     notification_send(notification=notification)
 
 
@@ -61,13 +58,11 @@ def handle_pre_enrollment_reminder_sent(event: GenericEvent):
     except Exception:
         return
 
-    student_role = Role.objects.filter(name=ReservedRole.STUDENT).first()
+    student_role = role_get(name=ReservedRole.STUDENT)
 
     if not student_role:
         return
 
-    student_users = student_role.user_set.all()
-
     notification = Notification.objects.create(
         message_key="pre_enrollment_reminder",
         context={
@@ -75,8 +70,8 @@ def handle_pre_enrollment_reminder_sent(event: GenericEvent):
                 app_settings.FORMAT_DATETIME
             )
         },
+        audience={"role": student_role.id},
     )
-    notification.recipients.add(*list(student_users))
     notification_send(notification=notification)
 
 
@@ -1,14 +1,25 @@
+import smtplib
 from dataclasses import asdict
 
+import structlog
 from celery import shared_task
 from django.conf import settings
 from django.core.mail import EmailMessage
 from django.core.mail.backends.smtp import EmailBackend
+from django.db.models import F
 from django.template.loader import render_to_string
+from django.utils import timezone
+
+from slu.framework.utils import chunked
 
 from . import app_settings
 from .messages import EMAIL_MESSAGES
-from .models import EmailChannel, Notification
+from .models import EmailChannel, EmailDelivery, Notification
+from .selectors import notification_recipients_get
+
+log = structlog.get_logger(__name__)
+
+_email_connections = {}
 
 
 def _in_email_whitelist(email):
@@ -20,47 +31,218 @@ def _in_email_whitelist(email):
             return True
 
 
+def _email_connection_get(channel: EmailChannel) -> EmailBackend:
+    """Return the SMTP connection of the channel shared by the tasks run in
+    the worker process, closed if the server dropped it."""
+    key = (
+        channel.host,
+        channel.port,
+        channel.user,
+        channel.password,
+        channel.use_tls,
+        channel.use_ssl,
+    )
+    connection = _email_connections.get(key)
+
+    if connection is None:
+        connection = EmailBackend(
+            host=channel.host,
+            port=channel.port,
+            username=channel.user,
+            password=channel.password,
+            use_tls=channel.use_tls,
+            use_ssl=channel.use_ssl,
+        )
+        _email_connections[key] = connection
+    elif connection.connection:
+        try:
+            connection.connection.noop()
+        except (smtplib.SMTPException, OSError):
+            _email_connection_reset(connection)
+
+    return connection
+
+
+def _email_connection_reset(connection: EmailBackend):
+    try:
+        connection.close()
+    except (smtplib.SMTPException, OSError):
+        connection.connection = None
+
+
+def _email_deliveries_update(
+    *, notification_id: int, channel_id: int, recipient_ids: list[int], **fields
+):
+    EmailDelivery.objects.filter(
+        notification_id=notification_id,
+        channel_id=channel_id,
+        recipient_id__in=recipient_ids,
+    ).update(attempts=F("attempts") + 1, updated_at=timezone.now(), **fields)
+
+
+def _email_error_is_permanent(error: Exception) -> bool:
+    """Whether the server rejected the message itself, so sending it again
+    would fail the same way"""
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return True
+
+    return isinstance(error, smtplib.SMTPResponseException) and error.smtp_code >= 500
+
+
 @shared_task
 def email_send(channel_id: int, notification_id: int):
+    """Render the email of the notification once and dispatch a
+    `email_chunk_send` task per id range of `EMAIL_CHUNK_SIZE` recipients"""
+    notification = Notification.objects.get(id=notification_id)
+    email_message = EMAIL_MESSAGES.get(notification.message_key)
+
+    if not email_message:
+        return
+
+    body = email_message.body
+
+    if email_message.template:
+        context = {"notification": notification, "app_settings": app_settings}
+        context.update(notification.context)
+        body = render_to_string(email_message.template, context)
+
+    notification.email_body = body
+    notification.save(update_fields=["email_body", "updated_at"])
+
+    recipient_ids = (
+        notification_recipients_get(notification=notification)
+        .order_by("id")
+        .values_list("id", flat=True)
+        .iterator()
+    )
+
+    for chunk in chunked(recipient_ids, app_settings.EMAIL_CHUNK_SIZE):
+        email_chunk_send.delay(channel_id, notification_id, chunk[0], chunk[-1])
+
+
+@shared_task(
+    bind=True,
+    max_retries=app_settings.EMAIL_MAX_RETRIES,
+    default_retry_delay=app_settings.EMAIL_RETRY_DELAY,
+)
+def email_chunk_send(
+    self, channel_id: int, notification_id: int, start_id: int, end_id: int
+):
+    """Send the email of the notification to the recipients with ids from
+    `start_id` to `end_id` that it was not yet delivered to.
+
+    Deliveries are recorded `EMAIL_BATCH_SIZE` recipients at a time. A message
+    refused by the server is marked refused and never resent, any other error
+    stops the chunk until the task is retried.
+    """
     channel = EmailChannel.objects.get(id=channel_id)
     notification = Notification.objects.get(id=notification_id)
+    email_message = EMAIL_MESSAGES.get(notification.message_key)
+
+    if not email_message:
+        return
 
-    with EmailBackend(
-        host=channel.host,
-        port=channel.port,
-        username=channel.user,
-        password=channel.password,
-        use_tls=channel.use_tls,
-        use_ssl=channel.use_ssl,
-    ) as connection:
-        email_message = EMAIL_MESSAGES.get(notification.message_key)
+    email_data = asdict(email_message)
+    email_data.pop("body")
+    template_name = email_data.pop("template")
 
-        if not email_message:
-            return
+    done_ids = EmailDelivery.objects.filter(
+        notification_id=notification_id,
+        channel_id=channel_id,
+        status__in=[EmailDelivery.Statuses.SENT, EmailDelivery.Statuses.REFUSED],
+    ).values("recipient_id")
+    recipients = (
+        notification_recipients_get(notification=notification)
+        .filter(id__gte=start_id, id__lte=end_id)
+        .exclude(id__in=done_ids)
+        .order_by("id")
+        .only("id", "email")
+        .iterator()
+    )
 
-        email_data = asdict(email_message)
+    connection = _email_connection_get(channel)
+    delivery = {
+        "notification_id": notification_id,
+        "channel_id": channel_id,
+    }
+    error = None
 
-        body = email_data.pop("body")
-        template_name = email_data.pop("template")
+    for batch in chunked(recipients, app_settings.EMAIL_BATCH_SIZE):
+        batch = [
+            recipient
+            for recipient in batch
+            if recipient.email
+            and (not channel.enable_whitelist or _in_email_whitelist(recipient.email))
+        ]
 
-        if template_name:
-            context = {"notification": notification, "app_settings": app_settings}
-            context.update(notification.context)
-            body = render_to_string(template_name, context)
+        if not batch:
+            continue
 
-        for recipient in notification.recipients.all():
-            if channel.enable_whitelist and not _in_email_whitelist(recipient.email):
-                continue
+        EmailDelivery.objects.bulk_create(
+            [
+                EmailDelivery(recipient_id=recipient.id, **delivery)
+                for recipient in batch
+            ],
+            ignore_conflicts=True,
+        )
 
+        sent_ids = []
+
+        # NOTE: Sent one at a time so a refused message neither fails nor
+        # resends the messages sent before it
+        for recipient in batch:
             msg = EmailMessage(
-                body=body,
+                body=notification.email_body,
                 from_email=channel.default_from,
                 to=[recipient.email],
-                connection=connection,
                 **email_data,
             )
 
             if template_name:
                 msg.content_subtype = "html"
 
-            msg.send()
+            try:
+                # NOTE: Opened here so `send_messages` keeps it open for the next one
+                connection.open()
+                connection.send_messages([msg])
+            except (smtplib.SMTPException, OSError) as e:
+                permanent = _email_error_is_permanent(e)
+                log.warning(
+                    "Email failed",
+                    notification_id=notification_id,
+                    recipient_id=recipient.id,
+                    permanent=permanent,
+                    error=str(e),
+                )
+                _email_deliveries_update(
+                    recipient_ids=[recipient.id],
+                    status=(
+                        EmailDelivery.Statuses.REFUSED
+                        if permanent
+                        else EmailDelivery.Statuses.FAILED
+                    ),
+                    error=str(e),
+                    **delivery,
+                )
+
+                if not permanent:
+                    error = e
+                    _email_connection_reset(connection)
+                    break
+            else:
+                sent_ids.append(recipient.id)
+
+        _email_deliveries_update(
+            recipient_ids=sent_ids,
+            status=EmailDelivery.Statuses.SENT,
+            error=None,
+            sent_at=timezone.now(),
+            **delivery,
+        )
+
+        # NOTE: The rest of the chunk is sent when the task is retried
+        if error:
+            break
+
+    if error:
+        raise self.retry(exc=error)
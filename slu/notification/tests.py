@@ -1,3 +1,146 @@
-from django.test import TestCase
+import smtplib
 
-# Create your tests here.
+import pytest
+
+from . import app_settings, selectors, tasks
+from .models import EmailChannel, EmailDelivery, Notification
+
+
+class FakeEmailConnection:
+    """Records the messages sent and refuses the `refused` addresses"""
+
+    connection = None
+
+    def __init__(self, refused=(), disconnected=()):
+        self.refused = refused
+        self.disconnected = list(disconnected)
+        self.sent = []
+
+    def open(self):
+        pass
+
+    def close(self):
+        pass
+
+    def send_messages(self, messages):
+        for message in messages:
+            if message.to[0] in self.refused:
+                raise smtplib.SMTPRecipientsRefused(
+                    {message.to[0]: (550, b"Mailbox unavailable")}
+                )
+
+            if message.to[0] in self.disconnected:
+                self.disconnected.remove(message.to[0])
+                raise smtplib.SMTPServerDisconnected("Connection unexpectedly closed")
+
+            self.sent.append(message.to[0])
+
+        return len(messages)
+
+
+@pytest.mark.django_db
+class TestNotificationRecipients:
+    def test_audience(self, student_factory, role):
+        student = student_factory()
+        other_student = student_factory()
+        student.user.groups.add(role)
+        other_student.user.groups.add(role)
+
+        notification = Notification.objects.create(
+            message_key="enrollment_reminders", audience={"role": role.id}
+        )
+        recipients = selectors.notification_recipients_get(notification=notification)
+        assert set(recipients) == {student.user, other_student.user}
+
+        notification.audience["course"] = student.course_id
+        recipients = selectors.notification_recipients_get(notification=notification)
+        assert list(recipients) == [student.user]
+
+    def test_recipients(self, user):
+        notification = Notification.objects.create(message_key="enrollment_reminders")
+        notification.recipients.add(user)
+
+        recipients = selectors.notification_recipients_get(notification=notification)
+        assert list(recipients) == [user]
+
+
+@pytest.mark.django_db
+class TestEmailSend:
+    @pytest.fixture
+    def notification(self, user_factory):
+        notification = Notification.objects.create(
+            message_key="enrollment_reminders", email_body="Reminder"
+        )
+        notification.recipients.add(*[user_factory() for _ in range(5)])
+        return notification
+
+    def test_email_send(self, notification, settings, monkeypatch):
+        settings.STATICFILES_STORAGE = (
+            "django.contrib.staticfiles.storage.StaticFilesStorage"
+        )
+        monkeypatch.setattr(app_settings, "EMAIL_CHUNK_SIZE", 2)
+        chunks = []
+        monkeypatch.setattr(
+            tasks.email_chunk_send, "delay", lambda *args: chunks.append(args[2:])
+        )
+        channel = EmailChannel.objects.create()
+
+        tasks.email_send(channel.id, notification.id)
+
+        user_ids = sorted(notification.recipients.values_list("id", flat=True))
+        assert chunks == [
+            (user_ids[0], user_ids[1]),
+            (user_ids[2], user_ids[3]),
+            (user_ids[4], user_ids[4]),
+        ]
+        notification.refresh_from_db()
+        assert notification.email_body
+
+    def test_email_chunk_send(self, notification, monkeypatch):
+        users = list(notification.recipients.order_by("id"))
+        channel = EmailChannel.objects.create()
+        EmailDelivery.objects.create(
+            notification=notification,
+            channel=channel,
+            recipient=users[0],
+            status=EmailDelivery.Statuses.SENT,
+        )
+        connection = FakeEmailConnection(refused=[users[2].email])
+        monkeypatch.setattr(tasks, "_email_connection_get", lambda _: connection)
+        monkeypatch.setattr(app_settings, "EMAIL_BATCH_SIZE", 2)
+
+        for _ in range(2):
+            tasks.email_chunk_send(
+                channel.id, notification.id, users[0].id, users[-1].id
+            )
+
+        # NOTE: Sent once, skipping the sent and the refused recipients
+        assert connection.sent == [users[1].email, users[3].email, users[4].email]
+
+        statuses = dict(EmailDelivery.objects.values_list("recipient_id", "status"))
+        assert statuses == {
+            users[0].id: EmailDelivery.Statuses.SENT,
+            users[1].id: EmailDelivery.Statuses.SENT,
+            users[2].id: EmailDelivery.Statuses.REFUSED,
+            users[3].id: EmailDelivery.Statuses.SENT,
+            users[4].id: EmailDelivery.Statuses.SENT,
+        }
+
+    def test_email_chunk_send_retry(self, notification, monkeypatch):
+        users = list(notification.recipients.order_by("id"))
+        channel = EmailChannel.objects.create()
+        connection = FakeEmailConnection(disconnected=[users[1].email])
+        monkeypatch.setattr(tasks, "_email_connection_get", lambda _: connection)
+
+        with pytest.raises(smtplib.SMTPServerDisconnected):
+            tasks.email_chunk_send(
+                channel.id, notification.id, users[0].id, users[-1].id
+            )
+
+        assert connection.sent == [users[0].email]
+        delivery = EmailDelivery.objects.get(recipient=users[1])
+        assert delivery.status == EmailDelivery.Statuses.FAILED
+
+        tasks.email_chunk_send(channel.id, notification.id, users[0].id, users[-1].id)
+
+        assert connection.sent == [user.email for user in users]
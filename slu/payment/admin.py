@@ -133,3 +133,17 @@ class OverTheCounterTransactionAdmin(PaymentTransactionChildAdmin):
 @admin.register(models.CashierTransaction)
 class CashierTransactionAdmin(PaymentTransactionChildAdmin):
     raw_id_fields = ("processed_by",)
+
+
+@admin.register(models.PaymentFact)
+class PaymentFactAdmin(admin.ModelAdmin):
+    list_display = [
+        "semester",
+        "school",
+        "year_level",
+        "payment_method",
+        "status",
+        "count",
+        "amount",
+    ]
+    list_filter = ["payment_method", "school"]
@@ -2,5 +2,8 @@ from django.apps import AppConfig
 
 
 class PaymentConfig(AppConfig):
-    default_auto_field = 'django.db.models.BigAutoField'
-    name = 'slu.payment'
+    default_auto_field = "django.db.models.BigAutoField"
+    name = "slu.payment"
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,43 @@
+import csv
+
+from django.core.management.base import BaseCommand, CommandError
+
+from slu.framework.utils import LoadScreen
+from slu.payment.models import JournalVoucher
+from slu.payment.services import journal_voucher_process
+
+load_screen = LoadScreen()
+
+
+class Command(BaseCommand):
+    help = "Process an uploaded journal voucher file"
+
+    def add_arguments(self, parser):
+        parser.add_argument("file_id", type=str, help="File ID of the journal voucher")
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only report what each row would change",
+        )
+
+    def handle(self, *args, **options):
+        journal_voucher = JournalVoucher.objects.filter(
+            file_id=options["file_id"]
+        ).first()
+
+        if not journal_voucher:
+            raise CommandError(f"Journal voucher {options['file_id']} not found.")
+
+        results = journal_voucher_process(
+            journal_voucher=journal_voucher, dry_run=options["dry_run"]
+        )
+
+        writer = csv.writer(self.stdout)
+        writer.writerow(["line", "id_number", "amount", "action", "result"])
+        writer.writerows(results)
+
+        success = sum(1 for *_, result in results if result == "success")
+        action = "WOULD PROCESS" if options["dry_run"] else "PROCESSED"
+        load_screen.print_statement(
+            f"\n{action} {success} OF {len(results)} ENTRIES.\n", None
+        )
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from slu.framework.utils import LoadScreen
+from slu.payment.services import payment_facts_rebuild
+
+load_screen = LoadScreen()
+
+
+class Command(BaseCommand):
+    help = "Recount all payments into the payment facts of the dashboards"
+
+    def handle(self, *args, **options):
+        count = payment_facts_rebuild()
+        load_screen.print_statement(
+            f"\nREBUILT PAYMENT FACTS FROM {count} PAYMENTS.\n", None
+        )
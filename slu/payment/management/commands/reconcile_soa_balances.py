@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from slu.framework.utils import LoadScreen
+from slu.payment.services import soa_totals_reconcile
+
+load_screen = LoadScreen()
+
+
+class Command(BaseCommand):
+    help = "Recompute the balance, credits and paid totals of all SOAs"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only report the SOAs whose totals drifted",
+        )
+
+    def handle(self, *args, **options):
+        drifted = soa_totals_reconcile(dry_run=options["dry_run"])
+
+        for soa in drifted:
+            self.stdout.write(
+                f"SOA {soa['id']}: "
+                f"{soa['balance'] - soa['credits']} -> {soa['actual_total']}, "
+                f"paid {soa['paid_negative_total']} -> {soa['actual_negative_total']}"
+            )
+
+        action = "FOUND" if options["dry_run"] else "RECONCILED"
+        load_screen.print_statement(
+            f"\n{action} {len(drifted)} SOAS WITH DRIFTED TOTALS.\n", None
+        )
@@ -0,0 +1,20 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from kombu import Connection
+
+from slu.framework.events import EventConsumer
+from slu.payment import services
+
+
+class Command(BaseCommand):
+    help = "Run payment service consumer"
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"[{timezone.now()}] - payment service consumer starting")
+
+        with Connection(settings.EVENT_BROKER_URL) as conn:
+            consumer = EventConsumer(
+                service_name="payment", services=services, connection=conn
+            )
+            consumer.run()
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.14 on 2022-11-10 03:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payment', '0037_paymenttransaction_error_message'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='statementofaccount',
+            name='fingerprint',
+            field=models.CharField(blank=True, help_text='Hash of the computed lines used to skip unchanged regenerations', max_length=64),
+        ),
+    ]
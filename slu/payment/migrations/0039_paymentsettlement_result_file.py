@@ -0,0 +1,19 @@
+# Generated by Django 3.2.14 on 2026-10-18 07:42
+
+from django.db import migrations, models
+import slu.payment.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payment', '0038_statementofaccount_fingerprint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='paymentsettlement',
+            name='result_file',
+            field=models.FileField(blank=True, help_text='Per-row report of the settlement results', upload_to=slu.payment.models.payment_settlement_result_file_path),
+        ),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 3.2.14 on 2026-10-18 07:50
+
+from django.db import migrations, models
+from django.db.models import Case, DecimalField, F, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce, Greatest
+
+
+def statementofaccount_totals_populate(apps, schema_editor):
+    StatementOfAccount = apps.get_model('payment', 'StatementOfAccount')
+    AccountTransaction = apps.get_model('payment', 'AccountTransaction')
+
+    def transactions_sum(**filters):
+        transactions = (
+            AccountTransaction.objects.filter(soa=OuterRef('pk'), **filters)
+            .order_by()
+            .values('soa')
+            .annotate(total=Sum('amount'))
+            .values('total')
+        )
+        return Coalesce(
+            Subquery(transactions, output_field=DecimalField(max_digits=9, decimal_places=2)),
+            0,
+        )
+
+    StatementOfAccount.objects.update(
+        balance=transactions_sum(),
+        paid_negative_total=transactions_sum(amount__lt=0),
+    )
+    # NOTE: The balance holds the signed total until split into credits
+    StatementOfAccount.objects.update(
+        credits=Greatest(-F('balance'), 0),
+        has_remaining_balance=Case(When(balance__gt=0, then=Value(True)), default=Value(False)),
+    )
+    StatementOfAccount.objects.update(balance=Greatest(F('balance'), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payment', '0039_paymentsettlement_result_file'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='statementofaccount',
+            name='balance',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=9),
+        ),
+        migrations.AddField(
+            model_name='statementofaccount',
+            name='credits',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=9),
+        ),
+        migrations.AddField(
+            model_name='statementofaccount',
+            name='paid_negative_total',
+            field=models.DecimalField(decimal_places=2, default=0, help_text='Sum of the negative account transactions', max_digits=9),
+        ),
+        migrations.RunPython(
+            statementofaccount_totals_populate, reverse_code=migrations.RunPython.noop
+        ),
+    ]
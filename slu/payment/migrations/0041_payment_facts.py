@@ -0,0 +1,47 @@
+# Generated by Django 3.2.14 on 2026-10-18 07:57
+
+from django.db import migrations, models
+import django.db.models.deletion
+import slu.framework.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core_accounts', '0020_alter_module_category'),
+        ('payment', '0040_statementofaccount_totals'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='paymenttransaction',
+            name='fact_amount',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=9, null=True),
+        ),
+        migrations.AddField(
+            model_name='paymenttransaction',
+            name='fact_status',
+            field=models.CharField(blank=True, max_length=2),
+        ),
+        migrations.CreateModel(
+            name='PaymentFact',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('is_active', models.BooleanField(default=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('updated_at', models.DateTimeField(auto_now=True, db_index=True)),
+                ('year_level', models.IntegerField()),
+                ('payment_method', slu.framework.models.TextChoiceField(choices=[('DP', 'Dragonpay'), ('B', 'Bukas'), ('OTC', 'Bank'), ('C', 'School Cashier')], help_text='```json\n{\n    "DP": "Dragonpay",\n    "B": "Bukas",\n    "OTC": "Bank",\n    "C": "School Cashier"\n}\n```', max_length=4)),
+                ('status', models.CharField(max_length=2)),
+                ('count', models.IntegerField(default=0)),
+                ('amount', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('school', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core_accounts.school')),
+                ('semester', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core_accounts.semester')),
+            ],
+            bases=(slu.framework.models.BaseModelMixin, models.Model),
+        ),
+        migrations.AddConstraint(
+            model_name='paymentfact',
+            constraint=models.UniqueConstraint(fields=('semester', 'school', 'year_level', 'payment_method', 'status'), name='payment_fact_unique'),
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 3.2.14 on 2026-10-18 08:48
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+import django.db.models.deletion
+
+
+def paymenttransaction_fact_group_populate(apps, schema_editor):
+    PaymentTransaction = apps.get_model('payment', 'PaymentTransaction')
+    StatementOfAccount = apps.get_model('payment', 'StatementOfAccount')
+    soas = StatementOfAccount.objects.filter(id=OuterRef('soa_id'))
+
+    # NOTE: The group payments were counted in is not recorded, assume their current one
+    PaymentTransaction.objects.exclude(fact_status='').update(
+        fact_semester=Subquery(soas.values('enrollment__semester_id')[:1]),
+        fact_school=Subquery(soas.values('enrollment__student__course__school_id')[:1]),
+        fact_year_level=Subquery(soas.values('enrollment__year_level')[:1]),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core_accounts', '0020_alter_module_category'),
+        ('payment', '0041_payment_facts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='paymenttransaction',
+            name='fact_school',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='core_accounts.school'),
+        ),
+        migrations.AddField(
+            model_name='paymenttransaction',
+            name='fact_semester',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='core_accounts.semester'),
+        ),
+        migrations.AddField(
+            model_name='paymenttransaction',
+            name='fact_year_level',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.RunPython(
+            paymenttransaction_fact_group_populate, reverse_code=migrations.RunPython.noop
+        ),
+    ]
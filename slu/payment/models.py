@@ -8,7 +8,7 @@ from django.contrib.contenttypes.models import ContentType
 from django.db import models
 from hashids import Hashids
 
-from slu.core.accounts.models import School
+from slu.core.accounts.models import School, Semester
 from slu.core.students.models import Enrollment, Student
 from slu.framework.models import (
     BaseModel,
@@ -45,10 +45,43 @@ class StatementOfAccount(BaseModel):
     min_amount = models.DecimalField(max_digits=9, decimal_places=2)
     min_amount_due_date = models.DateTimeField()
     has_remaining_balance = models.BooleanField(default=True)
+    fingerprint = models.CharField(
+        max_length=64,
+        blank=True,
+        help_text="Hash of the computed lines used to skip unchanged regenerations",
+    )
+
+    # NOTE: Maintained from the account transactions by `soa_totals_update`
+    balance = models.DecimalField(max_digits=9, decimal_places=2, default=0)
+    credits = models.DecimalField(max_digits=9, decimal_places=2, default=0)
+    paid_negative_total = models.DecimalField(
+        max_digits=9,
+        decimal_places=2,
+        default=0,
+        help_text="Sum of the negative account transactions",
+    )
+
+    TOTAL_FIELDS = [
+        "balance",
+        "credits",
+        "paid_negative_total",
+        "has_remaining_balance",
+    ]
 
     def __str__(self):
         return f"{self.user} - {self.total_amount}"
 
+    def save(self, *args, **kwargs):
+        # NOTE: Never write back totals that may be stale on this instance
+        if not self._state.adding and kwargs.get("update_fields") is None:
+            kwargs["update_fields"] = [
+                field.name
+                for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.TOTAL_FIELDS
+            ]
+
+        return super().save(*args, **kwargs)
+
     def get_school(self):
         return self.enrollment.student.course.school
 
@@ -145,9 +178,47 @@ class PaymentTransaction(PolymorphicBaseModel):
     remarks = models.TextField(blank=True)
     error_message = models.TextField(blank=True)
 
+    # NOTE: Status, amount and group last counted in the `PaymentFact` rollup
+    fact_status = models.CharField(max_length=2, blank=True)
+    fact_amount = models.DecimalField(
+        max_digits=9, decimal_places=2, blank=True, null=True
+    )
+    fact_semester = models.ForeignKey(
+        Semester, on_delete=models.SET_NULL, blank=True, null=True, related_name="+"
+    )
+    fact_school = models.ForeignKey(
+        School, on_delete=models.SET_NULL, blank=True, null=True, related_name="+"
+    )
+    fact_year_level = models.IntegerField(blank=True, null=True)
+
+    PAYMENT_METHOD = None
+    FACT_FIELDS = [
+        "fact_status",
+        "fact_amount",
+        "fact_semester",
+        "fact_school",
+        "fact_year_level",
+    ]
+
+    # NOTE: Statuses of the child payments counted by `soa_payment_totals_get`
+    PAID_STATUSES = []
+    SETTLED_STATUSES = []
+    PENDING_STATUSES = []
+
     def __str__(self):
         return f"Payment: {self.soa}"
 
+    def save(self, *args, **kwargs):
+        # NOTE: Never write back a counted state that may be stale on this instance
+        if not self._state.adding and kwargs.get("update_fields") is None:
+            kwargs["update_fields"] = [
+                field.name
+                for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.FACT_FIELDS
+            ]
+
+        return super().save(*args, **kwargs)
+
     @property
     def hashed_id(self):
         # TODO: remove deprecated field. use payment_id directly.
@@ -184,6 +255,11 @@ class DragonpayTransaction(PaymentTransaction):
         SUCCESS = "S", "Success"
         SETTLED = "ST", "Settled"
 
+    PAYMENT_METHOD = PaymentMethods.DRAGONPAY
+    PAID_STATUSES = [Statuses.SUCCESS]
+    SETTLED_STATUSES = [Statuses.SETTLED]
+    PENDING_STATUSES = [Statuses.PENDING]
+
     channel = models.ForeignKey("DragonpayChannel", on_delete=models.PROTECT)
     status = TextChoiceField(
         max_length=2, choices_cls=Statuses, default=Statuses.PENDING
@@ -217,10 +293,10 @@ class DragonpayTransaction(PaymentTransaction):
         return PaymentMethods.DRAGONPAY.label
 
     def is_successful(self):
-        return self.status == self.Statuses.SUCCESS
+        return self.status in self.PAID_STATUSES
 
     def is_settled(self):
-        return self.status == self.Statuses.SETTLED
+        return self.status in self.SETTLED_STATUSES
 
 
 class DragonpayChannel(SoftDeleteModel):
@@ -257,6 +333,11 @@ class BukasTransaction(PaymentTransaction):
         FOR_FUNDING = "FF", "For Funding"
         DISBURSED = "D", "Disbursed"
 
+    PAYMENT_METHOD = PaymentMethods.BUKAS
+    PAID_STATUSES = [Statuses.FOR_FUNDING]
+    SETTLED_STATUSES = [Statuses.FOR_FUNDING]
+    PENDING_STATUSES = [Statuses.PENDING]
+
     transaction_id = models.CharField(
         max_length=255, db_index=True, blank=True, null=True
     )
@@ -277,10 +358,10 @@ class BukasTransaction(PaymentTransaction):
         return PaymentMethods.BUKAS.label
 
     def is_successful(self):
-        return self.status == self.Statuses.FOR_FUNDING
+        return self.status in self.PAID_STATUSES
 
     def is_settled(self):
-        return self.status == self.Statuses.FOR_FUNDING
+        return self.status in self.SETTLED_STATUSES
 
 
 class OverTheCounterTransaction(PaymentTransaction):
@@ -296,6 +377,11 @@ class OverTheCounterTransaction(PaymentTransaction):
         MBTC = "MBTC", "Metrobank"
         LBP = "LBP", "Land Bank of the Philippines"
 
+    PAYMENT_METHOD = PaymentMethods.OTC
+    PAID_STATUSES = [Statuses.SUCCESS]
+    SETTLED_STATUSES = [Statuses.SETTLED]
+    PENDING_STATUSES = [Statuses.PENDING]
+
     bank = TextChoiceField(max_length=12, choices_cls=Banks)
     amount = models.DecimalField(max_digits=9, decimal_places=2, blank=True, null=True)
     status = TextChoiceField(
@@ -311,10 +397,10 @@ class OverTheCounterTransaction(PaymentTransaction):
         return PaymentMethods.OTC.label
 
     def is_successful(self):
-        return self.status == self.Statuses.SUCCESS
+        return self.status in self.PAID_STATUSES
 
     def is_settled(self):
-        return self.status == self.Statuses.SETTLED
+        return self.status in self.SETTLED_STATUSES
 
     def fail(self):
         self.status = self.Statuses.FAILED
@@ -330,6 +416,10 @@ class CashierTransaction(PaymentTransaction):
 
     FAILED_STATUSES = [Statuses.FAILED, Statuses.VOIDED]
     SUCCESS_STATUSES = [Statuses.PAID, Statuses.SETTLED]
+    PAYMENT_METHOD = PaymentMethods.CASHIER
+    PAID_STATUSES = [Statuses.PAID]
+    SETTLED_STATUSES = [Statuses.SETTLED]
+    PENDING_STATUSES = [Statuses.PENDING]
 
     amount = models.DecimalField(max_digits=9, decimal_places=2, blank=True, null=True)
     status = TextChoiceField(
@@ -350,10 +440,10 @@ class CashierTransaction(PaymentTransaction):
         return PaymentMethods.CASHIER.label
 
     def is_successful(self):
-        return self.status == self.Statuses.PAID
+        return self.status in self.PAID_STATUSES
 
     def is_settled(self):
-        return self.status == self.Statuses.SETTLED
+        return self.status in self.SETTLED_STATUSES
 
     def fail(self):
         self.status = self.Statuses.FAILED
@@ -365,6 +455,11 @@ def payment_settlement_file_path(instance, filename):
     return f"settlements/{file_name}.{file_ext}"
 
 
+def payment_settlement_result_file_path(instance, filename):
+    file_name = str(uuid.uuid4()).replace("-", "")
+    return f"settlements/results/{file_name}.csv"
+
+
 class PaymentSettlement(BaseModel):
     class Statuses(models.TextChoices):
         PENDING = "P", "Pending"
@@ -396,6 +491,11 @@ class PaymentSettlement(BaseModel):
     )
     invalid = models.IntegerField(default=0, help_text="Transactions not found")
     total = models.IntegerField(default=0)
+    result_file = models.FileField(
+        upload_to=payment_settlement_result_file_path,
+        blank=True,
+        help_text="Per-row report of the settlement results",
+    )
 
     def __str__(self):
         return f"Payment Settlement {self.settlement_id}"
@@ -446,3 +546,28 @@ class JournalVoucher(BaseModel):
     def generate_id(self):
         self.file_id = self.HASHIDS.encode(self.id)
         self.save()
+
+
+class PaymentFact(BaseModel):
+    """Payment counts and amounts per semester, school, year level, payment
+    method and status, maintained by `payment_facts_sync`"""
+
+    semester = models.ForeignKey(Semester, on_delete=models.CASCADE)
+    school = models.ForeignKey(School, on_delete=models.CASCADE)
+    year_level = models.IntegerField()
+    payment_method = TextChoiceField(max_length=4, choices_cls=PaymentMethods)
+    status = models.CharField(max_length=2)
+
+    count = models.IntegerField(default=0)
+    amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["semester", "school", "year_level", "payment_method", "status"],
+                name="payment_fact_unique",
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.semester} - {self.school} - {self.payment_method}"
@@ -3,7 +3,8 @@ from pickle import TRUE
 from random import randint
 
 from django.contrib.auth import get_user_model
-from django.db.models import Sum
+from django.db.models import Case, Count, DecimalField, F, QuerySet, Sum, When
+from django.db.models.functions import Coalesce
 from django.utils import timezone
 from rest_framework import exceptions
 
@@ -12,13 +13,17 @@ from slu.core.students.selectors import (
     enrollment_get_for_payment,
     enrollment_get_latest,
 )
+from slu.framework.cache import reference_cached
 
 from .models import (
     BukasTransaction,
     CashierTransaction,
     DragonpayChannel,
+    DragonpayKey,
     DragonpayTransaction,
     OverTheCounterTransaction,
+    PaymentFact,
+    PaymentMethods,
     PaymentTransaction,
     StatementOfAccount,
 )
@@ -60,31 +65,80 @@ def soa_get_latest(*, user: User, raise_exception: bool = False):
     return soa
 
 
-def soa_get_paid_amount(*, soa: StatementOfAccount) -> Decimal:
-    total = Decimal(0)
+PAYMENT_MODELS = [
+    DragonpayTransaction,
+    BukasTransaction,
+    OverTheCounterTransaction,
+    CashierTransaction,
+]
+PAYMENT_TOTALS = {
+    "paid": ["PAID_STATUSES"],
+    "settled": ["SETTLED_STATUSES"],
+    "received": ["PAID_STATUSES", "SETTLED_STATUSES"],
+    "pending": ["PENDING_STATUSES"],
+}
+
+
+def _payment_total(status_attrs: list[str]):
+    """Sum the amounts of the child payments with one of the statuses of
+    `status_attrs`, joined from the base table"""
+    conditions = []
+
+    for model in PAYMENT_MODELS:
+        name = model._meta.model_name
+        statuses = {
+            status
+            for status_attr in status_attrs
+            for status in getattr(model, status_attr)
+        }
+        conditions.append(
+            When(**{f"{name}__status__in": statuses}, then=F(f"{name}__amount"))
+        )
 
-    for payment in soa.payments.all():
-        if payment.is_successful():
-            total += payment.amount or Decimal(0)
+    return Coalesce(
+        Sum(
+            Case(*conditions, output_field=DecimalField(max_digits=9, decimal_places=2))
+        ),
+        Decimal(0),
+    )
 
-    return total
 
+def soa_payment_totals_get(*, soa_ids: list[int]) -> dict[int, dict[str, Decimal]]:
+    """
+    Return the `paid`, `settled`, `received` (paid or settled) and `pending`
+    payment totals of the SOAs, keyed by SOA id, with one conditional-aggregate
+    query over the payments base table. SOAs without payments are omitted.
+    """
+    totals = (
+        PaymentTransaction.objects.non_polymorphic()
+        .filter(soa_id__in=soa_ids)
+        .order_by()
+        .values("soa_id")
+        .annotate(
+            **{
+                name: _payment_total(status_attrs)
+                for name, status_attrs in PAYMENT_TOTALS.items()
+            }
+        )
+    )
+    return {total.pop("soa_id"): total for total in totals}
 
-def soa_get_settled_amount(*, soa: StatementOfAccount) -> Decimal:
-    total = Decimal(0)
 
-    for payment in soa.payments.all():
-        if payment.is_settled():
-            total += payment.amount or Decimal(0)
+def soa_get_payment_totals(*, soa: StatementOfAccount) -> dict[str, Decimal]:
+    totals = soa_payment_totals_get(soa_ids=[soa.id])
+    return totals.get(soa.id, {name: Decimal(0) for name in PAYMENT_TOTALS})
 
-    return total
 
+def soa_get_paid_amount(*, soa: StatementOfAccount) -> Decimal:
+    return soa_get_payment_totals(soa=soa)["paid"]
 
-def soa_get_min_amount_due(*, soa: StatementOfAccount) -> Decimal:
-    result = soa.transactions.filter(amount__lt=0).aggregate(sum=Sum("amount"))
-    paid = abs(result.get("sum") or Decimal(0))
 
-    amount_due = soa.min_amount - paid
+def soa_get_settled_amount(*, soa: StatementOfAccount) -> Decimal:
+    return soa_get_payment_totals(soa=soa)["settled"]
+
+
+def soa_get_min_amount_due(*, soa: StatementOfAccount) -> Decimal:
+    amount_due = soa.min_amount - abs(soa.paid_negative_total)
 
     if amount_due > 0:
         return amount_due
@@ -93,34 +147,22 @@ def soa_get_min_amount_due(*, soa: StatementOfAccount) -> Decimal:
 
 
 def soa_get_remaining_balance(*, soa: StatementOfAccount) -> Decimal:
-    result = soa.transactions.aggregate(sum=Sum("amount"))
-    balance = result.get("sum") or Decimal(0)
-    soa.has_remaining_balance = False
-
-    if balance >= 0:
-        if balance > 0:
-            soa.has_remaining_balance = True
-            soa.save()
-
-        return balance
-
-    return Decimal(0)
+    return soa.balance
 
 
 def soa_get_available_credits(*, soa: StatementOfAccount) -> Decimal:
-    result = soa.transactions.aggregate(sum=Sum("amount"))
-    balance = result.get("sum") or Decimal(0)
+    return soa.credits
 
-    if balance < 0:
-        return abs(balance)
 
-    return Decimal(0)
+@reference_cached(DragonpayChannel)
+def _dragonpay_channel_get(*, channel_id: int) -> DragonpayChannel:
+    return DragonpayChannel.objects.filter(id=channel_id).first()
 
 
 def dragonpay_channel_get(
     *, channel_id: int, raise_exception: bool = False
 ) -> DragonpayChannel:
-    obj = DragonpayChannel.objects.filter(id=channel_id).first()
+    obj = _dragonpay_channel_get(channel_id=channel_id)
 
     if not obj and raise_exception:
         raise exceptions.NotFound("No enrollment for payment.")
@@ -128,6 +170,11 @@ def dragonpay_channel_get(
     return obj
 
 
+@reference_cached(DragonpayKey)
+def dragonpay_key_get(*, school_id: int) -> DragonpayKey:
+    return DragonpayKey.objects.filter(school_id=school_id).first()
+
+
 def transaction_get_from_hash(
     *, hashed_id: str, raise_exception: bool = False, lock: bool = False
 ) -> PaymentTransaction:
@@ -313,90 +360,77 @@ def journal_voucher_test_csv_generate() -> list:
     return rows
 
 
-def bukas_transaction_total_revenue_get(
-    schools: list[School],
-    semester: Semester,
-    year_level: int = None,
-):
-    bukas_transactions = BukasTransaction.objects.filter(
-        soa__enrollment__semester=semester,
-        soa__enrollment__student__course__school__in=schools,
-    )
+PAYMENT_SUMMARY_METHODS = {
+    PaymentMethods.BUKAS: "bukas",
+    PaymentMethods.DRAGONPAY: "dragonpay",
+    PaymentMethods.CASHIER: "cashier",
+    PaymentMethods.OTC: "otc",
+}
 
-    # TODO: Custom filterclass for year_level
-    if year_level and year_level.isnumeric():
-        bukas_transactions = bukas_transactions.filter(
-            soa__enrollment__year_level=year_level
-        )
-    bukas_transaction_total = bukas_transactions.aggregate(Sum("amount")).get(
-        "amount__sum"
-    )
 
-    return bukas_transaction_total or 0
-
-
-def dragonpay_transaction_total_revenue_get(
-    schools: list[School],
-    semester: Semester,
-    year_level: int = None,
-):
-    dragonpay_transactions = DragonpayTransaction.objects.filter(
-        soa__enrollment__semester=semester,
-        soa__enrollment__student__course__school__in=schools,
-    )
+def payment_facts_get(*, year_level: int = None, **filters) -> QuerySet[PaymentFact]:
+    facts = PaymentFact.objects.filter(**filters)
 
     # TODO: Custom filterclass for year_level
-    if year_level and year_level.isnumeric():
-        dragonpay_transactions = dragonpay_transactions.filter(
-            soa__enrollment__year_level=year_level
-        )
-    dragonpay_transaction_total = dragonpay_transactions.aggregate(Sum("amount")).get(
-        "amount__sum"
+    if year_level and str(year_level).isnumeric():
+        facts = facts.filter(year_level=year_level)
+
+    return facts
+
+
+def payment_fact_totals_get(
+    *, group_by: list[str], year_level: int = None, **filters
+) -> dict[tuple, dict]:
+    """Return the payment `count` and `amount` of the payment facts matching
+    the filters, summed per the `group_by` fields and keyed by their values"""
+    rows = (
+        payment_facts_get(year_level=year_level, **filters)
+        .order_by()
+        .values(*group_by)
+        .annotate(total_count=Sum("count"), total_amount=Sum("amount"))
     )
+    return {
+        tuple(row[field] for field in group_by): {
+            "count": row["total_count"],
+            "amount": row["total_amount"],
+        }
+        for row in rows
+    }
 
-    return dragonpay_transaction_total or 0
-
-
-def cashier_transaction_total_revenue_get(
-    schools: list[School],
-    semester: Semester,
-    year_level: int = None,
-):
-    cashier_transactions = CashierTransaction.objects.filter(
-        soa__enrollment__semester=semester,
-        soa__enrollment__student__course__school__in=schools,
-    )
 
-    # TODO: Custom filterclass for year_level
-    if year_level and year_level.isnumeric():
-        cashier_transactions = cashier_transactions.filter(
-            soa__enrollment__year_level=year_level
-        )
-    cashier_transaction_total = cashier_transactions.aggregate(Sum("amount")).get(
-        "amount__sum"
+def payment_summary_get(*, semester: Semester, year_level: int = None) -> list:
+    """Return the payment revenue and count of a semester grouped by payment
+    method and school, read from the payment facts"""
+    totals = payment_fact_totals_get(
+        group_by=["payment_method", "school"],
+        year_level=year_level,
+        semester=semester,
     )
+    return [
+        {
+            "method": PAYMENT_SUMMARY_METHODS[payment_method],
+            "school": school,
+            "total": total["amount"],
+            "count": total["count"],
+        }
+        for (payment_method, school), total in totals.items()
+    ]
 
-    return cashier_transaction_total or 0
 
-
-def otc_transaction_total_revenue_get(
-    schools: list[School],
-    semester: Semester,
-    year_level: int = None,
-):
-    otc_transactions = OverTheCounterTransaction.objects.filter(
-        soa__enrollment__semester=semester,
-        soa__enrollment__student__course__school__in=schools,
-    )
+def soa_balance_counts_get(*, year_level: int = None) -> dict[tuple, int]:
+    """Return the number of SOAs per `(school id, has remaining balance)`"""
+    soas = StatementOfAccount.objects.all()
 
     # TODO: Custom filterclass for year_level
-    if year_level and year_level.isnumeric():
-        otc_transactions = otc_transactions.filter(
-            soa__enrollment__year_level=year_level
-        )
-    otc_transaction_total = otc_transactions.aggregate(Sum("amount")).get("amount__sum")
+    if year_level and str(year_level).isnumeric():
+        soas = soas.filter(enrollment__year_level=year_level)
 
-    return otc_transaction_total or 0
+    rows = (
+        soas.order_by()
+        .values_list("enrollment__student__course__school", "has_remaining_balance")
+        .annotate(count=Count("id"))
+    )
+    return {(school, has_balance): count for school, has_balance, count in rows}
 
 
 def total_revenue_get(
@@ -404,124 +438,24 @@ def total_revenue_get(
     semester: Semester,
     year_level: int = None,
 ):
-    bukas_total = bukas_transaction_total_revenue_get(
-        schools=schools, semester=semester, year_level=year_level
-    )
-    dragonpay_total = dragonpay_transaction_total_revenue_get(
-        schools=schools, semester=semester, year_level=year_level
-    )
-    cashier_total = cashier_transaction_total_revenue_get(
-        schools=schools, semester=semester, year_level=year_level
-    )
-    otc_total = otc_transaction_total_revenue_get(
-        schools=schools, semester=semester, year_level=year_level
-    )
-
-    total_revenue = bukas_total + dragonpay_total + cashier_total + otc_total
-
-    return total_revenue
-
-
-def otc_transaction_count_get(
-    semester: Semester,
-    year_level: int = None,
-):
-    otc_transactions = OverTheCounterTransaction.objects.filter(
-        soa__enrollment__semester=semester,
-    )
-
-    # TODO: Custom filterclass for year_level
-    if year_level and year_level.isnumeric():
-        otc_transactions = otc_transactions.filter(
-            soa__enrollment__year_level=year_level
-        )
-
-    return otc_transactions.count()
-
-
-def cashier_transaction_count_get(
-    semester: Semester,
-    year_level: int = None,
-):
-    cashier_transactions = CashierTransaction.objects.filter(
-        soa__enrollment__semester=semester,
-    )
-
-    # TODO: Custom filterclass for year_level
-    if year_level and year_level.isnumeric():
-        cashier_transactions = cashier_transactions.filter(
-            soa__enrollment__year_level=year_level
-        )
-
-    return cashier_transactions.count()
-
-
-def dragonpay_transaction_count_get(
-    semester: Semester,
-    year_level: int = None,
-):
-    dragonpay_transactions = DragonpayTransaction.objects.filter(
-        soa__enrollment__semester=semester,
-    )
-
-    # TODO: Custom filterclass for year_level
-    if year_level and year_level.isnumeric():
-        dragonpay_transactions = dragonpay_transactions.filter(
-            soa__enrollment__year_level=year_level
-        )
-
-    return dragonpay_transactions.count()
-
-
-def bukas_transaction_count_get(
-    semester: Semester,
-    year_level: int = None,
-):
-    bukas_transactions = BukasTransaction.objects.filter(
-        soa__enrollment__semester=semester,
-    )
-
-    # TODO: Custom filterclass for year_level
-    if year_level and year_level.isnumeric():
-        bukas_transactions = bukas_transactions.filter(
-            soa__enrollment__year_level=year_level
-        )
+    school_ids = {school.id for school in schools}
+    summary = payment_summary_get(semester=semester, year_level=year_level)
 
-    return bukas_transactions.count()
+    return sum(row["total"] for row in summary if row["school"] in school_ids)
 
 
 def payment_method_percentage_get(
     semester: Semester,
     year_level: int = None,
 ):
+    counts = {method: 0 for method in PAYMENT_SUMMARY_METHODS.values()}
 
-    bukas_count = bukas_transaction_count_get(semester=semester, year_level=year_level)
-    dragonpay_count = dragonpay_transaction_count_get(
-        semester=semester, year_level=year_level
-    )
-    cashier_count = cashier_transaction_count_get(
-        semester=semester, year_level=year_level
-    )
-    otc_count = otc_transaction_count_get(semester=semester, year_level=year_level)
-
-    total_payment = bukas_count + dragonpay_count + cashier_count + otc_count
+    for row in payment_summary_get(semester=semester, year_level=year_level):
+        counts[row["method"]] += row["count"]
 
-    bukas_percentage = (
-        (bukas_count / total_payment) * 100 if bukas_count != 0 else bukas_count
-    )
-    dragonpay_percentage = (
-        (dragonpay_count / total_payment) * 100
-        if dragonpay_count != 0
-        else dragonpay_count
-    )
-    cashier_percentage = (
-        (cashier_count / total_payment) * 100 if cashier_count != 0 else cashier_count
-    )
-    otc_percentage = (otc_count / total_payment) * 100 if otc_count != 0 else otc_count
+    total_payment = sum(counts.values())
 
     return {
-        "bukas": round(bukas_percentage, 2),
-        "dragonpay": round(dragonpay_percentage, 2),
-        "cashier": round(cashier_percentage, 2),
-        "otc": round(otc_percentage, 2),
+        method: round((count / total_payment) * 100 if count != 0 else count, 2)
+        for method, count in counts.items()
     }
@@ -1,12 +1,13 @@
+from decimal import Decimal
+
 from django.contrib.auth import get_user_model
+from django.db.models import Manager
 from rest_framework import serializers
 from rest_polymorphic.serializers import PolymorphicSerializer
 
 from slu.core.accounts.models import AcademicYear, School
-from slu.core.accounts.selectors import current_semester_get
 from slu.core.students.models import Student
 from slu.framework.serializers import ChoiceField, inline_serializer_class
-from django.db.models import Sum
 from slu.payment import selectors
 
 from . import models
@@ -18,9 +19,24 @@ class PaymentCreateSerializer(serializers.Serializer):
     payment_method = ChoiceField(choices_cls=models.PaymentMethods)
 
 
+class DragonpayChannelField(serializers.PrimaryKeyRelatedField):
+    """Resolves active channels through the reference cache"""
+
+    def to_internal_value(self, data):
+        try:
+            channel = selectors.dragonpay_channel_get(channel_id=int(data))
+        except (TypeError, ValueError):
+            self.fail("incorrect_type", data_type=type(data).__name__)
+
+        if not channel or not channel.is_active:
+            self.fail("does_not_exist", pk_value=data)
+
+        return channel
+
+
 class DragonpayPaymentCreateSerializer(PaymentCreateSerializer):
     amount = serializers.DecimalField(max_digits=9, decimal_places=2)
-    channel = serializers.PrimaryKeyRelatedField(
+    channel = DragonpayChannelField(
         queryset=models.DragonpayChannel.objects.filter(is_active=True), write_only=True
     )
 
@@ -184,9 +200,20 @@ class AccountTransactionSerializer(serializers.ModelSerializer):
         fields = ("description", "amount", "created_at")
 
 
+class StatementOfAccountListSerializer(serializers.ListSerializer):
+    def to_representation(self, data):
+        data = list(data.all() if isinstance(data, Manager) else data)
+        # NOTE: Totals of the whole page in one query, see `get_payment_totals`
+        self.child.payment_totals = selectors.soa_payment_totals_get(
+            soa_ids=[soa.id for soa in data]
+        )
+        return super().to_representation(data)
+
+
 class StatementOfAccountSerializer(serializers.ModelSerializer):
     lines = RootStatementLineSerializer(many=True)
     payments = serializers.SerializerMethodField()
+    payment_totals = serializers.SerializerMethodField()
     categories = StatementLineCategorySerializer(many=True)
     transactions = AccountTransactionSerializer(many=True)
 
@@ -202,6 +229,7 @@ class StatementOfAccountSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = models.StatementOfAccount
+        list_serializer_class = StatementOfAccountListSerializer
         fields = (
             "id",
             "user",
@@ -214,6 +242,7 @@ class StatementOfAccountSerializer(serializers.ModelSerializer):
             "categories",
             "transactions",
             "payments",
+            "payment_totals",
             "updated_at",
         )
 
@@ -221,6 +250,16 @@ class StatementOfAccountSerializer(serializers.ModelSerializer):
         payments = obj.payments.order_by("-id")
         return PaymentTransactionPolymorphicSerializer(payments, many=True).data
 
+    def get_payment_totals(self, obj):
+        payment_totals = getattr(self, "payment_totals", None)
+
+        if payment_totals is None:
+            return selectors.soa_get_payment_totals(soa=obj)
+
+        return payment_totals.get(
+            obj.id, {name: Decimal(0) for name in selectors.PAYMENT_TOTALS}
+        )
+
 
 class DragonpaySettlementReportSerializer(serializers.Serializer):
     file = serializers.FileField()
@@ -239,6 +278,7 @@ class PaymentSettlementListApiSerializer(serializers.ModelSerializer):
             "skipped",
             "invalid",
             "total",
+            "result_file",
             "created_at",
         )
 
@@ -450,12 +490,39 @@ class CashierTransactionVoidApiSerializer(serializers.Serializer):
     remarks = serializers.CharField(required=False, allow_blank=True)
 
 
-class PaymentCountPerSchoolSerializer(serializers.ModelSerializer):
+class PaymentFactTotalsMixin:
+    """Read the dashboard figures of every row from payment fact totals
+    loaded once per response, see `payment_fact_totals_get`"""
+
+    fact_group_by = []
+
+    def get_fact_filters(self) -> dict:
+        return {}
+
+    def get_fact_total(self, *key, field="count"):
+        totals = self.context.get("payment_fact_totals")
+
+        if totals is None:
+            totals = selectors.payment_fact_totals_get(
+                group_by=self.fact_group_by,
+                year_level=self.context["year_level"],
+                **self.get_fact_filters(),
+            )
+            self.context["payment_fact_totals"] = totals
+
+        return totals.get(key, {}).get(field) or 0
+
+
+class PaymentCountPerSchoolSerializer(
+    PaymentFactTotalsMixin, serializers.ModelSerializer
+):
     bukas_count = serializers.SerializerMethodField()
     dragonpay_count = serializers.SerializerMethodField()
     over_the_counter_count = serializers.SerializerMethodField()
     cashier_count = serializers.SerializerMethodField()
 
+    fact_group_by = ["school", "payment_method"]
+
     class Meta:
         model = School
         fields = (
@@ -467,80 +534,31 @@ class PaymentCountPerSchoolSerializer(serializers.ModelSerializer):
             "cashier_count",
         )
 
-    def get_bukas_count(self, obj) -> int:
-        year_level = self.context["year_level"]
-        semester = current_semester_get()
-
-        bukas_transactions = models.BukasTransaction.objects.filter(
-            soa__enrollment__semester=semester,
-            soa__enrollment__student__course__school=obj,
-        )
-
-        # TODO: Custom filterclass for year_level
-        if year_level and year_level.isnumeric():
-            bukas_transactions = bukas_transactions.filter(
-                soa__enrollment__year_level=year_level
-            )
+    def get_fact_filters(self) -> dict:
+        return {"semester": self.context["semester"]}
 
-        return bukas_transactions.count()
+    def get_bukas_count(self, obj) -> int:
+        return self.get_fact_total(obj.id, models.PaymentMethods.BUKAS)
 
     def get_dragonpay_count(self, obj) -> int:
-        year_level = self.context["year_level"]
-        semester = current_semester_get()
-
-        bukas_transactions = models.DragonpayTransaction.objects.filter(
-            soa__enrollment__semester=semester,
-            soa__enrollment__student__course__school=obj,
-        )
-
-        # TODO: Custom filterclass for year_level
-        if year_level and year_level.isnumeric():
-            bukas_transactions = bukas_transactions.filter(
-                soa__enrollment__year_level=year_level
-            )
-
-        return bukas_transactions.count()
+        return self.get_fact_total(obj.id, models.PaymentMethods.DRAGONPAY)
 
     def get_over_the_counter_count(self, obj) -> int:
-        year_level = self.context["year_level"]
-        semester = current_semester_get()
-
-        bukas_transactions = models.OverTheCounterTransaction.objects.filter(
-            soa__enrollment__semester=semester,
-            soa__enrollment__student__course__school=obj,
-        )
-
-        # TODO: Custom filterclass for year_level
-        if year_level and year_level.isnumeric():
-            bukas_transactions = bukas_transactions.filter(
-                soa__enrollment__year_level=year_level
-            )
-
-        return bukas_transactions.count()
+        return self.get_fact_total(obj.id, models.PaymentMethods.OTC)
 
     def get_cashier_count(self, obj) -> int:
-        year_level = self.context["year_level"]
-        semester = current_semester_get()
-
-        bukas_transactions = models.CashierTransaction.objects.filter(
-            soa__enrollment__semester=semester,
-            soa__enrollment__student__course__school=obj,
-        )
-
-        # TODO: Custom filterclass for year_level
-        if year_level and year_level.isnumeric():
-            bukas_transactions = bukas_transactions.filter(
-                soa__enrollment__year_level=year_level
-            )
-
-        return bukas_transactions.count()
+        return self.get_fact_total(obj.id, models.PaymentMethods.CASHIER)
 
 
-class OverTheCounterStatusPerSchoolSerializer(serializers.ModelSerializer):
+class OverTheCounterStatusPerSchoolSerializer(
+    PaymentFactTotalsMixin, serializers.ModelSerializer
+):
 
     over_the_counter_count = serializers.SerializerMethodField()
     paid_over_the_counter_count = serializers.SerializerMethodField()
 
+    fact_group_by = ["school", "status"]
+
     class Meta:
         model = School
         fields = (
@@ -550,46 +568,22 @@ class OverTheCounterStatusPerSchoolSerializer(serializers.ModelSerializer):
             "paid_over_the_counter_count",
         )
 
-    def get_over_the_counter_count(self, obj) -> int:
-        year_level = self.context["year_level"]
-        semester = current_semester_get()
+    def get_fact_filters(self) -> dict:
+        return {
+            "semester": self.context["semester"],
+            "payment_method": models.PaymentMethods.OTC,
+        }
 
-        over_the_counter_transactions = models.OverTheCounterTransaction.objects.filter(
-            soa__enrollment__semester=semester,
-            soa__enrollment__student__course__school=obj,
-            status=models.OverTheCounterTransaction.Statuses.PENDING,
+    def get_over_the_counter_count(self, obj) -> int:
+        return self.get_fact_total(
+            obj.id, models.OverTheCounterTransaction.Statuses.PENDING
         )
 
-        # TODO: Custom filterclass for year_level
-        if year_level and year_level.isnumeric():
-            over_the_counter_transactions = over_the_counter_transactions.filter(
-                soa__enrollment__year_level=year_level
-            )
-
-        return over_the_counter_transactions.count()
-
     def get_paid_over_the_counter_count(self, obj) -> int:
-        year_level = self.context["year_level"]
-        semester = current_semester_get()
-
-        paid_over_the_counter_transactions = (
-            models.OverTheCounterTransaction.objects.filter(
-                soa__enrollment__semester=semester,
-                soa__enrollment__student__course__school=obj,
-                status=models.OverTheCounterTransaction.Statuses.SETTLED,
-            )
+        return self.get_fact_total(
+            obj.id, models.OverTheCounterTransaction.Statuses.SETTLED
         )
 
-        # TODO: Custom filterclass for year_level
-        if year_level and year_level.isnumeric():
-            paid_over_the_counter_transactions = (
-                paid_over_the_counter_transactions.filter(
-                    soa__enrollment__year_level=year_level
-                )
-            )
-
-        return paid_over_the_counter_transactions.count()
-
 
 class PaymentStatusPerSchoolSerializer(serializers.ModelSerializer):
 
@@ -605,44 +599,35 @@ class PaymentStatusPerSchoolSerializer(serializers.ModelSerializer):
             "fully_paid",
         )
 
-    def get_remaining_balance(self, obj) -> int:
-        year_level = self.context["year_level"]
+    def get_soa_count(self, school, has_remaining_balance: bool) -> int:
+        counts = self.context.get("soa_balance_counts")
 
-        remaining_balance = models.StatementOfAccount.objects.filter(
-            enrollment__student__course__school=obj,
-            has_remaining_balance=True,
-        )
-
-        # TODO: Custom filterclass for year_level
-        if year_level and year_level.isnumeric():
-            remaining_balance = remaining_balance.filter(
-                enrollment__year_level=year_level
+        if counts is None:
+            counts = selectors.soa_balance_counts_get(
+                year_level=self.context["year_level"]
             )
+            self.context["soa_balance_counts"] = counts
 
-        return remaining_balance.count()
-
-    def get_fully_paid(self, obj) -> int:
-        year_level = self.context["year_level"]
-
-        fully_paid = models.StatementOfAccount.objects.filter(
-            enrollment__student__course__school=obj,
-            has_remaining_balance=False,
-        )
+        return counts.get((school.id, has_remaining_balance), 0)
 
-        # TODO: Custom filterclass for year_level
-        if year_level and year_level.isnumeric():
-            fully_paid = fully_paid.filter(enrollment__year_level=year_level)
+    def get_remaining_balance(self, obj) -> int:
+        return self.get_soa_count(obj, has_remaining_balance=True)
 
-        return fully_paid.count()
+    def get_fully_paid(self, obj) -> int:
+        return self.get_soa_count(obj, has_remaining_balance=False)
 
 
-class RevenuePerMethodPerSchoolYearSerializer(serializers.ModelSerializer):
+class RevenuePerMethodPerSchoolYearSerializer(
+    PaymentFactTotalsMixin, serializers.ModelSerializer
+):
 
     bukas_revenue = serializers.SerializerMethodField()
     dragonpay_revenue = serializers.SerializerMethodField()
     cashier_revenue = serializers.SerializerMethodField()
     otc_revenue = serializers.SerializerMethodField()
 
+    fact_group_by = ["semester__academic_year", "payment_method"]
+
     class Meta:
         model = AcademicYear
         fields = (
@@ -655,78 +640,20 @@ class RevenuePerMethodPerSchoolYearSerializer(serializers.ModelSerializer):
         )
 
     def get_bukas_revenue(self, obj):
-        year_level = self.context["year_level"]
-
-        bukas_transactions = models.BukasTransaction.objects.filter(
-            soa__enrollment__semester__academic_year=obj,
-        )
-
-        # TODO: Custom filterclass for year_level
-        if year_level and year_level.isnumeric():
-            bukas_transactions = bukas_transactions.filter(
-                soa__enrollment__year_level=year_level
-            )
-
-        bukas_transactions = bukas_transactions.aggregate(Sum("amount")).get(
-            "amount__sum"
-        )
-
-        return bukas_transactions or 0
+        return self.get_fact_total(obj.id, models.PaymentMethods.BUKAS, field="amount")
 
     def get_dragonpay_revenue(self, obj):
-        year_level = self.context["year_level"]
-
-        dragon_transactions = models.DragonpayTransaction.objects.filter(
-            soa__enrollment__semester__academic_year=obj,
+        return self.get_fact_total(
+            obj.id, models.PaymentMethods.DRAGONPAY, field="amount"
         )
 
-        # TODO: Custom filterclass for year_level
-        if year_level and year_level.isnumeric():
-            dragon_transactions = dragon_transactions.filter(
-                soa__enrollment__year_level=year_level
-            )
-
-        dragon_transactions = dragon_transactions.aggregate(Sum("amount")).get(
-            "amount__sum"
-        )
-
-        return dragon_transactions or 0
-
     def get_cashier_revenue(self, obj):
-        year_level = self.context["year_level"]
-
-        cashier_transactions = models.CashierTransaction.objects.filter(
-            soa__enrollment__semester__academic_year=obj,
+        return self.get_fact_total(
+            obj.id, models.PaymentMethods.CASHIER, field="amount"
         )
 
-        # TODO: Custom filterclass for year_level
-        if year_level and year_level.isnumeric():
-            cashier_transactions = cashier_transactions.filter(
-                soa__enrollment__year_level=year_level
-            )
-
-        cashier_transactions = cashier_transactions.aggregate(Sum("amount")).get(
-            "amount__sum"
-        )
-
-        return cashier_transactions or 0
-
     def get_otc_revenue(self, obj):
-        year_level = self.context["year_level"]
-
-        otc_transactions = models.OverTheCounterTransaction.objects.filter(
-            soa__enrollment__semester__academic_year=obj,
-        )
-
-        # TODO: Custom filterclass for year_level
-        if year_level and year_level.isnumeric():
-            otc_transactions = otc_transactions.filter(
-                soa__enrollment__year_level=year_level
-            )
-
-        otc_transactions = otc_transactions.aggregate(Sum("amount")).get("amount__sum")
-
-        return otc_transactions or 0
+        return self.get_fact_total(obj.id, models.PaymentMethods.OTC, field="amount")
 
 
 class StudentCashierTransactionUpdateApiSerializer(serializers.ModelSerializer):
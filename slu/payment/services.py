@@ -1,4 +1,8 @@
 import csv
+import hashlib
+import io
+import json
+from collections import defaultdict
 from datetime import datetime, timedelta
 from decimal import Decimal
 from typing import Union
@@ -7,19 +11,28 @@ import botocore.exceptions
 import structlog
 from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.contrib.contenttypes.models import ContentType
 from django.core.files import File
+from django.core.files.base import ContentFile
+from django.db import connection
 from django.db import transaction as db_transaction
-from django.db.models import Sum
+from django.db.models import Case, DecimalField, F, Q, Sum, Value, When
+from django.db.models.functions import Coalesce, Greatest
 from django.utils import timezone
 from django.utils.timezone import make_aware
 from rest_framework import exceptions
 from sentry_sdk import capture_exception
 
-from slu.core.cms.models import Discount, Subject
-from slu.core.cms.selectors import laboratory_fee_get
-from slu.core.students.models import Enrollment, EnrollmentEvent, Student
+from slu.core.cms.models import Discount, Fee, LaboratoryFee
+from slu.core.students.models import (
+    Enrollment,
+    EnrollmentDiscount,
+    EnrollmentEvent,
+    Student,
+)
 from slu.core.students.services import enrollment_step_4_payments
-from slu.framework.events import event_publisher
+from slu.framework.events import GenericModelEvent, event_publisher
+from slu.framework.utils import chunked, csv_file_reader
 from slu.payment import tasks
 
 from . import events
@@ -28,17 +41,21 @@ from .models import (
     AccountTransaction,
     BukasTransaction,
     CashierTransaction,
-    DragonpayKey,
     DragonpayTransaction,
     JournalVoucher,
     OverTheCounterTransaction,
+    PaymentFact,
     PaymentMethods,
     PaymentSettlement,
     PaymentTransaction,
+    StatementLine,
+    StatementLineCategory,
     StatementOfAccount,
 )
 from .selectors import (
+    PAYMENT_MODELS,
     cashier_transaction_get_pending,
+    dragonpay_key_get,
     otc_transaction_get_pending,
     soa_get_latest,
 )
@@ -53,7 +70,9 @@ dragonpay_client = DragonpayClient()
 
 def dragonpay_payment_create(*, transaction: DragonpayTransaction):
     amount = f"{transaction.total_amount:.2f}"
-    key = DragonpayKey.objects.filter(school=transaction.get_school()).first()
+    key = dragonpay_key_get(
+        school_id=transaction.soa.enrollment.student.course.school_id
+    )
     url = dragonpay_client.create_payment(
         amount,
         transaction_id=transaction.hashed_id,
@@ -65,7 +84,7 @@ def dragonpay_payment_create(*, transaction: DragonpayTransaction):
 
 
 def dragonpay_transaction_create(*, soa: StatementOfAccount, data: dict):
-    key = DragonpayKey.objects.filter(school=soa.get_school()).first()
+    key = dragonpay_key_get(school_id=soa.enrollment.student.course.school_id)
 
     if not key:
         raise exceptions.ValidationError("No available payment gateway.")
@@ -288,88 +307,185 @@ def payment_settlement_create(
     return settlement
 
 
-def _dragonpay_settlement_process(*, data: dict, jv_number: str = "") -> str:
-    with db_transaction.atomic():
-        transaction = DragonpayTransaction.objects.filter(
-            payment_id=data.get("Merchant Txn Id"),
-            reference_number=data.get("Refno"),
-        ).first()
+SETTLEMENT_RESULT_COLUMNS = ["line", "id", "reference", "result"]
 
-        if not transaction:
-            return "invalid"
 
-        if transaction.status == DragonpayTransaction.Statuses.SETTLED:
-            return "skipped"
+def _settlement_transactions_settle(
+    *,
+    model: type[PaymentTransaction],
+    settled: list[tuple[PaymentTransaction, Decimal]],
+    description: str,
+    jv_number: str,
+    fields: list[str],
+):
+    """Write the ledger entries, enrollment events and statuses of the
+    `(transaction, amount)` pairs settled in a chunk with bulk queries"""
+    transactions = [transaction for transaction, _ in settled]
+    ref_ctype = ContentType.objects.get_for_model(model)
+    existing_entries = set(
+        AccountTransaction.objects.filter(
+            soa_id__in={transaction.soa_id for transaction in transactions},
+            ref_id__in=[transaction.id for transaction in transactions],
+        ).values_list("soa_id", "ref_id")
+    )
+    ledger_entries = AccountTransaction.objects.bulk_create(
+        [
+            AccountTransaction(
+                soa_id=transaction.soa_id,
+                student_id=transaction.soa.enrollment.student_id,
+                amount=amount,
+                description=description,
+                jv_number=jv_number,
+                ref_ctype=ref_ctype,
+                ref_id=transaction.id,
+            )
+            for transaction, amount in settled
+            if (transaction.soa_id, transaction.id) not in existing_entries
+        ]
+    )
+    soa_transactions_totals_update(transactions=ledger_entries)
+
+    enrollment_ids = {transaction.soa.enrollment_id for transaction in transactions}
+    ended_enrollment_ids = set(
+        EnrollmentEvent.objects.filter(
+            enrollment_id__in=enrollment_ids,
+            event=EnrollmentEvent.Events.ENROLLMENT_ENDED,
+        ).values_list("enrollment_id", flat=True)
+    )
+    EnrollmentEvent.objects.bulk_create(
+        [
+            EnrollmentEvent(
+                enrollment_id=enrollment_id,
+                event=EnrollmentEvent.Events.ENROLLMENT_ENDED,
+            )
+            for enrollment_id in enrollment_ids - ended_enrollment_ids
+        ]
+    )
+
+    now = timezone.now()
+
+    for transaction in transactions:
+        transaction.jv_number = jv_number
+        transaction.status = model.Statuses.SETTLED
+        transaction.updated_at = now
+
+    model.objects.bulk_update(
+        transactions, fields=["jv_number", "status", "updated_at", *fields]
+    )
+    event_publisher.generic_many(events.PAYMENT_SETTLED, objects=transactions)
 
-        AccountTransaction.objects.get_or_create(
-            soa=transaction.soa,
-            ref_id=transaction.id,
-            defaults={
-                "student": transaction.soa.enrollment.student,
-                "amount": -transaction.amount,
-                "description": "Dragonpay payment",
-                "jv_number": jv_number,
-                "ref": transaction,
-            },
-        )
+
+def _dragonpay_settlement_chunk_process(
+    *, chunk: list[tuple[int, dict]], jv_number: str, settled_ids: set
+) -> list[list]:
+    keys = [(row.get("Merchant Txn Id"), row.get("Refno")) for _, row in chunk]
+    transactions = {}
+
+    for transaction in (
+        DragonpayTransaction.objects.select_for_update(of=("self",))
+        .select_related("soa__enrollment")
+        .filter(payment_id__in={payment_id for payment_id, _ in keys})
+        .order_by("id")
+    ):
+        # NOTE: The latest transaction wins when a key is shared
+        transactions[
+            (transaction.payment_id, transaction.reference_number)
+        ] = transaction
+
+    results = []
+    settled = []
+
+    for (line, row), key in zip(chunk, keys):
+        transaction = transactions.get(key)
+
+        if not transaction:
+            results.append([line, *key, "invalid"])
+            continue
+
+        if (
+            transaction.status == DragonpayTransaction.Statuses.SETTLED
+            or transaction.id in settled_ids
+        ):
+            results.append([line, *key, "skipped"])
+            continue
 
         try:
-            settlement_date = make_aware(
-                datetime.strptime(data["Settle Date"], "%m/%d/%y %I:%M %p")
+            transaction.settlement_date = make_aware(
+                datetime.strptime(row.get("Settle Date", ""), "%m/%d/%y %I:%M %p")
             )
         except ValueError:
-            settlement_date = timezone.now()
+            transaction.settlement_date = timezone.now()
+
+        settled_ids.add(transaction.id)
+        settled.append((transaction, -transaction.amount))
+        results.append([line, *key, "settled"])
+
+    if settled:
+        _settlement_transactions_settle(
+            model=DragonpayTransaction,
+            settled=settled,
+            description="Dragonpay payment",
+            jv_number=jv_number,
+            fields=["settlement_date"],
+        )
 
-        enrollment = transaction.soa.enrollment
-        enrollment.events.get_or_create(event=EnrollmentEvent.Events.ENROLLMENT_ENDED)
+    return results
 
-        transaction.jv_number = jv_number
-        transaction.status = DragonpayTransaction.Statuses.SETTLED
-        transaction.settlement_date = settlement_date
-        transaction.save()
 
-    event_publisher.generic(events.PAYMENT_SETTLED, object=transaction)
-    return "settled"
+def _cashier_settlement_chunk_process(
+    *, chunk: list[tuple[int, dict]], jv_number: str, settled_ids: set
+) -> list[list]:
+    keys = [(row.get("IDNO"), row.get("REFERENCE")) for _, row in chunk]
+    transactions = {}
 
+    for transaction in (
+        CashierTransaction.objects.select_for_update(of=("self",))
+        .select_related("soa__enrollment")
+        .filter(receipt_id__in={receipt_id for _, receipt_id in keys})
+        .annotate(id_number=F("soa__user__student__id_number"))
+        .order_by("id")
+    ):
+        # NOTE: The latest transaction wins when a receipt is reissued
+        transactions[(transaction.id_number, transaction.receipt_id)] = transaction
 
-def _cashier_settlement_process(*, data: dict, jv_number: str = "") -> str:
-    with db_transaction.atomic():
-        student_id = data.get("IDNO")
-        receipt_id = data.get("REFERENCE")
-        amount = data.get("AMOUNT")
+    results = []
+    settled = []
 
-        transaction = CashierTransaction.objects.filter(
-            soa__user__student__id_number=student_id, receipt_id=receipt_id
-        ).first()
+    for (line, row), key in zip(chunk, keys):
+        transaction = transactions.get(key)
 
         if not transaction:
-            return "invalid"
-
-        if transaction.status == CashierTransaction.Statuses.SETTLED:
-            return "skipped"
+            results.append([line, *key, "invalid"])
+            continue
 
-        AccountTransaction.objects.get_or_create(
-            soa=transaction.soa,
-            ref_id=transaction.id,
-            defaults={
-                "student": transaction.soa.enrollment.student,
-                "amount": -abs(Decimal(amount)),
-                "description": "Cashier payment",
-                "jv_number": jv_number,
-                "ref": transaction,
-            },
-        )
+        if (
+            transaction.status == CashierTransaction.Statuses.SETTLED
+            or transaction.id in settled_ids
+        ):
+            results.append([line, *key, "skipped"])
+            continue
 
-        enrollment = transaction.soa.enrollment
-        enrollment.events.get_or_create(event=EnrollmentEvent.Events.ENROLLMENT_ENDED)
+        try:
+            amount = -abs(Decimal(row.get("AMOUNT")))
+        except (TypeError, ArithmeticError):
+            results.append([line, *key, "invalid"])
+            continue
 
-        transaction.jv_number = jv_number
-        transaction.status = CashierTransaction.Statuses.SETTLED
         transaction.settled_at = timezone.now()
-        transaction.save()
+        settled_ids.add(transaction.id)
+        settled.append((transaction, amount))
+        results.append([line, *key, "settled"])
+
+    if settled:
+        _settlement_transactions_settle(
+            model=CashierTransaction,
+            settled=settled,
+            description="Cashier payment",
+            jv_number=jv_number,
+            fields=["settled_at"],
+        )
 
-    event_publisher.generic(events.PAYMENT_SETTLED, object=transaction)
-    return "settled"
+    return results
 
 
 def _payment_settlement_failed(*, payment_settlement: PaymentSettlement, error: str):
@@ -378,13 +494,30 @@ def _payment_settlement_failed(*, payment_settlement: PaymentSettlement, error:
     payment_settlement.save()
 
 
+def _payment_settlement_result_file_save(
+    *, payment_settlement: PaymentSettlement, buffer: io.StringIO
+):
+    payment_settlement.result_file.save(
+        f"{payment_settlement.settlement_id}.csv",
+        ContentFile(buffer.getvalue().encode()),
+        save=False,
+    )
+
+
 def payment_settlement_process(*, payment_settlement: PaymentSettlement):
+    """Reconcile a settlement file in chunks of `SLU_UPLOAD_CHUNK_SIZE` rows.
+
+    Each chunk is matched against the transactions with one query and
+    settled in its own database transaction with bulk writes, and its
+    `PAYMENT_SETTLED` events are published as one batch. The outcome of
+    every row is written to `result_file`.
+    """
     payment_settlement.status = PaymentSettlement.Statuses.PROCESSING
     payment_settlement.save()
 
     settlement_processors = {
-        PaymentMethods.DRAGONPAY: _dragonpay_settlement_process,
-        PaymentMethods.CASHIER: _cashier_settlement_process,
+        PaymentMethods.DRAGONPAY: _dragonpay_settlement_chunk_process,
+        PaymentMethods.CASHIER: _cashier_settlement_chunk_process,
     }
     processor = settlement_processors.get(payment_settlement.payment_method)
 
@@ -401,17 +534,32 @@ def payment_settlement_process(*, payment_settlement: PaymentSettlement):
         "invalid": 0,
         "total": 0,
     }
+    settled_ids = set()
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(SETTLEMENT_RESULT_COLUMNS)
 
     try:
-        file_contents = payment_settlement.file.read()
-        csv_data = file_contents.decode().split("\r\n")
-        reader = csv.DictReader(csv_data)
-
-        for row in reader:
-            result = processor(data=row, jv_number=payment_settlement.jv_number)
-            stats[result] += 1
-            stats["total"] += 1
+        reader = csv_file_reader(payment_settlement.file, reader_cls=csv.DictReader)
+        rows = ((reader.line_num, row) for row in reader)
+
+        for chunk in chunked(rows, settings.SLU_UPLOAD_CHUNK_SIZE):
+            with db_transaction.atomic():
+                results = processor(
+                    chunk=chunk,
+                    jv_number=payment_settlement.jv_number,
+                    settled_ids=settled_ids,
+                )
+
+            for *_, result in results:
+                stats[result] += 1
+                stats["total"] += 1
+
+            writer.writerows(results)
     except (UnicodeDecodeError, botocore.exceptions.ClientError) as error:
+        _payment_settlement_result_file_save(
+            payment_settlement=payment_settlement, buffer=buffer
+        )
         _payment_settlement_failed(
             payment_settlement=payment_settlement,
             error="Error reading settlement file",
@@ -419,6 +567,9 @@ def payment_settlement_process(*, payment_settlement: PaymentSettlement):
         capture_exception(error)
         return
 
+    _payment_settlement_result_file_save(
+        payment_settlement=payment_settlement, buffer=buffer
+    )
     payment_settlement.status = PaymentSettlement.Statuses.COMPLETED
     payment_settlement.settled = stats["settled"]
     payment_settlement.skipped = stats["skipped"]
@@ -440,193 +591,394 @@ def _journal_voucher_failed(*, journal_voucher: JournalVoucher, error: str):
     journal_voucher.save()
 
 
-def _journal_voucher_bank_process(
-    *,
-    student: Student,
-    amount: Decimal,
-    description: str,
-    jv_number: str,
-    bank: OverTheCounterTransaction.Banks,
-):
-    transaction = OverTheCounterTransaction.objects.filter(
-        soa__user__student=student,
-        bank=bank,
-        status=OverTheCounterTransaction.Statuses.PENDING,
-    ).first()
+JOURNAL_VOUCHER_BANKS = [
+    OverTheCounterTransaction.Banks.BDO,
+    OverTheCounterTransaction.Banks.PNB,
+    OverTheCounterTransaction.Banks.MBTC,
+    OverTheCounterTransaction.Banks.LBP,
+]
 
-    if not transaction:
-        soa = soa_get_latest(user=student.user)
-        transaction = OverTheCounterTransaction.objects.create(soa=soa, bank=bank)
-        transaction.generate_id()
 
-    with db_transaction.atomic():
-        transaction.status = OverTheCounterTransaction.Statuses.SETTLED
-        transaction.amount = abs(amount)
-        transaction.jv_number = jv_number
-        transaction.settled_at = timezone.now()
-        transaction.save()
+def _payment_transaction_ids_allocate(count: int) -> list[int]:
+    """Reserve `count` ids from the PaymentTransaction sequence so the hashed
+    payment ids can be set when the transactions are created."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT nextval(pg_get_serial_sequence(%s, 'id')) "
+            "FROM generate_series(1, %s)",
+            [PaymentTransaction._meta.db_table, count],
+        )
+        return [row[0] for row in cursor.fetchall()]
 
-        AccountTransaction.objects.get_or_create(
-            soa=transaction.soa,
-            ref_id=transaction.id,
-            defaults={
-                "student": transaction.soa.enrollment.student,
-                "amount": -abs(amount),
-                "description": f"OTC Payment {description}",
-                "jv_number": jv_number,
-                "ref": transaction,
-            },
+
+def _journal_voucher_entry_parse(row: list) -> dict:
+    if len(row) != 5:
+        return None
+
+    try:
+        amount = Decimal(row[1])
+    except ArithmeticError:
+        return None
+
+    description = row[2]
+    bank = None
+
+    for journal_voucher_bank in JOURNAL_VOUCHER_BANKS:
+        if description.startswith(journal_voucher_bank):
+            bank = journal_voucher_bank
+            break
+
+    return {
+        "id_number": row[0],
+        "amount": amount,
+        "description": description,
+        "jv_number": row[3],
+        "bank": bank,
+    }
+
+
+def _journal_voucher_result(line: int, row: list, action: str, result: str) -> list:
+    id_number, amount = [*row[:2], "", ""][:2]
+    return [line, id_number, amount, action, result]
+
+
+def _journal_voucher_chunk_process(
+    *, chunk: list[tuple[int, list]], dry_run: bool = False
+) -> list[list]:
+    """Process a chunk of journal voucher rows.
+
+    Students, their latest SOAs and their pending OTC transactions are
+    resolved with one query each. Missing OTC transactions are created with
+    pre-allocated ids, ledger entries are bulk inserted and the payment
+    events are published in batches. With `dry_run` only the results are
+    returned and nothing is written.
+    """
+    entries = [(line, row, _journal_voucher_entry_parse(row)) for line, row in chunk]
+    id_numbers = {entry["id_number"] for _, _, entry in entries if entry}
+
+    students = {}
+
+    for student in Student.objects.filter(id_number__in=id_numbers).order_by("-id"):
+        students[student.id_number] = student
+
+    latest_soas = {
+        soa.user_id: soa
+        for soa in StatementOfAccount.objects.filter(
+            user_id__in=[student.user_id for student in students.values()],
+            enrollment__isnull=False,
+        )
+        .select_related("enrollment")
+        .order_by(
+            "user_id",
+            "-enrollment__academic_year__year_start",
+            "-enrollment__year_level",
+            "-enrollment__semester__order",
         )
+        .distinct("user_id")
+    }
 
-    event_publisher.generic(events.PAYMENT_SUCCESS, object=transaction)
-    event_publisher.generic(events.PAYMENT_SETTLED, object=transaction)
-    return "success"
+    pending_transactions = defaultdict(list)
 
+    for transaction in (
+        OverTheCounterTransaction.objects.select_for_update(of=("self",))
+        .select_related("soa__enrollment")
+        .filter(
+            soa__user__student__in=students.values(),
+            status=OverTheCounterTransaction.Statuses.PENDING,
+        )
+        .annotate(student_id=F("soa__user__student__id"))
+        .order_by("id")
+    ):
+        pending_transactions[(transaction.student_id, transaction.bank)].append(
+            transaction
+        )
 
-def _journal_voucher_manual_adjustments(
-    *, student: Student, amount: Decimal, description: str, jv_number: str
-):
-    soa = soa_get_latest(user=student.user)
+    results = []
+    settled_transactions = []
+    created_transactions = []
+    otc_entries = []
+    ledger_entries = []
+    now = timezone.now()
 
-    if not soa:
-        return "invalid"
+    for line, row, entry in entries:
+        student = entry and students.get(entry["id_number"])
 
-    AccountTransaction.objects.create(
-        soa=soa,
-        student=student,
-        amount=-abs(amount),
-        description=f"Adjustment {description}",
-        jv_number=jv_number,
-    )
-    return "success"
+        if not student:
+            results.append(_journal_voucher_result(line, row, "", "invalid"))
+            continue
 
+        amount = abs(entry["amount"])
+        bank = entry["bank"]
 
-def journal_voucher_process(*, journal_voucher: JournalVoucher):
-    journal_voucher.status = JournalVoucher.Statuses.PROCESSING
-    journal_voucher.save()
+        if not bank:
+            soa = latest_soas.get(student.user_id)
+
+            if not soa:
+                results.append(_journal_voucher_result(line, row, "", "invalid"))
+                continue
+
+            ledger_entries.append(
+                AccountTransaction(
+                    soa=soa,
+                    student=student,
+                    amount=-amount,
+                    description=f"Adjustment {entry['description']}",
+                    jv_number=entry["jv_number"],
+                )
+            )
+            results.append(_journal_voucher_result(line, row, "adjustment", "success"))
+            continue
+
+        pending = pending_transactions.get((student.id, bank))
+
+        if pending:
+            transaction = pending.pop(0)
+            settled_transactions.append(transaction)
+            action = "otc_settle"
+        else:
+            soa = latest_soas.get(student.user_id)
+
+            if not soa:
+                results.append(_journal_voucher_result(line, row, "", "invalid"))
+                continue
+
+            transaction = OverTheCounterTransaction(soa=soa, bank=bank)
+            created_transactions.append(transaction)
+            action = "otc_create"
+
+        transaction.status = OverTheCounterTransaction.Statuses.SETTLED
+        transaction.amount = amount
+        transaction.jv_number = entry["jv_number"]
+        transaction.settled_at = now
+        transaction.updated_at = now
+        otc_entries.append((transaction, entry))
+        results.append(_journal_voucher_result(line, row, action, "success"))
+
+    # NOTE: Allocated ids are never given back to the sequence, so a dry run
+    # stops before any transaction is created
+    if dry_run:
+        return results
+
+    if created_transactions:
+        ids = _payment_transaction_ids_allocate(len(created_transactions))
+
+        # NOTE: Multi-table models cannot be bulk created, but with the ids
+        # known each transaction is inserted once, with its payment id
+        for transaction, id in zip(created_transactions, ids):
+            transaction.id = id
+            transaction.payment_id = PaymentTransaction.HASHIDS.encode(id)
+            transaction.save(force_insert=True)
+
+    existing_entries = set()
+
+    if settled_transactions:
+        OverTheCounterTransaction.objects.bulk_update(
+            settled_transactions,
+            fields=["status", "amount", "jv_number", "settled_at", "updated_at"],
+        )
+        existing_entries = set(
+            AccountTransaction.objects.filter(
+                ref_id__in=[transaction.id for transaction in settled_transactions]
+            ).values_list("soa_id", "ref_id")
+        )
+
+    ref_ctype = ContentType.objects.get_for_model(OverTheCounterTransaction)
+
+    for transaction, entry in otc_entries:
+        if (transaction.soa_id, transaction.id) in existing_entries:
+            continue
+
+        ledger_entries.append(
+            AccountTransaction(
+                soa=transaction.soa,
+                student_id=transaction.soa.enrollment.student_id,
+                amount=-transaction.amount,
+                description=f"OTC Payment {entry['description']}",
+                jv_number=entry["jv_number"],
+                ref_ctype=ref_ctype,
+                ref_id=transaction.id,
+            )
+        )
+
+    AccountTransaction.objects.bulk_create(ledger_entries)
+    soa_transactions_totals_update(transactions=ledger_entries)
+
+    transactions = settled_transactions + created_transactions
+    event_publisher.generic_many(events.PAYMENT_SUCCESS, objects=transactions)
+    event_publisher.generic_many(events.PAYMENT_SETTLED, objects=transactions)
+
+    return results
+
+
+def journal_voucher_process(
+    *, journal_voucher: JournalVoucher, dry_run: bool = False
+) -> list[list]:
+    """Process a journal voucher file in chunks of `SLU_UPLOAD_CHUNK_SIZE` rows.
+
+    Every chunk is written in its own database transaction. With `dry_run`
+    nothing is written and the journal voucher is left untouched, the
+    returned `[line, id_number, amount, action, result]` rows report what
+    would have changed.
+    """
+    if not dry_run:
+        journal_voucher.status = JournalVoucher.Statuses.PROCESSING
+        journal_voucher.save()
 
     stats = {
         "success": 0,
         "invalid": 0,
         "total": 0,
     }
+    results = []
 
     try:
-        file_contents = journal_voucher.file.read()
-        csv_data = file_contents.decode().split("\r\n")
-        reader = csv.reader(csv_data)
+        reader = csv_file_reader(journal_voucher.file)
+        rows = ((reader.line_num, row) for row in reader if row)
 
-        for row in reader:
-            if not row:
-                continue
+        for chunk in chunked(rows, settings.SLU_UPLOAD_CHUNK_SIZE):
+            with db_transaction.atomic():
+                chunk_results = _journal_voucher_chunk_process(
+                    chunk=chunk, dry_run=dry_run
+                )
 
-            stats["total"] += 1
+            for *_, result in chunk_results:
+                stats[result] += 1
+                stats["total"] += 1
 
-            if len(row) != 5:
-                stats["invalid"] += 1
-                continue
+            results.extend(chunk_results)
+    except (UnicodeDecodeError, botocore.exceptions.ClientError) as error:
+        if not dry_run:
+            _journal_voucher_failed(
+                journal_voucher=journal_voucher,
+                error="Error reading journal voucher file",
+            )
+        capture_exception(error)
+        return results
 
-            id_number = row[0]
-            amount = Decimal(row[1])
-            description = row[2]
-            jv_number = row[3]
+    if not dry_run:
+        journal_voucher.status = JournalVoucher.Statuses.COMPLETED
+        journal_voucher.success = stats["success"]
+        journal_voucher.invalid = stats["invalid"]
+        journal_voucher.total = stats["total"]
+        journal_voucher.save()
 
-            student = Student.objects.filter(id_number=id_number).first()
+    return results
 
-            if not student:
-                stats["invalid"] += 1
-                continue
 
-            processor = _journal_voucher_manual_adjustments
-            banks = [
-                OverTheCounterTransaction.Banks.BDO,
-                OverTheCounterTransaction.Banks.PNB,
-                OverTheCounterTransaction.Banks.MBTC,
-                OverTheCounterTransaction.Banks.LBP,
-            ]
-            kwargs = {}
+def _soa_ref_key(ref) -> list:
+    if not ref:
+        return None
 
-            for bank in banks:
-                if description.startswith(bank):
-                    processor = _journal_voucher_bank_process
-                    kwargs["bank"] = bank
-                    break
+    return [ref._meta.label, ref.pk]
 
-            result = processor(
-                student=student,
-                amount=amount,
-                description=description,
-                jv_number=jv_number,
-                **kwargs,
-            )
-            stats[result] += 1
-    except (UnicodeDecodeError, botocore.exceptions.ClientError) as error:
-        _journal_voucher_failed(
-            journal_voucher=journal_voucher,
-            error="Error reading journal voucher file",
-        )
-        capture_exception(error)
-        return
 
-    journal_voucher.status = JournalVoucher.Statuses.COMPLETED
-    journal_voucher.success = stats["success"]
-    journal_voucher.invalid = stats["invalid"]
-    journal_voucher.total = stats["total"]
-    journal_voucher.save()
+def _soa_fingerprint(*, user_id: int, plan: dict) -> str:
+    data = [
+        user_id,
+        str(plan["total_amount"]),
+        [
+            [line["category"], line["description"], str(line["value"])]
+            + [_soa_ref_key(line.get("ref"))]
+            for line in plan["lines"]
+        ],
+        [
+            [txn["description"], str(txn["amount"]), _soa_ref_key(txn.get("ref"))]
+            for txn in plan["transactions"]
+        ],
+    ]
+    return hashlib.sha256(json.dumps(data).encode()).hexdigest()
 
 
-def soa_create(
-    *, enrollment: Enrollment, discount_auto_apply: bool = False, override: bool = False
-):
-    if hasattr(enrollment, "soa") and not override:
-        return enrollment.soa
+# NOTE: Descriptions of the fee transactions written by `_soa_plan_build`
+SOA_FEE_DESCRIPTION_REGEX = (
+    r"^((Pro Subject|General Education) TF .+ units"
+    r"|Laboratory Fees|Miscellaneous Fees|Other Fees)$"
+)
 
-    student = enrollment.student
-    academic_year = enrollment.academic_year
-    course = student.course
 
-    discount = None
+def _soa_fee_transactions_get(*, soa: StatementOfAccount):
+    """Return the fee and discount transactions of an SOA, which are rebuilt
+    with its lines. Payments, system payments and adjustments are kept."""
+    return soa.transactions.filter(
+        Q(ref_ctype=ContentType.objects.get_for_model(Discount))
+        | Q(ref_ctype__isnull=True, description__regex=SOA_FEE_DESCRIPTION_REGEX)
+    )
 
-    if hasattr(enrollment, "discounts"):
-        discount = enrollment.discounts.validated_discount
-        if discount:
-            discount_fee_exemptions = discount.fee_exemptions.all()
+
+def _soa_plan_build(*, enrollment: Enrollment, discount_auto_apply: bool) -> dict:
+    """Compute the lines and transactions of an enrollment's SOA in memory.
+
+    Enrolled classes, laboratory fees, fee specifications and discount
+    exemptions are fetched up front with a fixed number of queries.
+    """
+    academic_year_id = enrollment.academic_year_id
+
+    enrollment_discount = (
+        EnrollmentDiscount.objects.filter(enrollment=enrollment)
+        .select_related("validated_discount")
+        .first()
+    )
+    discount = enrollment_discount.validated_discount if enrollment_discount else None
+    discount_fee_exemption_ids = set()
+
+    if discount:
+        discount_fee_exemption_ids = set(
+            discount.fee_exemptions.values_list("id", flat=True)
+        )
+
+    enrolled_classes = list(
+        enrollment.enrolled_classes.select_related(
+            "klass__tuition_fee_rate",
+            "curriculum_subject__subject",
+            "equivalent_subject",
+        )
+    )
+
+    subjects = {}
+    for enrolled_class in enrolled_classes:
+        if enrolled_class.curriculum_subject:
+            subject = enrolled_class.curriculum_subject.subject
+        else:
+            subject = enrolled_class.equivalent_subject
+
+        subjects[enrolled_class.id] = subject
+
+    lab_fees = {}
+    for lab_fee in LaboratoryFee.objects.filter(
+        academic_year_id=academic_year_id,
+        subject__in=[subject for subject in subjects.values() if subject],
+    ).order_by("id"):
+        lab_fees.setdefault(lab_fee.subject_id, lab_fee)
 
     tf_pro_fee = Decimal(0)
     tf_pro_units = 0
     tf_non_pro_fee = Decimal(0)
     tf_non_pro_units = 0
+    lab_fee_total = Decimal(0)
     discount_rate_total = Decimal(0)
 
-    subject_groups = []
-    lab_fees = []
-
-    for enrolled_class in enrollment.enrolled_classes.all():
+    for enrolled_class in enrolled_classes:
         curriculum_subject = enrolled_class.curriculum_subject
-        subject = Subject.objects.none
+        subject = subjects[enrolled_class.id]
         klass = enrolled_class.klass
 
-        tf_rate = klass.tuition_fee_rate if klass else None
-
-        if not curriculum_subject:
-            subject = enrolled_class.equivalent_subject
-        else:
-            subject = curriculum_subject.subject
+        if not subject:
+            continue
 
-        subject_groups.append(subject.grouping)
-        lab_fee = laboratory_fee_get(academic_year=academic_year, subject=subject)
+        tf_rate = klass.tuition_fee_rate if klass else None
+        lab_fee = lab_fees.get(subject.id)
 
         if lab_fee:
-            lab_fees.append(lab_fee)
+            lab_fee_total += lab_fee.rate
 
         if tf_rate:
-            rate = tf_rate.rate or Decimal(0)
+            subject_fee = (tf_rate.rate or Decimal(0)) * subject.units
 
             if subject.is_professional_subject:
-                tf_pro_fee += rate * subject.units
+                tf_pro_fee += subject_fee
                 tf_pro_units += subject.units
             else:
-                tf_non_pro_fee += rate * subject.units
+                tf_non_pro_fee += subject_fee
                 tf_non_pro_units += subject.units
 
             # NOTE: Check if subject is included for discounted tuition fee
@@ -637,165 +989,386 @@ def soa_create(
                 and curriculum_subject.category_rate
                 not in discount.category_rate_exemption
             ):
-
-                subject_fee = rate * subject.units
-                print(
-                    enrolled_class.klass.tuition_fee_rate.rate,
-                    enrolled_class.klass.subject.units,
-                    curriculum_subject.category_rate,
-                )
                 discount_rate_total += subject_fee
 
     # TODO: Revisit upon Fee Specification Clarification
-    # total_units = tf_pro_units + tf_non_pro_units
-    # misc_fees = miscellaneous_fees_get(
-    #     academic_year=academic_year,
-    #     curriculum_period=curriculum_period,
-    #     total_units=total_units,
-    # )
-    # other_fees = Fee.objects.none()
-
-    # for subject_group in set(subject_groups):
-    #     other_fees = other_fees.union(
-    #         other_fees_get(
-    #             academic_year=academic_year,
-    #             curriculum_period=curriculum_period,
-    #             subject_group=subject_group,
-    #             student=student,
-    #             course=course,
-    #         )
-    #     )
-
-    misc_fees = []
-    other_fees = []
-
-    if enrollment.miscellaneous_fee_specification:
-        misc_fees = [
-            fee for fee in enrollment.miscellaneous_fee_specification.fees.all()
-        ]
+    spec_fees = {}
+    spec_ids = [
+        spec_id
+        for spec_id in (
+            enrollment.miscellaneous_fee_specification_id,
+            enrollment.other_fee_specification_id,
+        )
+        if spec_id
+    ]
+
+    for fee in (
+        Fee.objects.filter(feespecification__in=spec_ids)
+        .annotate(spec_id=F("feespecification"))
+        .order_by("id")
+    ):
+        spec_fees.setdefault(fee.spec_id, []).append(fee)
 
-    if enrollment.other_fee_specification:
-        other_fees = [fee for fee in enrollment.other_fee_specification.fees.all()]
+    misc_fees = spec_fees.get(enrollment.miscellaneous_fee_specification_id, [])
+    other_fees = spec_fees.get(enrollment.other_fee_specification_id, [])
 
     misc_fee_total = Decimal(0)
     other_fee_total = Decimal(0)
 
-    has_discount_exemption = discount and discount_fee_exemptions
+    has_discount_exemption = discount and discount_fee_exemption_ids
 
     for mf in misc_fees:
         misc_fee_total += mf.amount
 
-        if has_discount_exemption and mf not in discount_fee_exemptions:
+        if has_discount_exemption and mf.id not in discount_fee_exemption_ids:
             discount_rate_total += mf.amount
 
     for of in other_fees:
         other_fee_total += of.amount
 
-        if has_discount_exemption and of not in discount_fee_exemptions:
+        if has_discount_exemption and of.id not in discount_fee_exemption_ids:
             discount_rate_total += of.amount
 
-    lab_fee_total = sum([lf.rate for lf in lab_fees])
+    lines = []
+    transactions = []
+
+    if tf_pro_fee:
+        lines.append(
+            {
+                "category": None,
+                "description": f"Tuition for Professional Subjects (Units: {tf_pro_units})",
+                "value": tf_pro_fee,
+            }
+        )
+        transactions.append(
+            {
+                "description": f"Pro Subject TF {tf_pro_units} units",
+                "amount": tf_pro_fee,
+            }
+        )
+
+    if tf_non_pro_fee:
+        lines.append(
+            {
+                "category": None,
+                "description": f"Tuition for General Education (Units: {tf_non_pro_units})",
+                "value": tf_non_pro_fee,
+            }
+        )
+        transactions.append(
+            {
+                "description": f"General Education TF {tf_non_pro_units} units",
+                "amount": tf_non_pro_fee,
+            }
+        )
+
+    if lab_fee_total:
+        lines.append(
+            {
+                "category": None,
+                "description": "Laboratory Fees",
+                "value": lab_fee_total,
+            }
+        )
+        transactions.append({"description": "Laboratory Fees", "amount": lab_fee_total})
+
+    for label, fees, fee_total in (
+        ("Miscellaneous Fees", misc_fees, misc_fee_total),
+        ("Other Fees", other_fees, other_fee_total),
+    ):
+        if not fees:
+            continue
+
+        for fee in fees:
+            lines.append(
+                {
+                    "category": label,
+                    "description": fee.name,
+                    "value": fee.amount,
+                    "ref": fee,
+                }
+            )
+
+        transactions.append({"description": label, "amount": fee_total})
+
+    if discount and (
+        (discount.type == Discount.Types.NORMAL and not discount_auto_apply)
+        or (discount_auto_apply)
+    ):
+        total_discount = discount_rate_total * (discount.percentage / 100)
+
+        lines.append(
+            {
+                "category": None,
+                "description": f"Discount ({discount.name})",
+                "value": -abs(total_discount),
+                "ref": discount,
+            }
+        )
+        transactions.append(
+            {
+                "description": f"Discount ({discount.name})",
+                "amount": -abs(total_discount),
+                "ref": discount,
+            }
+        )
+
     total_amount = sum(
         [
             tf_pro_fee,
             tf_non_pro_fee,
             lab_fee_total,
-            misc_fee_total or Decimal(0),
-            other_fee_total or Decimal(0),
+            misc_fee_total,
+            other_fee_total,
         ]
     )
 
-    min_amount_percentage = Decimal("0.35")
+    return {
+        "total_amount": total_amount,
+        "lines": lines,
+        "transactions": transactions,
+    }
 
-    soa, _ = StatementOfAccount.objects.update_or_create(
-        user=student.user,
-        enrollment=enrollment,
-        defaults={
-            "total_amount": total_amount,
-            "min_amount": total_amount * min_amount_percentage,
-            "min_amount_due_date": timezone.now() + timedelta(days=365),
-        },
-    )
-    soa.lines.all().delete()
-    soa.categories.all().delete()
-    soa.transactions.all().delete()
 
-    if tf_pro_fee:
-        soa.lines.create(
-            description=f"Tuition for Professional Subjects (Units: {tf_pro_units})",
-            value=tf_pro_fee,
+def soa_totals_update(*, deltas: dict[int, tuple[Decimal, Decimal]]):
+    """
+    Apply `(total, negative total)` amounts of created (or, negated, deleted)
+    account transactions per SOA id to the `balance`, `credits` and
+    `paid_negative_total` of the SOAs with atomic updates.
+    """
+    deltas = {
+        soa_id: delta for soa_id, delta in deltas.items() if soa_id and any(delta)
+    }
+
+    if not deltas:
+        return
+
+    def _delta_case(index):
+        return Case(
+            *[
+                When(id=soa_id, then=Value(delta[index]))
+                for soa_id, delta in deltas.items()
+            ],
+            default=Value(0),
+            output_field=DecimalField(max_digits=9, decimal_places=2),
         )
-        soa.transactions.create(
-            student=student,
-            description=f"Pro Subject TF {tf_pro_units} units",
-            amount=tf_pro_fee,
+
+    total = F("balance") - F("credits") + _delta_case(0)
+    soas = StatementOfAccount.objects.filter(id__in=deltas)
+    soas.update(
+        balance=Greatest(total, Value(0)),
+        credits=Greatest(-total, Value(0)),
+        paid_negative_total=F("paid_negative_total") + _delta_case(1),
+    )
+    soas.update(
+        has_remaining_balance=Case(
+            When(balance__gt=0, then=Value(True)), default=Value(False)
         )
+    )
 
-    if tf_non_pro_fee:
-        soa.lines.create(
-            description=f"Tuition for General Education (Units: {tf_non_pro_units})",
-            value=tf_non_pro_fee,
+
+def soa_transactions_totals_update(
+    *, transactions: list[AccountTransaction], deleted: bool = False
+):
+    """Apply bulk created (or deleted) account transactions to the totals of
+    their SOAs, see `soa_totals_update`"""
+    deltas = defaultdict(lambda: [Decimal(0), Decimal(0)])
+    sign = -1 if deleted else 1
+
+    for transaction in transactions:
+        amount = sign * Decimal(transaction.amount)
+        deltas[transaction.soa_id][0] += amount
+
+        if transaction.amount < 0:
+            deltas[transaction.soa_id][1] += amount
+
+    soa_totals_update(deltas=deltas)
+
+
+def _soa_actual_totals_get(soas):
+    decimal_field = DecimalField(max_digits=9, decimal_places=2)
+    return soas.annotate(
+        actual_total=Coalesce(
+            Sum("transactions__amount"), Value(0), output_field=decimal_field
+        ),
+        actual_negative_total=Coalesce(
+            Sum("transactions__amount", filter=Q(transactions__amount__lt=0)),
+            Value(0),
+            output_field=decimal_field,
+        ),
+    )
+
+
+def soa_totals_reconcile(*, dry_run: bool = False) -> list[dict]:
+    """
+    Recompute the totals of every SOA from its account transactions with one
+    grouped query and fix the SOAs that drifted. Returns the drifted SOAs
+    with their stored and actual totals.
+    """
+    fields = [
+        "id",
+        "balance",
+        "credits",
+        "paid_negative_total",
+        "actual_total",
+        "actual_negative_total",
+    ]
+    drifted_filter = (
+        ~Q(actual_total=F("balance") - F("credits"))
+        | ~Q(actual_negative_total=F("paid_negative_total"))
+        | Q(actual_total__gt=0, has_remaining_balance=False)
+        | Q(actual_total__lte=0, has_remaining_balance=True)
+    )
+    drifted = list(
+        _soa_actual_totals_get(StatementOfAccount.objects.all())
+        .filter(drifted_filter)
+        .values(*fields)
+        .order_by("id")
+    )
+
+    if not drifted or dry_run:
+        return drifted
+
+    with db_transaction.atomic():
+        # NOTE: Lock the SOAs so no transaction is applied while fixing them
+        soa_ids = list(
+            StatementOfAccount.objects.select_for_update()
+            .filter(id__in=[soa["id"] for soa in drifted])
+            .values_list("id", flat=True)
         )
-        soa.transactions.create(
-            student=student,
-            description=f"General Education TF {tf_non_pro_units} units",
-            amount=tf_non_pro_fee,
+        soas = _soa_actual_totals_get(
+            StatementOfAccount.objects.filter(id__in=soa_ids)
+        ).values(*fields)
+        StatementOfAccount.objects.filter(id__in=soa_ids).update(
+            balance=0, credits=0, paid_negative_total=0
+        )
+        soa_totals_update(
+            deltas={
+                soa["id"]: (soa["actual_total"], soa["actual_negative_total"])
+                for soa in soas
+            }
         )
 
-    if lab_fee_total:
-        soa.lines.create(
-            description="Laboratory Fees",
-            value=lab_fee_total,
+    return drifted
+
+
+def soa_create(
+    *, enrollment: Enrollment, discount_auto_apply: bool = False, override: bool = False
+):
+    if hasattr(enrollment, "soa") and not override:
+        return enrollment.soa
+
+    student = enrollment.student
+    plan = _soa_plan_build(
+        enrollment=enrollment, discount_auto_apply=discount_auto_apply
+    )
+    fingerprint = _soa_fingerprint(user_id=student.user_id, plan=plan)
+
+    soa = StatementOfAccount.objects.filter(
+        user=student.user, enrollment=enrollment
+    ).first()
+
+    # NOTE: Skip rewriting SOAs whose computed lines did not change, unless
+    # the caller asks for the SOA to be rebuilt
+    if not override and soa and soa.fingerprint == fingerprint:
+        return soa
+
+    total_amount = plan["total_amount"]
+    min_amount_percentage = Decimal("0.35")
+
+    with db_transaction.atomic():
+        soa, _ = StatementOfAccount.objects.update_or_create(
+            user=student.user,
+            enrollment=enrollment,
+            defaults={
+                "total_amount": total_amount,
+                "min_amount": total_amount * min_amount_percentage,
+                "min_amount_due_date": timezone.now() + timedelta(days=365),
+                "fingerprint": fingerprint,
+            },
+        )
+        soa.lines.all().delete()
+        soa.categories.all().delete()
+        _soa_fee_transactions_get(soa=soa).delete()
+
+        category_labels = []
+        for line in plan["lines"]:
+            if line["category"] and line["category"] not in category_labels:
+                category_labels.append(line["category"])
+
+        categories = {
+            category.label: category
+            for category in StatementLineCategory.objects.bulk_create(
+                [
+                    StatementLineCategory(soa=soa, label=label)
+                    for label in category_labels
+                ]
+            )
+        }
+
+        StatementLine.objects.bulk_create(
+            [
+                StatementLine(
+                    soa=soa,
+                    category=categories.get(line["category"]),
+                    description=line["description"],
+                    value=line["value"],
+                    ref=line.get("ref"),
+                )
+                for line in plan["lines"]
+            ]
         )
-        soa.transactions.create(
-            student=student, description="Laboratory Fees", amount=lab_fee_total
+        soa_transactions_totals_update(
+            transactions=AccountTransaction.objects.bulk_create(
+                [
+                    AccountTransaction(
+                        soa=soa,
+                        student=student,
+                        description=txn["description"],
+                        amount=txn["amount"],
+                        ref=txn.get("ref"),
+                    )
+                    for txn in plan["transactions"]
+                ]
+            )
         )
 
-    if misc_fees:
-        category, _ = soa.categories.get_or_create(label="Miscellaneous Fees")
+    soa.refresh_from_db(fields=StatementOfAccount.TOTAL_FIELDS)
 
-        for fee in misc_fees:
-            category.lines.create(
-                soa=soa, description=fee.name, value=fee.amount, ref=fee
-            )
+    return soa
 
-        soa.transactions.create(
-            student=student, description="Miscellaneous Fees", amount=misc_fee_total
-        )
 
-    if other_fees:
-        category, _ = soa.categories.get_or_create(label="Other Fees")
+SOA_SYSTEM_PAYMENT_DESCRIPTION = "System Uploaded Payment Transaction"
 
-        for fee in other_fees:
-            category.lines.create(
-                soa=soa, description=fee.name, value=fee.amount, ref=fee
-            )
 
-        soa.transactions.create(
-            student=student, description="Other Fees", amount=other_fee_total
-        )
+def soa_range_generate(*, start_id: int, end_id: int, override: bool = False) -> int:
+    """Generate the SOAs of the enrollments with ids in `[start_id, end_id]`.
 
-    if discount and (
-        (discount.type == Discount.Types.NORMAL and not discount_auto_apply)
-        or (discount_auto_apply)
-    ):
+    Enrollments that already have an SOA are excluded with a single anti-join
+    unless `override` is set, which rebuilds their lines and fees but keeps
+    their payments. Returns the number of enrollments processed.
+    """
+    enrollments = Enrollment.objects.filter(
+        id__range=(start_id, end_id)
+    ).select_related("student")
 
-        total_discount = discount_rate_total * (discount.percentage / 100)
+    if not override:
+        enrollments = enrollments.filter(statement_of_account__isnull=True)
 
-        soa.lines.create(
-            description=f"Discount ({discount.name})",
-            value=-abs(total_discount),
-            ref=discount,
-        )
+    counter = 0
 
-        soa.transactions.create(
-            student=student,
-            description=f"Discount ({enrollment.discount.name})",
-            amount=-abs(total_discount),
-            ref=discount,
+    for enrollment in enrollments.order_by("id").iterator():
+        soa = soa_create(enrollment=enrollment, discount_auto_apply=True, override=True)
+        soa.transactions.get_or_create(
+            description=SOA_SYSTEM_PAYMENT_DESCRIPTION,
+            defaults={
+                "student": enrollment.student,
+                "amount": -abs(soa.total_amount),
+            },
         )
+        counter += 1
 
-    return soa
+    return counter
 
 
 def payment_transaction_expire(
@@ -808,3 +1381,179 @@ def payment_transaction_expire(
         "Thank you."
     )
     transaction.save()
+
+
+PAYMENT_FACT_KEY_FIELDS = [
+    "semester_id",
+    "school_id",
+    "year_level",
+    "payment_method",
+    "status",
+]
+
+
+def _payment_facts_update(*, deltas: dict[tuple, list]):
+    """Add `[count, amount]` deltas to the payment facts of the keys with one
+    upsert. Keys are sorted so concurrent updates lock rows in the same order."""
+    deltas = {key: delta for key, delta in deltas.items() if any(delta)}
+
+    if not deltas:
+        return
+
+    table = PaymentFact._meta.db_table
+    columns = ", ".join(PAYMENT_FACT_KEY_FIELDS)
+    now = timezone.now()
+    params = []
+
+    for key in sorted(deltas):
+        params.extend([*key, *deltas[key], True, now, now])
+
+    placeholders = ", ".join(
+        ["(%s)" % ", ".join(["%s"] * (len(PAYMENT_FACT_KEY_FIELDS) + 5))] * len(deltas)
+    )
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {table} "
+            f"({columns}, count, amount, is_active, created_at, updated_at) "
+            f"VALUES {placeholders} "
+            f"ON CONFLICT ({columns}) DO UPDATE SET "
+            f"count = {table}.count + EXCLUDED.count, "
+            f"amount = {table}.amount + EXCLUDED.amount, "
+            "updated_at = EXCLUDED.updated_at",
+            params,
+        )
+
+
+def _payment_facts_chunk_sync(*, payment_ids: list[int]):
+    decimal_field = DecimalField(max_digits=9, decimal_places=2)
+    children = [model._meta.model_name for model in PAYMENT_MODELS]
+    payments = (
+        PaymentTransaction.objects.non_polymorphic()
+        .select_for_update(of=("self",))
+        .filter(id__in=payment_ids)
+        .annotate(
+            current_status=Coalesce(*[f"{child}__status" for child in children]),
+            current_amount=Coalesce(
+                *[f"{child}__amount" for child in children],
+                Value(0),
+                output_field=decimal_field,
+            ),
+            semester_id=F("soa__enrollment__semester_id"),
+            school_id=F("soa__enrollment__student__course__school_id"),
+            year_level=F("soa__enrollment__year_level"),
+        )
+        .order_by("id")
+        .values(
+            "id",
+            "polymorphic_ctype_id",
+            "fact_status",
+            "fact_amount",
+            "fact_semester_id",
+            "fact_school_id",
+            "fact_year_level",
+            "current_status",
+            "current_amount",
+            "semester_id",
+            "school_id",
+            "year_level",
+        )
+    )
+    payment_methods = {
+        ContentType.objects.get_for_model(model).id: model.PAYMENT_METHOD
+        for model in PAYMENT_MODELS
+    }
+    deltas = defaultdict(lambda: [0, Decimal(0)])
+    counted = []
+
+    for payment in payments:
+        payment_method = payment_methods.get(payment["polymorphic_ctype_id"])
+        previous_group = (
+            payment["fact_semester_id"],
+            payment["fact_school_id"],
+            payment["fact_year_level"],
+        )
+        previous = (*previous_group, payment["fact_status"], payment["fact_amount"])
+        group = (payment["semester_id"], payment["school_id"], payment["year_level"])
+
+        # NOTE: Payments without an enrollment are not counted
+        if None in group:
+            group = (None, None, None)
+            current = (*group, "", None)
+        else:
+            current = (
+                *group,
+                payment["current_status"] or "",
+                payment["current_amount"],
+            )
+
+        if previous == current or not payment_method:
+            continue
+
+        # NOTE: Take the payment out of the group it was counted in, which
+        # changes when the student shifts or the enrollment is corrected
+        if payment["fact_status"] and None not in previous_group:
+            key = (*previous_group, payment_method, payment["fact_status"])
+            deltas[key][0] -= 1
+            deltas[key][1] -= payment["fact_amount"] or 0
+
+        if current[3]:
+            key = (*group, payment_method, current[3])
+            deltas[key][0] += 1
+            deltas[key][1] += current[4]
+
+        counted.append(
+            PaymentTransaction(
+                id=payment["id"],
+                fact_semester_id=group[0],
+                fact_school_id=group[1],
+                fact_year_level=group[2],
+                fact_status=current[3],
+                fact_amount=current[4],
+            )
+        )
+
+    _payment_facts_update(deltas=deltas)
+    PaymentTransaction.objects.bulk_update(
+        counted, fields=PaymentTransaction.FACT_FIELDS
+    )
+
+
+def payment_facts_sync(*, payment_ids: list[int]):
+    """
+    Move the payments from the facts of the group, status and amount they
+    were last counted with to the facts of their current ones. Payments are locked while
+    synced so replaying an event or a concurrent save never counts twice.
+    """
+    for chunk in chunked(sorted(payment_ids), settings.SLU_UPLOAD_CHUNK_SIZE):
+        with db_transaction.atomic():
+            _payment_facts_chunk_sync(payment_ids=chunk)
+
+
+def payment_facts_rebuild() -> int:
+    """Recount every payment into emptied payment facts in one transaction.
+    Returns the number of payments counted."""
+    payment_ids = PaymentTransaction.objects.non_polymorphic().order_by("id")
+
+    with db_transaction.atomic():
+        PaymentFact.objects.all().delete()
+        payment_ids.update(
+            fact_status="",
+            fact_amount=None,
+            fact_semester=None,
+            fact_school=None,
+            fact_year_level=None,
+        )
+        payment_facts_sync(
+            payment_ids=payment_ids.values_list("id", flat=True).iterator()
+        )
+
+    return PaymentTransaction.objects.exclude(fact_status="").count()
+
+
+def handle_payment_success(event: GenericModelEvent):
+    payment_facts_sync(payment_ids=[event.object.pk])
+
+
+def handle_payment_settled(event: GenericModelEvent):
+    payment_facts_sync(payment_ids=[event.object.pk])
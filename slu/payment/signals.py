@@ -0,0 +1,74 @@
+from decimal import Decimal
+
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .models import (
+    AccountTransaction,
+    BukasTransaction,
+    CashierTransaction,
+    DragonpayTransaction,
+    OverTheCounterTransaction,
+    StatementOfAccount,
+)
+from .services import payment_facts_sync, soa_totals_update
+
+
+def _transaction_deltas(soa_id, amount: Decimal, sign: int) -> dict:
+    amount = Decimal(amount)
+    return {soa_id: (sign * amount, sign * min(amount, 0))}
+
+
+def _soa_totals_refresh(instance: AccountTransaction):
+    if AccountTransaction.soa.is_cached(instance) and instance.soa:
+        instance.soa.refresh_from_db(fields=StatementOfAccount.TOTAL_FIELDS)
+
+
+@receiver(pre_save, sender=AccountTransaction)
+def account_transaction_pre_save(instance: AccountTransaction, **kwargs):
+    instance._previous_totals = None
+
+    if instance.pk:
+        instance._previous_totals = (
+            AccountTransaction.objects.filter(pk=instance.pk)
+            .values_list("soa_id", "amount")
+            .first()
+        )
+
+
+@receiver(post_save, sender=AccountTransaction)
+def account_transaction_post_save(instance: AccountTransaction, **kwargs):
+    previous = getattr(instance, "_previous_totals", None)
+    current = (instance.soa_id, instance.amount)
+
+    if previous == current:
+        return
+
+    if previous and previous[0] == current[0]:
+        # NOTE: Same SOA, revert the previous amount and apply the new one
+        amount = Decimal(current[1]) - Decimal(previous[1])
+        negative = min(Decimal(current[1]), 0) - min(Decimal(previous[1]), 0)
+        soa_totals_update(deltas={current[0]: (amount, negative)})
+    else:
+        if previous:
+            soa_totals_update(deltas=_transaction_deltas(*previous, sign=-1))
+
+        soa_totals_update(deltas=_transaction_deltas(*current, sign=1))
+
+    _soa_totals_refresh(instance)
+
+
+@receiver(post_delete, sender=AccountTransaction)
+def account_transaction_post_delete(instance: AccountTransaction, **kwargs):
+    soa_totals_update(
+        deltas=_transaction_deltas(instance.soa_id, instance.amount, sign=-1)
+    )
+    _soa_totals_refresh(instance)
+
+
+@receiver(post_save, sender=DragonpayTransaction)
+@receiver(post_save, sender=BukasTransaction)
+@receiver(post_save, sender=OverTheCounterTransaction)
+@receiver(post_save, sender=CashierTransaction)
+def payment_transaction_post_save(instance, **kwargs):
+    payment_facts_sync(payment_ids=[instance.pk])
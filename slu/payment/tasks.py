@@ -41,3 +41,10 @@ def async_payment_transaction_expire(transaction_id: int):
         return
 
     payment_transaction_expire(transaction=transaction)
+
+
+@shared_task
+def async_soa_range_generate(start_id: int, end_id: int, override: bool = False):
+    from .services import soa_range_generate
+
+    return soa_range_generate(start_id=start_id, end_id=end_id, override=override)
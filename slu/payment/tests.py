@@ -1,3 +1,468 @@
-from django.test import TestCase
+from datetime import timedelta
 
-# Create your tests here.
+import pytest
+from django.core.files.base import ContentFile
+from django.utils import timezone
+
+from slu.core.cms.models import (
+    LaboratoryFee,
+    Subject,
+    TuitionFeeCategory,
+    TuitionFeeRate,
+)
+from slu.core.students.models import EnrolledClass, EnrollmentEvent
+from slu.framework.events import GenericModelEvent
+
+from . import events, selectors, services
+from .models import (
+    AccountTransaction,
+    BukasTransaction,
+    CashierTransaction,
+    DragonpayChannel,
+    DragonpayTransaction,
+    JournalVoucher,
+    OverTheCounterTransaction,
+    PaymentFact,
+    StatementOfAccount,
+)
+
+
+def _soa_create(enrollment):
+    return StatementOfAccount.objects.create(
+        user=enrollment.student.user,
+        enrollment=enrollment,
+        total_amount=1000,
+        min_amount=350,
+        min_amount_due_date=timezone.now() + timedelta(days=30),
+    )
+
+
+@pytest.mark.django_db
+class TestSoaCreate:
+    @pytest.fixture
+    def enrollment(
+        self,
+        enrollment,
+        subject_factory,
+        class_factory,
+        fee_factory,
+        fee_specification_factory,
+    ):
+        academic_year = enrollment.academic_year
+        category = TuitionFeeCategory.objects.create(ref_id="PRO", year_level=1)
+        rate = TuitionFeeRate.objects.create(
+            tuition_fee_category=category, academic_year=academic_year, rate=100
+        )
+        classification = Subject.Classifications.DAP
+        pro_subject = subject_factory(
+            units=3, is_professional_subject=True, classification=classification
+        )
+        ge_subject = subject_factory(units=2, classification=classification)
+        LaboratoryFee.objects.create(
+            academic_year=academic_year, subject=pro_subject, rate=250
+        )
+
+        for subject in [pro_subject, ge_subject]:
+            EnrolledClass.objects.create(
+                student=enrollment.student,
+                enrollment=enrollment,
+                klass=class_factory(subject=subject, tuition_fee_rate=rate),
+                equivalent_subject=subject,
+                status=EnrolledClass.Statuses.ENROLLED,
+            )
+
+        enrollment.miscellaneous_fee_specification = fee_specification_factory(
+            fees=[fee_factory(amount=100), fee_factory(amount=50)]
+        )
+        enrollment.save()
+        return enrollment
+
+    def test_plan_build(self, enrollment):
+        plan = services._soa_plan_build(
+            enrollment=enrollment, discount_auto_apply=False
+        )
+
+        assert plan["total_amount"] == 900
+        assert [(line["category"], line["value"]) for line in plan["lines"]] == [
+            (None, 300),
+            (None, 200),
+            (None, 250),
+            ("Miscellaneous Fees", 100),
+            ("Miscellaneous Fees", 50),
+        ]
+        assert [txn["amount"] for txn in plan["transactions"]] == [300, 200, 250, 150]
+
+    def test_create_fingerprint(self, enrollment):
+        soa = services.soa_create(enrollment=enrollment)
+        assert soa.balance == 900
+        line_ids = set(soa.lines.values_list("id", flat=True))
+        assert len(line_ids) == 5
+
+        # NOTE: Unchanged SOAs are not rewritten, unless overridden
+        soa = services.soa_create(enrollment=enrollment)
+        assert set(soa.lines.values_list("id", flat=True)) == line_ids
+
+        soa = services.soa_create(enrollment=enrollment, override=True)
+        assert set(soa.lines.values_list("id", flat=True)).isdisjoint(line_ids)
+        assert soa.balance == 900
+
+    def test_range_generate_override_keeps_payments(self, enrollment):
+        services.soa_range_generate(start_id=enrollment.id, end_id=enrollment.id)
+        soa = enrollment.statement_of_account
+        payment = CashierTransaction.objects.create(
+            soa=soa, amount=100, status=CashierTransaction.Statuses.SETTLED
+        )
+        soa.transactions.create(
+            student=enrollment.student,
+            amount=-100,
+            description="Cashier payment",
+            ref=payment,
+        )
+        soa.transactions.create(
+            student=enrollment.student, amount=-20, description="Adjustment JV"
+        )
+
+        # NOTE: A fee correction re-runs the SOAs of enrollments with payments
+        LaboratoryFee.objects.update(rate=500)
+        services.soa_range_generate(
+            start_id=enrollment.id, end_id=enrollment.id, override=True
+        )
+
+        soa.refresh_from_db()
+        assert soa.total_amount == 1150
+        assert sorted(soa.transactions.values_list("description", "amount")) == [
+            ("Adjustment JV", -20),
+            ("Cashier payment", -100),
+            ("General Education TF 2.00 units", 200),
+            ("Laboratory Fees", 500),
+            ("Miscellaneous Fees", 150),
+            ("Pro Subject TF 3.00 units", 300),
+            (services.SOA_SYSTEM_PAYMENT_DESCRIPTION, -900),
+        ]
+        assert soa.balance == 130
+
+
+@pytest.mark.django_db
+class TestSoaRangeGenerate:
+    def test_generate(self, enrollment_factory):
+        enrollments = [enrollment_factory() for _ in range(3)]
+        _soa_create(enrollments[0])
+        start_id, end_id = enrollments[0].id, enrollments[-1].id
+
+        assert services.soa_range_generate(start_id=start_id, end_id=end_id) == 2
+        assert services.soa_range_generate(start_id=start_id, end_id=end_id) == 0
+        assert (
+            services.soa_range_generate(start_id=start_id, end_id=end_id, override=True)
+            == 3
+        )
+
+        # NOTE: Re-runs must not duplicate the system payment
+        for enrollment in enrollments:
+            assert (
+                enrollment.statement_of_account.transactions.filter(
+                    description=services.SOA_SYSTEM_PAYMENT_DESCRIPTION
+                ).count()
+                == 1
+            )
+
+
+@pytest.mark.django_db
+class TestSoaTotals:
+    def test_totals(self, enrollment_factory):
+        enrollment = enrollment_factory()
+        soa = _soa_create(enrollment)
+        fee = soa.transactions.create(
+            student=enrollment.student, amount=1000, description="Fee"
+        )
+        payment = soa.transactions.create(
+            student=enrollment.student, amount=-400, description="Payment"
+        )
+        assert soa.get_remaining_balance() == 600
+        assert soa.get_min_amount_due() == 0
+        assert soa.has_remaining_balance
+
+        payment.amount = -1500
+        payment.save()
+        assert soa.get_remaining_balance() == 0
+        assert soa.get_available_credits() == 500
+        assert not soa.has_remaining_balance
+
+        fee.delete()
+        soa.refresh_from_db()
+        assert soa.credits == 1500
+        assert soa.paid_negative_total == -1500
+
+        StatementOfAccount.objects.filter(id=soa.id).update(credits=0)
+        assert len(services.soa_totals_reconcile(dry_run=True)) == 1
+        assert len(services.soa_totals_reconcile()) == 1
+        assert services.soa_totals_reconcile() == []
+        soa.refresh_from_db()
+        assert soa.credits == 1500
+
+
+@pytest.mark.django_db
+class TestSoaPaymentTotals:
+    def test_totals(self, enrollment_factory, django_assert_num_queries):
+        soa = _soa_create(enrollment_factory())
+        other_soa = _soa_create(enrollment_factory())
+        statuses = CashierTransaction.Statuses
+        CashierTransaction.objects.create(soa=soa, amount=100, status=statuses.PAID)
+        CashierTransaction.objects.create(soa=soa, amount=50, status=statuses.SETTLED)
+        CashierTransaction.objects.create(soa=soa, amount=5, status=statuses.PENDING)
+        BukasTransaction.objects.create(
+            soa=soa, amount=20, status=BukasTransaction.Statuses.FOR_FUNDING
+        )
+        OverTheCounterTransaction.objects.create(
+            soa=other_soa,
+            amount=30,
+            bank=OverTheCounterTransaction.Banks.BDO,
+            status=OverTheCounterTransaction.Statuses.SETTLED,
+        )
+
+        with django_assert_num_queries(1):
+            totals = selectors.soa_payment_totals_get(soa_ids=[soa.id, other_soa.id])
+
+        assert totals[soa.id] == {
+            "paid": 120,
+            "settled": 70,
+            "received": 170,
+            "pending": 5,
+        }
+        assert totals[other_soa.id]["received"] == 30
+        assert selectors.soa_get_paid_amount(soa=other_soa) == 0
+
+
+@pytest.mark.django_db
+class TestPaymentFacts:
+    def test_sync(self, enrollment_factory):
+        enrollment = enrollment_factory()
+        soa = _soa_create(enrollment)
+        statuses = OverTheCounterTransaction.Statuses
+        transaction = OverTheCounterTransaction.objects.create(
+            soa=soa, amount=30, bank=OverTheCounterTransaction.Banks.BDO
+        )
+        transaction.generate_id()
+        OverTheCounterTransaction.objects.filter(id=transaction.id).update(
+            status=statuses.SETTLED
+        )
+
+        # NOTE: Replayed events must not count the payment twice
+        for _ in range(2):
+            services.handle_payment_settled(
+                GenericModelEvent(events.PAYMENT_SETTLED, object=transaction)
+            )
+
+        facts = PaymentFact.objects.filter(count__gt=0).values_list(
+            "semester", "status", "count", "amount"
+        )
+        assert list(facts) == [(enrollment.semester_id, statuses.SETTLED, 1, 30)]
+
+        PaymentFact.objects.update(count=0)
+        assert services.payment_facts_rebuild() == 1
+        assert list(facts) == [(enrollment.semester_id, statuses.SETTLED, 1, 30)]
+
+    def test_sync_group_change(self, enrollment_factory):
+        enrollment = enrollment_factory(year_level=1)
+        soa = _soa_create(enrollment)
+        statuses = CashierTransaction.Statuses
+        payment = CashierTransaction.objects.create(
+            soa=soa, amount=100, status=statuses.PAID
+        )
+        services.payment_facts_sync(payment_ids=[payment.id])
+
+        # NOTE: The payment leaves the group it was counted in
+        enrollment.year_level = 2
+        enrollment.save()
+        CashierTransaction.objects.filter(id=payment.id).update(status=statuses.SETTLED)
+        services.payment_facts_sync(payment_ids=[payment.id])
+
+        facts = PaymentFact.objects.order_by("year_level", "status").values_list(
+            "year_level", "status", "count", "amount"
+        )
+        assert list(facts) == [
+            (1, statuses.PAID, 0, 0),
+            (2, statuses.SETTLED, 1, 100),
+        ]
+
+
+@pytest.mark.django_db
+class TestSettlementChunkProcess:
+    def test_cashier(self, enrollment_factory):
+        enrollment = enrollment_factory()
+        soa = _soa_create(enrollment)
+        id_number = enrollment.student.id_number
+        statuses = CashierTransaction.Statuses
+        paid = CashierTransaction.objects.create(
+            soa=soa, amount=100, receipt_id="R1", status=statuses.PAID
+        )
+        CashierTransaction.objects.create(
+            soa=soa, amount=50, receipt_id="R2", status=statuses.SETTLED
+        )
+        CashierTransaction.objects.create(
+            soa=soa, amount=20, receipt_id="R3", status=statuses.PAID
+        )
+        reissued = CashierTransaction.objects.create(
+            soa=soa, amount=20, receipt_id="R3", status=statuses.PAID
+        )
+
+        rows = [
+            {"IDNO": id_number, "REFERENCE": "R1", "AMOUNT": "100"},
+            {"IDNO": id_number, "REFERENCE": "R2", "AMOUNT": "50"},
+            {"IDNO": id_number, "REFERENCE": "R1", "AMOUNT": "100"},
+            {"IDNO": "INVALID", "REFERENCE": "R1", "AMOUNT": "100"},
+            {"IDNO": id_number, "REFERENCE": "R3", "AMOUNT": "ABC"},
+            {"IDNO": id_number, "REFERENCE": "R3", "AMOUNT": "20"},
+        ]
+        results = services._cashier_settlement_chunk_process(
+            chunk=list(enumerate(rows, start=2)), jv_number="JV1", settled_ids=set()
+        )
+
+        assert [result for *_, result in results] == [
+            "settled",
+            "skipped",
+            "skipped",
+            "invalid",
+            "invalid",
+            "settled",
+        ]
+
+        for transaction in [paid, reissued]:
+            transaction.refresh_from_db()
+            assert transaction.status == statuses.SETTLED
+            assert transaction.jv_number == "JV1"
+            assert transaction.settled_at
+
+        ledger = AccountTransaction.objects.filter(soa=soa).order_by("ref_id")
+        assert list(ledger.values_list("ref_id", "amount", "jv_number")) == [
+            (paid.id, -100, "JV1"),
+            (reissued.id, -20, "JV1"),
+        ]
+        soa.refresh_from_db()
+        assert soa.paid_negative_total == -120
+        assert EnrollmentEvent.objects.filter(
+            enrollment=enrollment, event=EnrollmentEvent.Events.ENROLLMENT_ENDED
+        ).exists()
+
+    def test_dragonpay(self, enrollment_factory):
+        soa = _soa_create(enrollment_factory())
+        channel = DragonpayChannel.objects.create(proc_id="BOG", description="Bogus")
+        statuses = DragonpayTransaction.Statuses
+        success = DragonpayTransaction.objects.create(
+            soa=soa,
+            channel=channel,
+            amount=300,
+            payment_id="P1",
+            reference_number="REF1",
+            status=statuses.SUCCESS,
+        )
+        DragonpayTransaction.objects.create(
+            soa=soa,
+            channel=channel,
+            amount=200,
+            payment_id="P2",
+            reference_number="REF2",
+            status=statuses.SETTLED,
+        )
+
+        rows = [
+            {
+                "Merchant Txn Id": "P1",
+                "Refno": "REF1",
+                "Settle Date": "01/15/22 10:30 AM",
+            },
+            {"Merchant Txn Id": "P2", "Refno": "REF2"},
+            {"Merchant Txn Id": "P1", "Refno": "REF1"},
+            {"Merchant Txn Id": "P1", "Refno": "INVALID"},
+        ]
+        results = services._dragonpay_settlement_chunk_process(
+            chunk=list(enumerate(rows, start=2)), jv_number="JV2", settled_ids=set()
+        )
+
+        assert results == [
+            [2, "P1", "REF1", "settled"],
+            [3, "P2", "REF2", "skipped"],
+            [4, "P1", "REF1", "skipped"],
+            [5, "P1", "INVALID", "invalid"],
+        ]
+
+        success.refresh_from_db()
+        assert success.status == statuses.SETTLED
+        assert success.settlement_date.date().isoformat() == "2022-01-15"
+        assert list(
+            AccountTransaction.objects.filter(soa=soa).values_list("ref_id", "amount")
+        ) == [(success.id, -300)]
+
+        # NOTE: Settling again must not write a second ledger entry
+        DragonpayTransaction.objects.filter(id=success.id).update(
+            status=statuses.SUCCESS
+        )
+        services._dragonpay_settlement_chunk_process(
+            chunk=[(2, rows[0])], jv_number="JV2", settled_ids=set()
+        )
+        assert AccountTransaction.objects.filter(soa=soa).count() == 1
+
+
+@pytest.mark.django_db
+class TestJournalVoucherProcess:
+    def test_process(self, enrollment_factory):
+        enrollment = enrollment_factory()
+        soa = _soa_create(enrollment)
+        id_number = enrollment.student.id_number
+        statuses = OverTheCounterTransaction.Statuses
+        pending = OverTheCounterTransaction.objects.create(
+            soa=soa, bank=OverTheCounterTransaction.Banks.BDO
+        )
+        lines = [
+            f"{id_number},100,BDO deposit,JV1,",
+            f"{id_number},200,PNB deposit,JV1,",
+            f"{id_number},50,Scholarship,JV1,",
+            "INVALID,10,BDO deposit,JV1,",
+            "SHORT",
+        ]
+        journal_voucher = JournalVoucher.objects.create(
+            file=ContentFile("\r\n".join(lines).encode(), name="jv.csv")
+        )
+        expected = [
+            [1, id_number, "100", "otc_settle", "success"],
+            [2, id_number, "200", "otc_create", "success"],
+            [3, id_number, "50", "adjustment", "success"],
+            [4, "INVALID", "10", "", "invalid"],
+            [5, "SHORT", "", "", "invalid"],
+        ]
+        otc_ids = list(OverTheCounterTransaction.objects.values_list("id", flat=True))
+
+        results = services.journal_voucher_process(
+            journal_voucher=journal_voucher, dry_run=True
+        )
+
+        assert results == expected
+        assert (
+            list(OverTheCounterTransaction.objects.values_list("id", flat=True))
+            == otc_ids
+        )
+        assert not AccountTransaction.objects.exists()
+        pending.refresh_from_db()
+        assert pending.status == statuses.PENDING
+        journal_voucher.refresh_from_db()
+        assert journal_voucher.status == JournalVoucher.Statuses.PENDING
+
+        journal_voucher.file.seek(0)
+        results = services.journal_voucher_process(journal_voucher=journal_voucher)
+
+        assert results == expected
+        pending.refresh_from_db()
+        assert pending.status == statuses.SETTLED
+        assert pending.amount == 100
+        created = OverTheCounterTransaction.objects.exclude(id=pending.id).get()
+        assert created.status == statuses.SETTLED
+        assert created.bank == OverTheCounterTransaction.Banks.PNB
+        assert created.payment_id
+        ledger = AccountTransaction.objects.filter(soa=soa).order_by("id")
+        assert list(ledger.values_list("ref_id", "amount")) == [
+            (None, -50),
+            (pending.id, -100),
+            (created.id, -200),
+        ]
+        journal_voucher.refresh_from_db()
+        assert journal_voucher.status == JournalVoucher.Statuses.COMPLETED
+        assert (journal_voucher.success, journal_voucher.invalid) == (3, 2)
@@ -611,6 +611,7 @@ class PaymentCountPerSchoolListAPIView(ListAPIView):
     def get_serializer_context(self):
         context = super().get_serializer_context()
         context["year_level"] = self.request.GET.get("year_level", None)
+        context["semester"] = current_semester_get()
         return context
 
 
@@ -650,6 +651,7 @@ class OverTheCounterStatusCountPerSchoolListAPIView(ListAPIView):
     def get_serializer_context(self):
         context = super().get_serializer_context()
         context["year_level"] = self.request.GET.get("year_level", None)
+        context["semester"] = current_semester_get()
         return context
 
 